@@ -1,7 +1,12 @@
 import logging
+from pathlib import Path
+
+import yaml
 
 logger = logging.getLogger(__name__)
 
+RESPONSE_MODES = ("text", "structured")
+
 
 def create_agent(agent: str, **kwargs):
     """Create an agent instance by name with the provided kwargs.
@@ -32,3 +37,21 @@ def create_agent(agent: str, **kwargs):
     except ImportError as e:
         logger.error(f"Failed to import agent '{agent}': {e}")
         raise ValueError(f"Agent '{agent}' is not available") from e
+
+
+def get_response_mode(agent: str) -> str:
+    """Get how an agent replies, from the response_mode key of its prompt file.
+
+    Agents reply with their final message text ("text", the default) unless
+    they opt in to a structured response ("structured").
+
+    Raises:
+        ValueError: If the response mode is unknown
+    """
+    path = Path(__file__).parent.resolve() / f"{agent}.yaml"
+    with open(path) as f:
+        config = yaml.safe_load(f) or {}
+    mode = config.get("response_mode", "text")
+    if mode not in RESPONSE_MODES:
+        raise ValueError(f"Unknown response mode for agent '{agent}': {mode}")
+    return mode
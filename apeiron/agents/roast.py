@@ -2,18 +2,21 @@ import logging
 from pathlib import Path
 
 from langchain.agents import create_agent
-from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from apeiron.agents.utils import load_prompt
+from apeiron.checkpoint import create_checkpointer
 
 logger = logging.getLogger(__name__)
 
 
-def create_roast_agent(**kwargs):
+def create_roast_agent(checkpointer: BaseCheckpointSaver | None = None, **kwargs):
     """Create the roast generation node for the graph."""
     return create_agent(
         name="Roast",
-        checkpointer=InMemorySaver(),
+        checkpointer=(
+            checkpointer if checkpointer is not None else create_checkpointer()
+        ),
         system_prompt=load_prompt(
             Path(__file__).parent.resolve() / f"{Path(__file__).stem}.yaml",
         ),
@@ -3,17 +3,21 @@ from pathlib import Path
 
 from langchain.agents import create_agent
 from langchain_core.language_models.chat_models import BaseChatModel
-from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from apeiron.agents.utils import load_prompt
+from apeiron.checkpoint import create_checkpointer
 
 logger = logging.getLogger(__name__)
 
 
-def create_teto_agent(**kwargs) -> BaseChatModel:
+def create_teto_agent(
+    checkpointer: BaseCheckpointSaver | None = None, **kwargs
+) -> BaseChatModel:
     """Create the Teto agent for the graph.
 
     Args:
+        checkpointer: Checkpoint saver, created from the environment if omitted
         tools: Sequence of tools available to the agent
         model: Base chat model to use
         **kwargs: Additional arguments passed to create_agent
@@ -23,7 +27,9 @@ def create_teto_agent(**kwargs) -> BaseChatModel:
     """
     return create_agent(
         name="Teto",
-        checkpointer=InMemorySaver(),
+        checkpointer=(
+            checkpointer if checkpointer is not None else create_checkpointer()
+        ),
         system_prompt=load_prompt(
             Path(__file__).parent.resolve() / f"{Path(__file__).stem}.yaml",
         ),
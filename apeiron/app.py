@@ -1,54 +1,130 @@
 import asyncio
 import logging
 import os
+import time
+from collections.abc import Awaitable, Callable
 from contextlib import asynccontextmanager, suppress
 
-from discord import AutoShardedBot, Client, Intents, Message
+from discord import AutoShardedBot, Client, DiscordException, Intents, Message
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
 from langchain.agents.structured_output import ProviderStrategy
-from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import trim_messages
 from langchain_core.runnables import Runnable, RunnableConfig
 from pydantic import BaseModel
 
 import apeiron.instrumentation
-from apeiron.agents import create_agent
-from apeiron.chat_message_histories.discord import DiscordChannelChatMessageHistory
-from apeiron.chat_models import create_chat_model
-from apeiron.messages.utils import trim_messages_images
+from apeiron.agents import create_agent, get_response_mode
+from apeiron.captions import ImageCaptioner
+from apeiron.cascade import ModelCascadeMiddleware
+from apeiron.chat_message_histories.discord import (
+    DiscordChannelChatMessageHistory,
+    DiscordChannelHistoryCache,
+)
+from apeiron.chat_models import create_chat_model, create_token_counter
+from apeiron.checkpoint import create_checkpointer
+from apeiron.checkpoint.sqlite import SQLiteSaver
+from apeiron.coalescing import MessageCoalescer
+from apeiron.consolidation import MemoryConsolidator, create_memory_manager
+from apeiron.images import ImagePipeline, create_image_pipeline
+from apeiron.messages.utils import TokenCounter, trim_messages_budget
+from apeiron.metrics import collect_stats, register_stats
+from apeiron.recall import ConversationRecall
+from apeiron.response_cache import ResponseCache, get_side_effect_tools
+from apeiron.scheduling import AdmissionScheduler, SchedulerOverloadedError
 from apeiron.store import create_store
+from apeiron.store.persistent import PersistentStore
+from apeiron.streaming import get_reply, send_reply, stream_reply
 from apeiron.toolkits.discord.toolkit import DiscordToolkit
+from apeiron.tools.discord.message_index import MessageIndex
+from apeiron.tools.discord.resolver import DiscordResolver
+from apeiron.tools.discord.rest import DiscordREST
 from apeiron.tools.discord.utils import (
     create_configurable,
+    create_thread_id,
     is_bot_mentioned,
     is_bot_message,
     is_private_channel,
+    is_reply_to_bot,
 )
 
 logger = logging.getLogger(__name__)
 
+MAX_HISTORY_TOKENS = 2000
+MAX_HISTORY_IMAGES = 1
+SHED_REACTION = "\N{HOURGLASS WITH FLOWING SAND}"
+
 
 class SendMessageAction(BaseModel):
     content: str
 
 
-def create_message_handler(bot: Client, graph: Runnable, chat_model: BaseChatModel):
-    async def handle_message(message: Message):
-        chat_history = DiscordChannelChatMessageHistory(bot)
-        await chat_history.load_messages_from_message(message)
+def create_message_handler(
+    bot: Client,
+    graph: Runnable,
+    token_counter: TokenCounter,
+    history_cache: DiscordChannelHistoryCache | None = None,
+    recall: ConversationRecall | None = None,
+    consolidator: MemoryConsolidator | None = None,
+    images: ImagePipeline | None = None,
+    captioner: ImageCaptioner | None = None,
+    response_cache: ResponseCache | None = None,
+    structured: bool = False,
+    streaming: bool = False,
+    stream_interval: float = 1.0,
+):
+    async def handle_messages(messages: list[Message]):
+        # Coalesced messages all belong to the same thread, so the history
+        # leading to the newest one includes the others
+        message = messages[-1]
+        field = "content" if structured else None
+        # Coalesced messages are not one standalone request
+        cacheable = response_cache is not None and len(messages) == 1
+        if cacheable and (reply := await response_cache.get(message)) is not None:
+            sent = await send_reply(message.channel, reply)
+            if recall is not None:
+                recall.remember_later([*messages, *sent])
+            return
+
+        started = time.monotonic()
+        # Search older messages while the raw history loads
+        recalled = (
+            asyncio.create_task(recall.search(message)) if recall is not None else None
+        )
+        chat_history = DiscordChannelChatMessageHistory(
+            bot, cache=history_cache, captioner=captioner
+        )
+        await chat_history.load_messages_from_message(
+            message,
+            token_counter=token_counter,
+            max_tokens=MAX_HISTORY_TOKENS,
+            max_images=MAX_HISTORY_IMAGES,
+        )
+        logger.info(
+            f"Loaded {len(chat_history.messages)} messages for {len(messages)} "
+            f"messages up to {message.id}, "
+            f"fetched {chat_history.fetched_messages} messages "
+            f"in {chat_history.fetched_pages} pages"
+        )
 
         inputs = {
-            "messages": trim_messages(
-                trim_messages_images(chat_history.messages, max_images=1),
-                token_counter=chat_model,
-                strategy="last",
-                max_tokens=2000,
+            "messages": trim_messages_budget(
+                chat_history.messages,
+                token_counter=token_counter,
+                max_tokens=MAX_HISTORY_TOKENS,
+                max_images=MAX_HISTORY_IMAGES,
                 start_on="human",
                 end_on=("human", "tool"),
                 include_system=True,
             )
         }
+        if recalled is not None:
+            context = recall.render(
+                await recalled, before=chat_history.oldest_message_id
+            )
+            if context is not None:
+                inputs["messages"].insert(0, context)
+        if images is not None:
+            inputs["messages"] = await images.inline(inputs["messages"])
 
         config: RunnableConfig = {
             "configurable": create_configurable(message),
@@ -58,47 +134,226 @@ def create_message_handler(bot: Client, graph: Runnable, chat_model: BaseChatMod
             config["configurable"]["guild_id"] = message.guild.id
 
         async with message.channel.typing():
-            invoked = await graph.ainvoke(
-                inputs,
-                config=config,
+            if streaming:
+                state, sent = await stream_reply(
+                    graph,
+                    inputs,
+                    config,
+                    message.channel,
+                    tool_name=SendMessageAction.__name__ if structured else None,
+                    interval=stream_interval,
+                )
+            else:
+                state = await graph.ainvoke(
+                    inputs,
+                    config=config,
+                )
+
+                reply = get_reply(state, field)
+                sent = await send_reply(message.channel, reply) if reply else []
+
+        if cacheable and state and sent:
+            await response_cache.put(
+                message,
+                get_reply(state, field),
+                state["messages"],
+                latency=time.monotonic() - started,
             )
 
-            structured: SendMessageAction = invoked["structured_response"]
+        if recall is not None:
+            recall.remember_later([*messages, *sent])
+        if consolidator is not None:
+            consolidator.submit(messages, sent)
 
-            if isinstance(structured, SendMessageAction):
-                await message.channel.send(structured.content)
+    return handle_messages
 
-    return handle_message
 
+type Shutdown = list[Callable[[], Awaitable[None]]]
 
-def create_bot():
+
+def create_bot(shutdown: Shutdown | None = None):
+    """Create the Discord bot.
+
+    Args:
+        shutdown: List receiving the coroutine functions that release the
+            resources of the bot, to await once it is closed
+    """
+    shutdown = shutdown if shutdown is not None else []
     # Initialize the MistralAI model
-    chat_model = create_chat_model(
-        model=os.getenv("APEIRON_MODEL", "mistralai:ministral-3b-2410"),
-    )
+    model = os.getenv("APEIRON_MODEL", "mistralai:ministral-3b-2410")
+    chat_model = create_chat_model(model=model)
+    token_counter = create_token_counter(model=model)
     store = create_store(
         model=os.getenv("APEIRON_EMBEDDING", "mistralai:mistral-embed"),
     )
+    if isinstance(store, PersistentStore):
+        shutdown.append(store.aclose)
+    checkpointer = create_checkpointer()
+    if isinstance(checkpointer, SQLiteSaver):
+        shutdown.append(checkpointer.aclose)
 
     # Initialize the Discord client
     bot = AutoShardedBot(intents=Intents.all())
-    tools = DiscordToolkit(client=bot).get_tools()
 
-    # Create the agent using the new agents package function
+    # Merge identical REST requests and throttle them ahead of rate limits
+    rest = DiscordREST(
+        bot,
+        route_rate=float(os.getenv("APEIRON_DISCORD_ROUTE_RATE", "5.0")),
+        global_rate=float(os.getenv("APEIRON_DISCORD_GLOBAL_RATE", "50.0")),
+    )
+    rest.install()
+    register_stats("rest", rest.stats)
+
+    # Resolve Discord entities from the gateway cache before REST
+    resolver = DiscordResolver(bot)
+    resolver.register(bot)
+    register_stats("resolver", resolver.stats)
+
+    # Index messages for full-text search when a path is configured
+    message_index = None
+    if path := os.getenv("APEIRON_MESSAGE_INDEX_PATH"):
+        message_index = MessageIndex(path)
+        message_index.register(bot)
+        register_stats("message_index", message_index.stats)
+
+    tools = DiscordToolkit(
+        client=bot, resolver=resolver, message_index=message_index
+    ).get_tools()
+
+    # Keep recent channel history in memory, fed by gateway events
+    history_cache = DiscordChannelHistoryCache(
+        max_messages=int(os.getenv("APEIRON_HISTORY_CACHE_MESSAGES", "100")),
+        max_channels=int(os.getenv("APEIRON_HISTORY_CACHE_CHANNELS", "1024")),
+    )
+    history_cache.register(bot)
+
+    # Create the agent using the new agents package function, agents reply
+    # with their final message unless they opt in to a structured response
+    agent = os.getenv("APEIRON_AGENT", "operator_6o")
+    structured = get_response_mode(agent) == "structured"
+
+    # Escalate complex or doubtful model calls to a larger model
+    middleware = []
+    if escalation_model := os.getenv("APEIRON_ESCALATION_MODEL"):
+        cascade = ModelCascadeMiddleware(
+            create_chat_model(model=escalation_model),
+            max_chars=int(os.getenv("APEIRON_CASCADE_MAX_CHARS", "600")),
+            small_timeout=float(os.getenv("APEIRON_CASCADE_SMALL_TIMEOUT", "10.0")),
+            large_timeout=float(os.getenv("APEIRON_CASCADE_LARGE_TIMEOUT", "60.0")),
+        )
+        register_stats("cascade", cascade.stats)
+        middleware.append(cascade)
+
     graph = create_agent(
-        agent=os.getenv("APEIRON_AGENT", "operator_6o"),
+        agent=agent,
         tools=tools,
         model=chat_model,
         store=store,
-        response_format=SendMessageAction,
+        checkpointer=checkpointer,
+        response_format=SendMessageAction if structured else None,
+        middleware=middleware,
     )
 
-    handle_message = create_message_handler(
+    # Recall older messages of the conversation by semantic search
+    recall = ConversationRecall(
+        store,
+        k=int(os.getenv("APEIRON_RECALL_K", "5")),
+        min_score=float(os.getenv("APEIRON_RECALL_MIN_SCORE", "0.7")),
+    )
+    register_stats("recall", recall.stats)
+
+    # Consolidate durable memories of finished turns with a cheap model
+    consolidator = None
+    if memory_model := os.getenv("APEIRON_MEMORY_MODEL"):
+        consolidator = MemoryConsolidator(
+            create_memory_manager(create_chat_model(model=memory_model), store),
+            max_queue=int(os.getenv("APEIRON_MEMORY_MAX_QUEUE", "256")),
+            interval=float(os.getenv("APEIRON_MEMORY_INTERVAL", "5.0")),
+        )
+        register_stats("consolidator", consolidator.stats)
+        shutdown.append(consolidator.close)
+
+    # Send downscaled images as data URLs instead of full-size CDN links
+    images = create_image_pipeline()
+    register_stats("images", images.stats)
+    shutdown.append(images.close)
+
+    # Describe images beyond the newest ones once, and send them as captions
+    captioner = None
+    if caption_model := os.getenv("APEIRON_CAPTION_MODEL"):
+        captioner = ImageCaptioner(create_chat_model(model=caption_model), images)
+        register_stats("captioner", captioner.stats)
+
+    # Reply to repeated requests without running the agent, matching them
+    # exactly or, with "semantic", by similarity with the store embeddings
+    response_cache = None
+    match mode := os.getenv("APEIRON_RESPONSE_CACHE", "off"):
+        case "exact" | "semantic":
+            response_cache = ResponseCache(
+                agent=agent,
+                model=model,
+                side_effect_tools=get_side_effect_tools(tools),
+                embeddings=store.embeddings if mode == "semantic" else None,
+                maxsize=int(os.getenv("APEIRON_RESPONSE_CACHE_SIZE", "1024")),
+                ttl=float(os.getenv("APEIRON_RESPONSE_CACHE_TTL", "3600")),
+                min_score=float(os.getenv("APEIRON_RESPONSE_CACHE_MIN_SCORE", "0.95")),
+            )
+            register_stats("response_cache", response_cache.stats)
+        case "off":
+            pass
+        case _:
+            raise ValueError(f"Unknown response cache: {mode}")
+
+    handle_messages = create_message_handler(
         bot=bot,
         graph=graph,
-        chat_model=chat_model,
+        token_counter=token_counter,
+        history_cache=history_cache,
+        recall=recall,
+        consolidator=consolidator,
+        images=images,
+        captioner=captioner,
+        response_cache=response_cache,
+        structured=structured,
+        streaming=os.getenv("APEIRON_STREAMING", "false").lower() == "true",
+        stream_interval=float(os.getenv("APEIRON_STREAM_EDIT_INTERVAL", "1.0")),
     )
 
+    # Limit concurrent agent runs, serving guilds fairly and DMs and replies first
+    scheduler = AdmissionScheduler(
+        max_concurrency=int(os.getenv("APEIRON_MAX_CONCURRENCY", "4")),
+        max_queue=int(os.getenv("APEIRON_MAX_QUEUE", "64")),
+    )
+    register_stats("scheduler", scheduler.stats)
+
+    async def schedule_messages(messages: list[Message]):
+        message = messages[-1]
+        priority = any(
+            is_private_channel(queued) or is_reply_to_bot(bot, queued)
+            for queued in messages
+        )
+        try:
+            async with scheduler.slot(
+                message.guild.id if message.guild else None, priority=priority
+            ):
+                await handle_messages(messages)
+        except SchedulerOverloadedError as e:
+            # Acknowledge the messages cheaply instead of replying
+            logger.warning(f"Shedding {len(messages)} messages: {str(e)}")
+            for message in messages:
+                with suppress(DiscordException):
+                    await message.add_reaction(SHED_REACTION)
+
+    # Serialize runs per thread, answering mentions received during a run in
+    # a single follow-up run
+    coalescer = MessageCoalescer(
+        schedule_messages,
+        key=create_thread_id,
+        window=float(os.getenv("APEIRON_COALESCE_WINDOW", "1.5")),
+        max_delay=float(os.getenv("APEIRON_COALESCE_MAX_DELAY", "5.0")),
+    )
+    register_stats("coalescer", coalescer.stats)
+
     @bot.listen
     async def on_message(message: Message):
         if is_bot_message(bot, message):
@@ -106,14 +361,14 @@ def create_bot():
         if not is_bot_mentioned(bot, message) and not is_private_channel(message):
             return
         try:
-            await handle_message(message)
+            await coalescer.submit(message)
         except Exception as e:
             logger.error(f"Error handling message event: {str(e)}")
 
     return bot
 
 
-def create_api_lifespan(bot: Client):
+def create_api_lifespan(bot: Client, shutdown: Shutdown | None = None):
     @asynccontextmanager
     async def lifespan(app: FastAPI):
         # Initialize bot on startup
@@ -131,12 +386,15 @@ def create_api_lifespan(bot: Client):
         bot_task.cancel()
         with suppress(asyncio.CancelledError):
             await bot_task
+        # Release resources in reverse order, before what they depend on
+        for close in reversed(shutdown or []):
+            await close()
 
     return lifespan
 
 
-def create_api(bot: Client):
-    app = FastAPI(lifespan=create_api_lifespan(bot))
+def create_api(bot: Client, shutdown: Shutdown | None = None):
+    app = FastAPI(lifespan=create_api_lifespan(bot, shutdown))
 
     @app.get("/readyz")
     async def readiness_probe():
@@ -150,9 +408,14 @@ def create_api(bot: Client):
             return {"status": "live"}
         return JSONResponse(content={"status": "not live"}, status_code=503)
 
+    @app.get("/metrics")
+    async def metrics():
+        return collect_stats()
+
     return app
 
 
 def create_app():
     apeiron.instrumentation.init()
-    return create_api(create_bot())
+    shutdown: Shutdown = []
+    return create_api(create_bot(shutdown), shutdown)
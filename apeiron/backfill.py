@@ -0,0 +1,248 @@
+"""Backfill the local message index from the history of Discord channels.
+
+Usage:
+    python -m apeiron.backfill GUILD_ID... --index PATH [--checkpoint PATH]
+        [--rate 5] [--concurrency 4] [--since 2025-01-01]
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+import click
+from discord import Client, Forbidden, HTTPException, Intents, NotFound
+from discord.abc import Messageable
+
+from apeiron.tools.discord.message_index import MessageIndex
+from apeiron.tools.discord.pagination import parse_time, snowflake
+from apeiron.tools.discord.rest import DiscordREST
+
+logger = logging.getLogger(__name__)
+
+
+class BackfillCheckpoint:
+    """Progress of a backfill per channel, saved to a JSON file.
+
+    Channels are walked from their newest message to their oldest one, so
+    the progress of a channel is the ID of the oldest message indexed so
+    far, and whether the start of the channel (or of the backfill window)
+    has been reached.
+    """
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = Path(path)
+        self.channels: dict[str, dict] = {}
+        if self.path.exists():
+            self.channels = json.loads(self.path.read_text())["channels"]
+
+    def get(self, channel_id: int) -> dict:
+        """Get the progress of a channel."""
+        return self.channels.setdefault(
+            str(channel_id), {"before": None, "done": False, "messages": 0}
+        )
+
+    def save(self) -> None:
+        """Save the progress atomically."""
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"channels": self.channels}))
+        os.replace(tmp, self.path)
+
+
+async def backfill_channel(
+    channel: Messageable,
+    index: MessageIndex,
+    checkpoint: BackfillCheckpoint,
+    since: datetime | None = None,
+    batch_size: int = 1000,
+) -> int:
+    """Index the history of a channel, resuming from its checkpoint.
+
+    Messages are indexed in batches, and the checkpoint only moves once a
+    batch has been written, so an interrupted backfill never skips any.
+
+    Returns:
+        The number of messages walked
+    """
+    progress = checkpoint.get(channel.id)
+    if progress["done"]:
+        return 0
+
+    walked = 0
+    batch = []
+
+    async def write_batch():
+        nonlocal walked
+        if not batch:
+            return
+        index.add_messages(batch)
+        await asyncio.to_thread(index.flush)
+        progress["before"] = batch[-1].id
+        progress["messages"] += len(batch)
+        walked += len(batch)
+        checkpoint.save()
+        batch.clear()
+
+    try:
+        async for message in channel.history(
+            limit=None, before=snowflake(progress["before"]), oldest_first=False
+        ):
+            if since is not None and message.created_at < since:
+                break
+            batch.append(message)
+            if len(batch) >= batch_size:
+                await write_batch()
+    except (Forbidden, NotFound) as e:
+        logger.warning(f"Skipping channel {channel.id}: {str(e)}")
+    await write_batch()
+    progress["done"] = True
+    checkpoint.save()
+    return walked
+
+
+async def list_channels(client: Client, guild_id: int) -> list[Messageable]:
+    """List the channels and active threads of a guild with a message history."""
+    guild = await client.fetch_guild(guild_id)
+    channels = [
+        channel
+        for channel in await guild.fetch_channels()
+        if isinstance(channel, Messageable)
+    ]
+    try:
+        channels.extend(await guild.active_threads())
+    except HTTPException as e:
+        logger.warning(f"Failed to list the threads of guild {guild_id}: {str(e)}")
+    return channels
+
+
+async def backfill(
+    token: str,
+    guild_ids: list[int],
+    index: MessageIndex,
+    checkpoint: BackfillCheckpoint,
+    rate: float = 5.0,
+    concurrency: int = 4,
+    since: datetime | None = None,
+    batch_size: int = 1000,
+) -> int:
+    """Index the history of the channels of guilds, several channels at a time.
+
+    The REST requests are throttled to rate requests per second in total,
+    leaving the rest of the bot's rate limit to the live bot.
+
+    Returns:
+        The number of messages walked
+    """
+    client = Client(intents=Intents.none())
+    rest = DiscordREST(client, route_rate=rate, route_burst=rate, global_rate=rate)
+    rest.install()
+    await client.login(token)
+    try:
+        channels: asyncio.Queue[Messageable] = asyncio.Queue()
+        for guild_id in guild_ids:
+            for channel in await list_channels(client, guild_id):
+                channels.put_nowait(channel)
+        logger.info(f"Backfilling {channels.qsize()} channels")
+
+        walked = 0
+
+        async def worker():
+            nonlocal walked
+            while not channels.empty():
+                channel = channels.get_nowait()
+                started = time.monotonic()
+                count = await backfill_channel(
+                    channel, index, checkpoint, since=since, batch_size=batch_size
+                )
+                walked += count
+                if count:
+                    logger.info(
+                        f"Indexed {count} messages of channel {channel.id} "
+                        f"in {time.monotonic() - started:.1f}s"
+                    )
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return walked
+    finally:
+        await client.close()
+
+
+@click.command()
+@click.argument("guild_ids", nargs=-1, type=int, required=True)
+@click.option(
+    "--index",
+    "index_path",
+    envvar="APEIRON_MESSAGE_INDEX_PATH",
+    required=True,
+    help="Path of the message index",
+)
+@click.option(
+    "--checkpoint",
+    "checkpoint_path",
+    default="backfill.json",
+    show_default=True,
+    help="Path of the file saving the progress, to resume an interrupted run",
+)
+@click.option(
+    "--rate",
+    default=5.0,
+    show_default=True,
+    help="REST requests per second, shared by all the channels walked",
+)
+@click.option(
+    "--concurrency",
+    default=4,
+    show_default=True,
+    help="Number of channels walked at the same time",
+)
+@click.option("--since", help="Only index messages sent after this ISO 8601 time")
+@click.option(
+    "--batch-size",
+    default=1000,
+    show_default=True,
+    help="Number of messages written per transaction",
+)
+def main(
+    guild_ids: tuple[int, ...],
+    index_path: str,
+    checkpoint_path: str,
+    rate: float,
+    concurrency: int,
+    since: str | None,
+    batch_size: int,
+):
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    token = os.getenv("DISCORD_TOKEN")
+    if not token:
+        raise click.UsageError("DISCORD_TOKEN environment variable is not set")
+
+    index = MessageIndex(index_path)
+    checkpoint = BackfillCheckpoint(checkpoint_path)
+    started = time.monotonic()
+    try:
+        walked = asyncio.run(
+            backfill(
+                token,
+                list(guild_ids),
+                index,
+                checkpoint,
+                rate=rate,
+                concurrency=concurrency,
+                since=parse_time(since) if since else None,
+                batch_size=batch_size,
+            )
+        )
+    finally:
+        index.close()
+    elapsed = time.monotonic() - started
+    click.echo(
+        f"Indexed {walked} messages in {elapsed:.1f}s "
+        f"({walked / max(elapsed, 1e-9):.0f} messages/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
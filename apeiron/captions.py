@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+
+from discord import Message
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import HumanMessage
+
+from apeiron.images import ImagePipeline, source_key
+from apeiron.utils import LRUCache, TTLCache
+
+logger = logging.getLogger(__name__)
+
+CAPTION_PROMPT = (
+    "Describe this image in one or two short sentences for someone who "
+    "cannot see it. Mention any readable text. Reply with the description only."
+)
+
+
+def is_image(content_type: str | None) -> bool:
+    return bool(content_type and content_type.startswith("image/"))
+
+
+class ImageCaptioner:
+    """Short text captions of image attachments, generated once per image.
+
+    Captions are served synchronously from memory. Other images are looked
+    up in the image cache of the pipeline, keyed by the hash of the image
+    content, and described by a vision model if unknown, in the background
+    so rendering history never waits on the disk or the model. Images that
+    failed to be described are not retried before failure_ttl seconds.
+    """
+
+    def __init__(
+        self,
+        model: BaseChatModel,
+        images: ImagePipeline,
+        maxsize: int = 4096,
+        max_concurrency: int = 2,
+        max_chars: int = 300,
+        failure_ttl: float = 3600.0,
+    ) -> None:
+        """Initialize the captioner.
+
+        Args:
+            model: Vision model describing the images
+            images: Pipeline downloading and encoding the images
+            maxsize: Maximum number of captions kept in memory
+            max_concurrency: Maximum number of images described at once
+            max_chars: Maximum length of a caption
+            failure_ttl: Seconds before an image that failed is retried
+        """
+        self.model = model
+        self.images = images
+        self.max_chars = max_chars
+        self.memory: LRUCache[str, str] = LRUCache(maxsize=maxsize)
+        self.failed: TTLCache[str, bool] = TTLCache(maxsize=maxsize, ttl=failure_ttl)
+        self.generated = 0
+        self.failures = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def stats(self) -> dict:
+        """Get the cache, generation and backlog counters."""
+        return {
+            "memory": self.memory.stats(),
+            "generated": self.generated,
+            "failures": self.failures,
+            "failed": len(self.failed),
+            "pending": len(self._tasks),
+        }
+
+    def get(self, url: str) -> str | None:
+        """Get the caption of an image, scheduling its lookup if unknown."""
+        key = source_key(url)
+        if (caption := self.memory.get(key)) is not None:
+            return caption
+        if key in self.failed:
+            return None
+        if key not in self._tasks:
+            task = asyncio.create_task(self._generate(url, key))
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return None
+
+    def captions(self, message: Message, skip: int = 0) -> dict[str, str | None] | None:
+        """Get the captions of the image attachments of a message.
+
+        Args:
+            message: The message
+            skip: Number of leading images left out, to be sent as pixels
+
+        Returns:
+            The caption of each image by source key, None for the images not
+            described yet, or None if no image is left to caption
+        """
+        attachments = [
+            attachment
+            for attachment in message.attachments
+            if is_image(attachment.content_type)
+        ]
+        captions = {
+            source_key(attachment.url): self.get(attachment.url)
+            for attachment in attachments[skip:]
+        }
+        return captions or None
+
+    async def _lookup(self, key: str) -> str | None:
+        if self.images.cache is None:
+            return None
+        caption = await asyncio.to_thread(self.images.cache.get_caption, key)
+        if caption:
+            self.memory.put(key, caption)
+        return caption
+
+    async def _generate(self, url: str, key: str) -> None:
+        if await self._lookup(key):
+            return
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                data_url = await self.images.data_url(url)
+                if data_url is None:
+                    raise ValueError("Image could not be downloaded")
+                # The image may have been described under another URL
+                if await self._lookup(key):
+                    return
+                response = await self.model.ainvoke(
+                    [
+                        HumanMessage(
+                            content=[
+                                {"type": "text", "text": CAPTION_PROMPT},
+                                {"type": "image_url", "image_url": data_url},
+                            ]
+                        )
+                    ]
+                )
+            except Exception as e:
+                self.failures += 1
+                self.failed.put(key, True)
+                logger.warning(f"Failed to caption image {key}: {str(e)}")
+                return
+
+        caption = " ".join(response.text.split())[: self.max_chars]
+        if not caption:
+            self.failures += 1
+            self.failed.put(key, True)
+            return
+        self.memory.put(key, caption)
+        if self.images.cache is not None:
+            await asyncio.to_thread(self.images.cache.put_caption, key, caption)
+        self.generated += 1
+        logger.info(f"Captioned image {key} in {time.monotonic() - started:.2f}s")
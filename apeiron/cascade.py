@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langgraph.constants import TAG_NOSTREAM
+
+logger = logging.getLogger(__name__)
+
+IMAGE_PART_TYPES = ("image", "image_url")
+
+
+def has_image(message: BaseMessage) -> bool:
+    """Check whether a message has image content parts."""
+    return isinstance(message.content, list) and any(
+        isinstance(part, dict) and part.get("type") in IMAGE_PART_TYPES
+        for part in message.content
+    )
+
+
+class ModelCascadeMiddleware(AgentMiddleware):
+    """Answer with the agent model first and escalate to a larger model.
+
+    A model call goes straight to the large model when the request looks
+    complex: the latest human message has images, is long or has code, or
+    it follows tool results of the current turn, which takes more reasoning
+    than choosing the tools. Other calls are answered by the agent model,
+    and escalated when it exceeds its latency budget or its response shows
+    low confidence: malformed tool calls, a truncated or an empty response.
+
+    The agent model is not streamed when its response may be escalated, so a
+    response judged untrustworthy is never shown while it is generated.
+
+    Every decision is logged with its reason and latency, and counted in the
+    stats, to tune the thresholds.
+    """
+
+    def __init__(
+        self,
+        large_model: BaseChatModel,
+        max_chars: int = 600,
+        small_timeout: float = 10.0,
+        large_timeout: float = 60.0,
+    ) -> None:
+        """Initialize the cascade.
+
+        Args:
+            large_model: Model the calls are escalated to
+            max_chars: Length of the latest human message above which it
+                goes to the large model
+            small_timeout: Seconds after which a call to the agent model is
+                cancelled and escalated
+            large_timeout: Seconds after which a call to the large model is
+                cancelled, falling back to the answer of the agent model or,
+                if it was not called, to a call to it bounded by small_timeout
+        """
+        super().__init__()
+        self.large_model = large_model
+        self.max_chars = max_chars
+        self.small_timeout = small_timeout
+        self.large_timeout = large_timeout
+        self.small = 0
+        self.large_timeouts = 0
+        self.escalations: dict[str, int] = {}
+
+    def stats(self) -> dict:
+        """Get the number of calls answered by each model and their reasons."""
+        return {
+            "small": self.small,
+            "large": sum(self.escalations.values()),
+            "large_timeouts": self.large_timeouts,
+            "escalations": dict(self.escalations),
+        }
+
+    def _route(self, request: ModelRequest) -> str | None:
+        """Get the reason to call the large model right away, if any."""
+        for message in reversed(request.messages):
+            if isinstance(message, ToolMessage):
+                return "tool_results"
+            if isinstance(message, HumanMessage):
+                if has_image(message):
+                    return "images"
+                if len(message.text) > self.max_chars:
+                    return "long_message"
+                if "```" in message.text:
+                    return "code"
+                break
+        return None
+
+    def _doubt(self, response: ModelResponse) -> str | None:
+        """Get the reason not to trust a response of the agent model, if any."""
+        message = next(
+            (message for message in response.result if isinstance(message, AIMessage)),
+            None,
+        )
+        if message is None:
+            return "empty"
+        if message.invalid_tool_calls:
+            return "invalid_tool_calls"
+        if message.response_metadata.get("finish_reason") == "length":
+            return "truncated"
+        if (
+            not message.text.strip()
+            and not message.tool_calls
+            and response.structured_response is None
+        ):
+            return "empty"
+        return None
+
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        """Call the agent model or the large one, escalating if needed."""
+        started = time.monotonic()
+        response = None
+        if (reason := self._route(request)) is None:
+            model = request.model.model_copy(
+                update={"tags": [*(request.model.tags or []), TAG_NOSTREAM]}
+            )
+            try:
+                response = await asyncio.wait_for(
+                    handler(request.override(model=model)), timeout=self.small_timeout
+                )
+            except TimeoutError:
+                reason = "timeout"
+            else:
+                if (reason := self._doubt(response)) is None:
+                    self.small += 1
+                    logger.info(
+                        f"Model cascade answered with the agent model "
+                        f"in {time.monotonic() - started:.2f}s"
+                    )
+                    return response
+
+        self.escalations[reason] = self.escalations.get(reason, 0) + 1
+        logger.info(
+            f"Model cascade escalating ({reason}) "
+            f"after {time.monotonic() - started:.2f}s"
+        )
+        try:
+            response = await asyncio.wait_for(
+                handler(request.override(model=self.large_model)),
+                timeout=self.large_timeout,
+            )
+        except TimeoutError:
+            self.large_timeouts += 1
+            logger.warning(
+                f"Model cascade large model timed out after {self.large_timeout}s, "
+                "falling back to the agent model"
+            )
+            if response is not None:
+                return response
+            if reason == "timeout":
+                raise
+            return await asyncio.wait_for(handler(request), timeout=self.small_timeout)
+        logger.info(
+            f"Model cascade answered with the large model "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+        return response
@@ -1,21 +1,236 @@
-from discord import Client, Message, TextChannel
+import asyncio
+import bisect
+import logging
+import math
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+
+from discord import (
+    Client,
+    Message,
+    RawBulkMessageDeleteEvent,
+    RawMessageDeleteEvent,
+    RawMessageUpdateEvent,
+)
+from discord.abc import Messageable
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.messages import AIMessage, BaseMessage
 
-from apeiron.tools.discord.utils import create_chat_message
+from apeiron.captions import ImageCaptioner, is_image
+from apeiron.messages.utils import TokenCounter, count_images, count_tokens
+from apeiron.tools.discord.utils import render_chat_message
+
+logger = logging.getLogger(__name__)
+
+# Number of messages returned by a single Discord history request
+HISTORY_PAGE_SIZE = 100
+
+
+class DiscordChannelWindow:
+    """Bounded window of the most recent messages of a single channel."""
+
+    def __init__(self, maxlen: int) -> None:
+        """Initialize an empty window holding at most maxlen messages."""
+        self.maxlen = maxlen
+        self.seeded = False
+        self.lock = asyncio.Lock()
+        self._messages: dict[int, Message] = {}
+        # Snowflakes are chronological, message IDs sorted oldest first
+        self._ids: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def get(self, message_id: int) -> Message | None:
+        """Get a message held by the window."""
+        return self._messages.get(message_id)
+
+    def put(self, message: Message) -> None:
+        """Insert or replace a message, evicting the oldest ones when full."""
+        if message.id not in self._messages:
+            bisect.insort(self._ids, message.id)
+        self._messages[message.id] = message
+        if len(self._ids) > self.maxlen:
+            for message_id in self._ids[: -self.maxlen]:
+                del self._messages[message_id]
+            del self._ids[: -self.maxlen]
+
+    def replace(self, message: Message) -> None:
+        """Replace a message already held by the window."""
+        if message.id in self._messages:
+            self._messages[message.id] = message
+
+    def remove(self, message_id: int) -> None:
+        """Remove a message from the window if present."""
+        if self._messages.pop(message_id, None) is not None:
+            del self._ids[bisect.bisect_left(self._ids, message_id)]
+
+    def latest(self, limit: int | None = None) -> list[Message]:
+        """Return the newest messages in chronological order."""
+        ids = self._ids
+        if limit is not None:
+            ids = ids[-limit:] if limit > 0 else []
+        return [self._messages[message_id] for message_id in ids]
+
+
+class DiscordChannelHistoryCache:
+    """Per-channel cache of recent Discord messages fed by gateway events.
+
+    Each channel is seeded once from REST with its most recent messages and
+    then kept up to date from message create, edit and delete events. Channels
+    are evicted in least recently used order once max_channels is reached.
+    """
+
+    def __init__(self, max_messages: int = 100, max_channels: int = 1024) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_messages: Maximum number of messages kept per channel
+            max_channels: Maximum number of channels kept in the cache
+        """
+        self.max_messages = max_messages
+        self.max_channels = max_channels
+        self._windows: OrderedDict[int, DiscordChannelWindow] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def _get_or_create_window(self, channel_id: int) -> DiscordChannelWindow:
+        window = self._windows.get(channel_id)
+        if window is None:
+            window = DiscordChannelWindow(self.max_messages)
+            self._windows[channel_id] = window
+            while len(self._windows) > self.max_channels:
+                evicted, _ = self._windows.popitem(last=False)
+                logger.debug(f"Evicted channel {evicted} from history cache")
+        else:
+            self._windows.move_to_end(channel_id)
+        return window
+
+    def add_message(self, message: Message) -> None:
+        """Record a newly created message for an already tracked channel."""
+        window = self._windows.get(message.channel.id)
+        if window is not None:
+            window.put(message)
+
+    def get_message(self, channel_id: int, message_id: int) -> Message | None:
+        """Get a message held by the window of a tracked channel."""
+        window = self._windows.get(channel_id)
+        return window.get(message_id) if window is not None else None
+
+    def edit_message(self, message: Message) -> None:
+        """Record the edited version of a tracked message."""
+        window = self._windows.get(message.channel.id)
+        if window is not None:
+            window.replace(message)
+
+    def delete_message(self, channel_id: int, message_id: int) -> None:
+        """Forget a deleted message."""
+        window = self._windows.get(channel_id)
+        if window is not None:
+            window.remove(message_id)
+
+    def invalidate(self, channel_id: int) -> None:
+        """Drop a channel from the cache so it is seeded again on next use."""
+        self._windows.pop(channel_id, None)
+
+    async def seed(self, channel: Messageable) -> int:
+        """Fill the window of a channel from REST unless it was already seeded.
+
+        The whole window is fetched whatever the budget of the caller, once
+        per channel: later turns read it from memory, kept up to date by the
+        gateway events, without any REST request.
+
+        Returns:
+            Number of messages fetched, 0 if the window was already seeded
+        """
+        window = self._get_or_create_window(channel.id)
+        fetched = 0
+        if not window.seeded:
+            async with window.lock:
+                if not window.seeded:
+                    # Events received while seeding are kept, the window
+                    # deduplicates them against the REST pages by message ID.
+                    async for message in channel.history(limit=window.maxlen):
+                        window.put(message)
+                        fetched += 1
+                    window.seeded = True
+        return fetched
+
+    async def history(
+        self, channel: Messageable, limit: int | None = None
+    ) -> list[Message]:
+        """Get the most recent messages of a channel in chronological order.
+
+        Args:
+            channel: The channel to read messages from
+            limit: Maximum number of messages to return (None for the window)
+
+        Returns:
+            List of messages from oldest to newest
+        """
+        await self.seed(channel)
+        return self._get_or_create_window(channel.id).latest(limit)
+
+    def register(self, client: Client) -> None:
+        """Subscribe the cache to the gateway events of a Discord client."""
+
+        async def on_message(message: Message):
+            self.add_message(message)
+
+        # Edit events are only dispatched for messages in the client's own
+        # message cache, raw ones for every message of the windows
+        async def on_raw_message_edit(payload: RawMessageUpdateEvent):
+            held = self.get_message(payload.channel_id, payload.message_id)
+            if held is None:
+                return
+            message = getattr(payload, "new_message", None)
+            if message is None:
+                # Older py-cord releases only pass the raw message data
+                message = Message(
+                    state=client._connection, channel=held.channel, data=payload.data
+                )
+            self.edit_message(message)
+
+        async def on_raw_message_delete(payload: RawMessageDeleteEvent):
+            self.delete_message(payload.channel_id, payload.message_id)
+
+        async def on_raw_bulk_message_delete(payload: RawBulkMessageDeleteEvent):
+            for message_id in payload.message_ids:
+                self.delete_message(payload.channel_id, message_id)
+
+        client.add_listener(on_message, "on_message")
+        client.add_listener(on_raw_message_edit, "on_raw_message_edit")
+        client.add_listener(on_raw_message_delete, "on_raw_message_delete")
+        client.add_listener(on_raw_bulk_message_delete, "on_raw_bulk_message_delete")
 
 
 class DiscordChannelChatMessageHistory(BaseChatMessageHistory):
     """Chat message history that stores Discord messages."""
 
-    def __init__(self, discord_client: Client) -> None:
-        """Initialize with Discord client."""
+    def __init__(
+        self,
+        discord_client: Client,
+        cache: DiscordChannelHistoryCache | None = None,
+        captioner: ImageCaptioner | None = None,
+    ) -> None:
+        """Initialize with Discord client, an optional channel cache and an
+        optional captioner describing the images beyond the image budget."""
         self.discord_client = discord_client
+        self.cache = cache
+        self.captioner = captioner
         self.messages: list[BaseMessage] = []
+        self.fetched_messages = 0
+        self.fetched_pages = 0
+        # ID of the oldest message loaded, None if none was loaded
+        self.oldest_message_id: int | None = None
 
     def add_message(self, message: Message) -> None:
         """Add a Discord message to the store."""
-        msg = create_chat_message(message)
+        self._append(render_chat_message(message))
+
+    def _append(self, msg: BaseMessage) -> None:
+        """Append a chat message, merging consecutive AI messages."""
         if isinstance(msg, AIMessage):
             self._add_ai_message(msg)
         else:
@@ -23,7 +238,7 @@ class DiscordChannelChatMessageHistory(BaseChatMessageHistory):
 
     def _add_ai_message(self, message: AIMessage) -> None:
         """Add an AI message to the store."""
-        if isinstance(self.messages[-1], AIMessage):
+        if self.messages and isinstance(self.messages[-1], AIMessage):
             prev = self.messages[-1]
             prev_content = (
                 [
@@ -54,29 +269,111 @@ class DiscordChannelChatMessageHistory(BaseChatMessageHistory):
         self.messages = []
 
     async def load_messages_from_message(
-        self, message: Message, limit: int | None = None
+        self,
+        message: Message,
+        limit: int | None = None,
+        token_counter: TokenCounter | None = None,
+        max_tokens: int | None = None,
+        max_images: int | None = None,
     ) -> None:
         """Load messages from a Discord message into the history.
         Args:
             message: The message to load messages from
             limit: Maximum number of messages to load (None for no limit)
+            token_counter: Token counter used to enforce max_tokens
+            max_tokens: Stop loading once older messages exceed this budget
+            max_images: Stop loading once older messages exceed this budget
         """
         self.clear()
         channel = message.channel
         if channel:
-            await self.load_messages_from_channel(channel, limit)
+            if self.cache is not None:
+                # Make sure the triggering message is part of a seeded window
+                self.cache.add_message(message)
+            await self.load_messages_from_channel(
+                channel,
+                limit,
+                token_counter=token_counter,
+                max_tokens=max_tokens,
+                max_images=max_images,
+            )
 
     async def load_messages_from_channel(
-        self, channel: TextChannel, limit: int | None = None
+        self,
+        channel: Messageable,
+        limit: int | None = None,
+        token_counter: TokenCounter | None = None,
+        max_tokens: int | None = None,
+        max_images: int | None = None,
     ) -> None:
         """Load messages from a Discord channel into the history.
+
+        Messages are read newest first and loading stops as soon as the
+        messages read so far exceed the token or image budget, so older pages
+        that would be trimmed anyway are never requested. With a captioner,
+        the images of a message beyond what is left of the image budget are
+        sent as captions instead and only the token budget stops loading.
+        With a history cache, the first load of a channel fetches its whole
+        window regardless of the budgets, see DiscordChannelHistoryCache.seed.
+
         Args:
             channel: The channel to load messages from
             limit: Maximum number of messages to load (None for no limit)
+            token_counter: Token counter used to enforce max_tokens
+            max_tokens: Stop loading once older messages exceed this budget
+            max_images: Stop loading once older messages exceed this budget
         """
+        if max_tokens is not None and token_counter is None:
+            raise ValueError("A token_counter is required to enforce max_tokens")
+
         self.clear()
-        async for message in channel.history(limit=limit):
-            self.add_message(message)
+        self.fetched_messages = 0
+        self.fetched_pages = 0
+        self.oldest_message_id = None
+
+        selected: list[BaseMessage] = []
+        tokens = 0
+        images = 0
+        async for message in self._iter_history(channel, limit):
+            captions = None
+            if (
+                self.captioner is not None
+                and max_images is not None
+                and images + sum(is_image(a.content_type) for a in message.attachments)
+                > max_images
+            ):
+                captions = self.captioner.captions(
+                    message, skip=max(0, max_images - images)
+                )
+            msg = render_chat_message(message, captions)
+            selected.append(msg)
+            self.oldest_message_id = message.id
+            if max_tokens is not None:
+                tokens += count_tokens(token_counter, [msg])
+            if max_images is not None:
+                images += count_images(msg)
+            if (max_tokens is not None and tokens > max_tokens) or (
+                max_images is not None and images > max_images
+            ):
+                break
 
         # Reverse to maintain chronological order
-        self.messages.reverse()
+        for msg in reversed(selected):
+            self._append(msg)
+
+    async def _iter_history(
+        self, channel: Messageable, limit: int | None = None
+    ) -> AsyncIterator[Message]:
+        """Iterate over channel messages from newest to oldest."""
+        if self.cache is not None:
+            fetched = await self.cache.seed(channel)
+            self.fetched_messages += fetched
+            self.fetched_pages += math.ceil(fetched / HISTORY_PAGE_SIZE)
+            for message in reversed(await self.cache.history(channel, limit)):
+                yield message
+            return
+
+        async for message in channel.history(limit=limit):
+            self.fetched_messages += 1
+            self.fetched_pages = math.ceil(self.fetched_messages / HISTORY_PAGE_SIZE)
+            yield message
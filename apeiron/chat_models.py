@@ -1,6 +1,7 @@
 from collections.abc import Callable
 from functools import cache
 
+import tiktoken
 from langchain.chat_models import init_chat_model
 from langchain_core.language_models import BaseChatModel
 from mistral_common.tokens.tokenizers.mistral import (
@@ -8,16 +9,33 @@ from mistral_common.tokens.tokenizers.mistral import (
     TokenizerException,
 )
 
+from apeiron.messages.utils import MessageTokenCounter
+
+# Models sharing the tokenizer of a model known by mistral-common
+MISTRAL_TOKENIZER_ALIASES = {
+    "ministral-3b-2410": "ministral-8b-2410",
+    "ministral-3b-latest": "ministral-8b-2410",
+    "ministral-8b-latest": "ministral-8b-2410",
+}
+
 
 @cache
 def get_mistral_tokenizer(model_name: str) -> MistralTokenizer:
     """Get the tokenizer for a given model."""
     try:
-        return MistralTokenizer.from_model(model_name, strict=True)
+        return MistralTokenizer.from_model(
+            MISTRAL_TOKENIZER_ALIASES.get(model_name, model_name), strict=True
+        )
     except TokenizerException:
         return None
 
 
+@cache
+def get_tiktoken_encoding(encoding_name: str = "cl100k_base") -> tiktoken.Encoding:
+    """Get the tiktoken encoding for a given name."""
+    return tiktoken.get_encoding(encoding_name)
+
+
 def create_mistral_get_token_ids(model: str, **kwargs) -> Callable[[str], list[int]]:
     """Create a MistralAI chat model."""
     tokenizer = get_mistral_tokenizer(model)
@@ -30,16 +48,42 @@ def create_mistral_get_token_ids(model: str, **kwargs) -> Callable[[str], list[i
     return _get_token_ids
 
 
+def create_tiktoken_get_token_ids(
+    encoding_name: str = "cl100k_base",
+) -> Callable[[str], list[int]]:
+    """Create a token IDs function backed by a tiktoken encoding."""
+    encoding = get_tiktoken_encoding(encoding_name)
+
+    def _get_token_ids(text: str) -> list[int]:
+        return encoding.encode(text, disallowed_special=())
+
+    return _get_token_ids
+
+
+def _is_mistral_model(model: str, **kwargs) -> bool:
+    return model.startswith("mistralai:") or kwargs.get("model_provider") == "mistralai"
+
+
+def create_token_counter(model: str, **kwargs) -> MessageTokenCounter:
+    """Create a local token counter for the given model.
+
+    Uses the Mistral tokenizer for MistralAI models and falls back to tiktoken
+    for other providers or models unknown to mistral-common.
+    """
+    get_token_ids = None
+    if _is_mistral_model(model, **kwargs):
+        get_token_ids = create_mistral_get_token_ids(model.removeprefix("mistralai:"))
+    if get_token_ids is None:
+        get_token_ids = create_tiktoken_get_token_ids()
+    return MessageTokenCounter(get_token_ids)
+
+
 def create_chat_model(model: str, **kwargs) -> BaseChatModel:
     """Initialize the agent model based on the provider and model name."""
-    if (
-        model.startswith("mistralai:")
-        or kwargs.get("model_provider") == "mistralai"
-        and "custom_get_token_ids" not in kwargs
-    ):
+    if _is_mistral_model(model, **kwargs) and "custom_get_token_ids" not in kwargs:
         custom_get_token_ids = create_mistral_get_token_ids(
             model.removeprefix("mistralai:")
         )
-        if custom_get_token_ids is None:
+        if custom_get_token_ids is not None:
             kwargs["custom_get_token_ids"] = custom_get_token_ids
     return init_chat_model(model, **kwargs)
@@ -0,0 +1,44 @@
+import os
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+from apeiron.checkpoint.memory import BoundedInMemorySaver
+from apeiron.checkpoint.sqlite import SQLiteSaver
+
+
+def _get_optional_env(name: str, default: str) -> str | None:
+    value = os.getenv(name, default)
+    return None if value.lower() in ("", "none") else value
+
+
+def create_checkpointer(**kwargs) -> BaseCheckpointSaver:
+    """Create a checkpointer configured from the environment.
+
+    The backend is selected with APEIRON_CHECKPOINTER, either "memory" or
+    "sqlite" to persist the latest checkpoints to APEIRON_CHECKPOINT_PATH.
+
+    Args:
+        **kwargs: Arguments overriding the environment configuration
+
+    Returns:
+        The created checkpoint saver
+    """
+    max_threads = _get_optional_env("APEIRON_CHECKPOINT_MAX_THREADS", "1024")
+    max_bytes = _get_optional_env("APEIRON_CHECKPOINT_MAX_BYTES", "268435456")
+    ttl = _get_optional_env("APEIRON_CHECKPOINT_TTL", "86400")
+    options = {
+        "max_checkpoints": int(os.getenv("APEIRON_CHECKPOINT_MAX_CHECKPOINTS", "4")),
+        "max_threads": int(max_threads) if max_threads else None,
+        "max_bytes": int(max_bytes) if max_bytes else None,
+        "ttl": float(ttl) if ttl else None,
+    }
+    match os.getenv("APEIRON_CHECKPOINTER", "memory"):
+        case "memory":
+            return BoundedInMemorySaver(**{**options, **kwargs})
+        case "sqlite":
+            options["path"] = os.getenv(
+                "APEIRON_CHECKPOINT_PATH", "/var/lib/apeiron/checkpoints.sqlite"
+            )
+            return SQLiteSaver(**{**options, **kwargs})
+        case checkpointer:
+            raise ValueError(f"Unknown checkpointer: {checkpointer}")
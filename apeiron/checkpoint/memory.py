@@ -0,0 +1,212 @@
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from collections.abc import Sequence
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedInMemorySaver(InMemorySaver):
+    """In-memory checkpoint saver with bounded memory usage.
+
+    Only the most recent checkpoints of each thread are kept, threads idle for
+    longer than ttl are dropped and the least recently used threads are
+    evicted once max_threads or max_bytes is exceeded.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_checkpoints: int = 4,
+        max_threads: int | None = 1024,
+        max_bytes: int | None = 256 * 1024 * 1024,
+        ttl: float | None = 24 * 60 * 60,
+        serde: SerializerProtocol | None = None,
+    ) -> None:
+        """Initialize the saver.
+
+        Args:
+            max_checkpoints: Maximum number of checkpoints kept per thread
+            max_threads: Maximum number of threads kept (None for no limit)
+            max_bytes: Maximum serialized size of all threads (None for no limit)
+            ttl: Seconds after which an idle thread is dropped (None for no limit)
+            serde: The serializer to use for serializing and deserializing
+        """
+        super().__init__(serde=serde)
+        self.max_checkpoints = max_checkpoints
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evictions = 0
+        self.pruned_checkpoints = 0
+        self.size_bytes = 0
+        # thread ID -> last access time, in least recently used order
+        self._last_used: OrderedDict[str, float] = OrderedDict()
+        # thread ID -> serialized size of the thread
+        self._thread_bytes: dict[str, int] = {}
+        # thread ID -> keys of the writes and blobs of the thread
+        self._thread_writes: defaultdict[str, set[tuple[str, str, str]]] = defaultdict(
+            set
+        )
+        self._thread_blobs: defaultdict[str, set[tuple]] = defaultdict(set)
+        # thread ID -> (checkpoint NS, checkpoint ID) -> channel versions
+        self._versions: defaultdict[str, dict[tuple[str, str], ChannelVersions]] = (
+            defaultdict(dict)
+        )
+
+    def stats(self) -> dict[str, int]:
+        """Get the current size and eviction counters."""
+        return {
+            "threads": len(self._last_used),
+            "checkpoints": sum(len(v) for v in self._versions.values()),
+            "bytes": self.size_bytes,
+            "evictions": self.evictions,
+            "pruned_checkpoints": self.pruned_checkpoints,
+        }
+
+    def _touch(self, thread_id: str) -> None:
+        self._last_used[thread_id] = time.monotonic()
+        self._last_used.move_to_end(thread_id)
+
+    def _measure(self, thread_id: str) -> None:
+        """Recompute the serialized size of a thread."""
+        size = 0
+        for checkpoints in self.storage.get(thread_id, {}).values():
+            for checkpoint, metadata, _ in checkpoints.values():
+                size += len(checkpoint[1]) + len(metadata[1])
+        for key in self._thread_blobs.get(thread_id, ()):
+            if blob := self.blobs.get(key):
+                size += len(blob[1])
+        for key in self._thread_writes.get(thread_id, ()):
+            for _, _, value, _ in self.writes.get(key, {}).values():
+                size += len(value[1])
+        self.size_bytes += size - self._thread_bytes.get(thread_id, 0)
+        self._thread_bytes[thread_id] = size
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Drop the oldest checkpoints of a thread beyond max_checkpoints."""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints:
+            return
+        for checkpoint_id in sorted(checkpoints)[: -self.max_checkpoints]:
+            del checkpoints[checkpoint_id]
+            key = (thread_id, checkpoint_ns, checkpoint_id)
+            self.writes.pop(key, None)
+            self._thread_writes[thread_id].discard(key)
+            self._versions[thread_id].pop((checkpoint_ns, checkpoint_id), None)
+            self.pruned_checkpoints += 1
+
+        # Drop the blobs no longer referenced by a remaining checkpoint
+        versions = self._versions[thread_id]
+        referenced = {
+            (thread_id, checkpoint_ns, channel, version)
+            for checkpoint_id in checkpoints
+            for channel, version in versions.get(
+                (checkpoint_ns, checkpoint_id), {}
+            ).items()
+        }
+        blobs = self._thread_blobs[thread_id]
+        for key in [k for k in blobs if k[1] == checkpoint_ns and k not in referenced]:
+            self.blobs.pop(key, None)
+            blobs.discard(key)
+
+    def _evict(self) -> None:
+        """Evict idle and least recently used threads beyond the limits.
+
+        The most recently used thread, which is the one being written, is
+        never evicted.
+        """
+        now = time.monotonic()
+        while len(self._last_used) > 1:
+            thread_id, last_used = next(iter(self._last_used.items()))
+            if not (
+                (self.ttl is not None and now - last_used > self.ttl)
+                or (
+                    self.max_threads is not None
+                    and len(self._last_used) > self.max_threads
+                )
+                or (self.max_bytes is not None and self.size_bytes > self.max_bytes)
+            ):
+                break
+            self._drop_thread(thread_id)
+            self.evictions += 1
+            logger.debug(f"Evicted checkpoints of thread {thread_id}")
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_tuple = super().get_tuple(config)
+        if thread_id in self._last_used:
+            self._touch(thread_id)
+        else:
+            # Do not keep the empty entries created by the lookup of a new thread
+            self.storage.pop(thread_id, None)
+        return checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        self._versions[thread_id][(checkpoint_ns, checkpoint["id"])] = dict(
+            checkpoint["channel_versions"]
+        )
+        self._thread_blobs[thread_id].update(
+            (thread_id, checkpoint_ns, channel, version)
+            for channel, version in new_versions.items()
+        )
+        self._touch(thread_id)
+        self._prune(thread_id, checkpoint_ns)
+        self._measure(thread_id)
+        self._evict()
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        super().put_writes(config, writes, task_id, task_path)
+        thread_id = config["configurable"]["thread_id"]
+        self._thread_writes[thread_id].add(
+            (
+                thread_id,
+                config["configurable"].get("checkpoint_ns", ""),
+                config["configurable"]["checkpoint_id"],
+            )
+        )
+        self._touch(thread_id)
+        self._measure(thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._drop_thread(thread_id)
+
+    def _drop_thread(self, thread_id: str) -> None:
+        """Remove a thread from memory."""
+        self.storage.pop(thread_id, None)
+        for checkpoint_ns, checkpoint_id in self._versions.pop(thread_id, {}):
+            # Lookups also create empty pending writes for every checkpoint read
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        for key in self._thread_writes.pop(thread_id, ()):
+            self.writes.pop(key, None)
+        for key in self._thread_blobs.pop(thread_id, ()):
+            self.blobs.pop(key, None)
+        self.size_bytes -= self._thread_bytes.pop(thread_id, 0)
+        self._last_used.pop(thread_id, None)
@@ -0,0 +1,429 @@
+import asyncio
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from collections.abc import Sequence
+from os import PathLike
+from pathlib import Path
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+)
+
+from apeiron.checkpoint.memory import BoundedInMemorySaver
+
+logger = logging.getLogger(__name__)
+
+# Queued to make the writer flush its batch without waiting for more writes
+FLUSH = ("", ("flush",))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE INDEX IF NOT EXISTS checkpoints_updated_at ON checkpoints (updated_at);
+"""
+
+
+def connect(path: str | PathLike) -> sqlite3.Connection:
+    """Open a SQLite connection in WAL mode."""
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteSaver(BoundedInMemorySaver):
+    """Bounded in-memory checkpoint saver persisted to a local SQLite file.
+
+    Checkpoints are served from memory and written behind to SQLite by a
+    background thread in batched transactions, so graph runs never wait on
+    disk. Only the latest checkpoint of each thread is persisted and it is
+    read back the first time a thread is accessed after a restart or after
+    being evicted from memory.
+    """
+
+    def __init__(
+        self,
+        path: str | PathLike,
+        *,
+        flush_interval: float = 1.0,
+        batch_size: int = 256,
+        retention: float | None = 30 * 24 * 60 * 60,
+        serde: SerializerProtocol | None = None,
+        **kwargs,
+    ) -> None:
+        """Initialize the saver.
+
+        Args:
+            path: Path of the SQLite database file
+            flush_interval: Maximum seconds a write waits before being flushed
+            batch_size: Maximum number of writes flushed in one transaction
+            retention: Seconds after which idle threads are deleted from disk
+            serde: The serializer to use for serializing and deserializing
+            **kwargs: Arguments passed to BoundedInMemorySaver
+        """
+        super().__init__(serde=serde, **kwargs)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.flushes = 0
+
+        self._conn = connect(self.path)
+        self._conn.executescript(SCHEMA)
+        if retention is not None:
+            self._delete_expired(self._conn, time.time() - retention)
+
+        self._queue: queue.Queue[tuple | None] = queue.Queue()
+        self._pending: Counter[str] = Counter()
+        # Notified whenever writes of a thread reach the disk
+        self._pending_lock = threading.Condition()
+        self._read_lock = threading.Lock()
+        self._writer = threading.Thread(
+            target=self._run_writer, name="apeiron-checkpoint-writer", daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.close)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            **super().stats(),
+            "pending_writes": self._queue.qsize(),
+            "flushes": self.flushes,
+        }
+
+    def _enqueue(self, thread_id: str, op: tuple) -> None:
+        with self._pending_lock:
+            self._pending[thread_id] += 1
+        self._queue.put((thread_id, op))
+
+    def _run_writer(self) -> None:
+        conn = connect(self.path)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    self._queue.task_done()
+                    return
+                if item is FLUSH:
+                    self._queue.task_done()
+                    continue
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(
+                            timeout=max(0.0, deadline - time.monotonic())
+                        )
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._queue.put(None)
+                        self._queue.task_done()
+                        break
+                    if item is FLUSH:
+                        self._queue.task_done()
+                        break
+                    batch.append(item)
+                try:
+                    self._write_batch(conn, batch)
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to persist checkpoints: {e}")
+                finally:
+                    with self._pending_lock:
+                        for thread_id, _ in batch:
+                            self._pending[thread_id] -= 1
+                            if self._pending[thread_id] <= 0:
+                                del self._pending[thread_id]
+                        self._pending_lock.notify_all()
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: list[tuple]) -> None:
+        with conn:
+            conn.execute("BEGIN")
+            for thread_id, (kind, *args) in batch:
+                match kind:
+                    case "put":
+                        self._write_checkpoint(conn, thread_id, *args)
+                    case "writes":
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO writes VALUES "
+                            "(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            args[0],
+                        )
+                    case "delete":
+                        for table in ("checkpoints", "blobs", "writes"):
+                            conn.execute(
+                                f"DELETE FROM {table} WHERE thread_id = ?",
+                                (thread_id,),
+                            )
+        self.flushes += 1
+
+    def _write_checkpoint(
+        self,
+        conn: sqlite3.Connection,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        parent_checkpoint_id: str | None,
+        checkpoint: tuple[str, bytes],
+        metadata: tuple[str, bytes],
+        blobs: list[tuple[str, str, str, bytes]],
+    ) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                thread_id,
+                checkpoint_ns,
+                checkpoint_id,
+                parent_checkpoint_id,
+                *checkpoint,
+                *metadata,
+                time.time(),
+            ),
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+            [(thread_id, checkpoint_ns, *blob) for blob in blobs],
+        )
+        # Only the pending writes of the latest checkpoint are kept
+        conn.execute(
+            "DELETE FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    @staticmethod
+    def _delete_expired(conn: sqlite3.Connection, before: float) -> None:
+        with conn:
+            conn.execute("BEGIN")
+            expired = conn.execute(
+                "SELECT thread_id, checkpoint_ns FROM checkpoints WHERE updated_at < ?",
+                (before,),
+            ).fetchall()
+            for table in ("checkpoints", "blobs", "writes"):
+                conn.executemany(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ?",
+                    expired,
+                )
+        if expired:
+            logger.info(f"Deleted {len(expired)} expired checkpoints")
+
+    def _read_thread(self, thread_id: str) -> list[tuple]:
+        """Read the latest checkpoints of a thread from disk.
+
+        Waits for the queued writes of this thread only, in case it was
+        evicted before they reached the disk.
+
+        Returns:
+            The checkpoint rows, each with its blob and write rows
+        """
+        with self._pending_lock:
+            if self._pending[thread_id] > 0:
+                self._queue.put(FLUSH)
+                self._pending_lock.wait_for(lambda: self._pending[thread_id] <= 0)
+
+        with self._read_lock:
+            rows = self._conn.execute(
+                "SELECT checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, "
+                "checkpoint, metadata_type, metadata FROM checkpoints "
+                "WHERE thread_id = ?",
+                (thread_id,),
+            ).fetchall()
+            return [
+                (
+                    row,
+                    self._conn.execute(
+                        "SELECT channel, version, type, blob FROM blobs "
+                        "WHERE thread_id = ? AND checkpoint_ns = ?",
+                        (thread_id, row[0]),
+                    ).fetchall(),
+                    self._conn.execute(
+                        "SELECT task_id, idx, channel, type, value, task_path "
+                        "FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+                        "AND checkpoint_id = ?",
+                        (thread_id, row[0], row[1]),
+                    ).fetchall(),
+                )
+                for row in rows
+            ]
+
+    def _apply_thread(self, thread_id: str, rows: list[tuple]) -> None:
+        """Load checkpoint rows read from disk into memory."""
+        if not rows:
+            return
+
+        for checkpoint_row, blob_rows, write_rows in rows:
+            ns, checkpoint_id, parent_id, type_, checkpoint, mtype, metadata = (
+                checkpoint_row
+            )
+            self.storage[thread_id][ns][checkpoint_id] = (
+                (type_, checkpoint),
+                (mtype, metadata),
+                parent_id,
+            )
+            versions = {}
+            for channel, version, btype, blob in blob_rows:
+                key = (thread_id, ns, channel, version)
+                self.blobs[key] = (btype, blob)
+                self._thread_blobs[thread_id].add(key)
+                versions[channel] = version
+            self._versions[thread_id][(ns, checkpoint_id)] = versions
+
+            writes_key = (thread_id, ns, checkpoint_id)
+            for task_id, idx, channel, wtype, value, task_path in write_rows:
+                self.writes[writes_key][(task_id, idx)] = (
+                    task_id,
+                    channel,
+                    (wtype, value),
+                    task_path,
+                )
+                self._thread_writes[thread_id].add(writes_key)
+
+        self._touch(thread_id)
+        self._measure(thread_id)
+        self._evict()
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        if thread_id not in self._last_used:
+            self._apply_thread(thread_id, self._read_thread(thread_id))
+        return super().get_tuple(config)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        if thread_id not in self._last_used:
+            # Read off the event loop, a thread may wait for its writes
+            rows = await asyncio.to_thread(self._read_thread, thread_id)
+            # Unless the thread was written to meanwhile
+            if thread_id not in self._last_used:
+                self._apply_thread(thread_id, rows)
+        return super().get_tuple(config)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        # Reuse the values serialized by the in-memory saver
+        saved = self.storage.get(thread_id, {}).get(checkpoint_ns, {})
+        if checkpoint["id"] in saved:
+            serialized, serialized_metadata, parent_checkpoint_id = saved[
+                checkpoint["id"]
+            ]
+            blobs = [
+                (channel, str(version), *self.blobs[key])
+                for channel, version in new_versions.items()
+                if (key := (thread_id, checkpoint_ns, channel, version)) in self.blobs
+            ]
+            self._enqueue(
+                thread_id,
+                (
+                    "put",
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    parent_checkpoint_id,
+                    serialized,
+                    serialized_metadata,
+                    blobs,
+                ),
+            )
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        super().put_writes(config, writes, task_id, task_path)
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        saved = self.writes.get((thread_id, checkpoint_ns, checkpoint_id), {})
+        rows = [
+            (
+                thread_id,
+                checkpoint_ns,
+                checkpoint_id,
+                task_id,
+                idx,
+                channel,
+                *value,
+                path,
+            )
+            for (write_task_id, idx), (_, channel, value, path) in saved.items()
+            if write_task_id == task_id
+        ]
+        if rows:
+            self._enqueue(thread_id, ("writes", rows))
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        self._enqueue(thread_id, ("delete",))
+
+    def flush(self) -> None:
+        """Block until all queued writes are persisted."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Flush queued writes and stop the background writer."""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._conn.close()
+        atexit.unregister(self.close)
+
+    async def aclose(self) -> None:
+        """Flush queued writes without blocking the event loop."""
+        await asyncio.to_thread(self.close)
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable, Hashable
+
+from discord import Message
+
+logger = logging.getLogger(__name__)
+
+type BatchHandler = Callable[[list[Message]], Awaitable[None]]
+
+
+class MessageCoalescer:
+    """Serialize and coalesce message handling per key.
+
+    Messages submitted for the same key (usually the thread ID) are queued
+    and handled by a single worker, so runs on a key never overlap. A message
+    arriving while no batch runs for its key is handled right away. Messages
+    arriving while a batch runs are folded into the next batch, handled once
+    no message arrived for `window` seconds (at most `max_delay` seconds).
+    """
+
+    def __init__(
+        self,
+        handler: BatchHandler,
+        key: Callable[[Message], Hashable],
+        window: float = 1.5,
+        max_delay: float = 5.0,
+        max_batch_size: int = 10,
+    ) -> None:
+        """Initialize the coalescer.
+
+        Args:
+            handler: Coroutine function handling a batch of messages
+            key: Function returning the key messages are coalesced by
+            window: Seconds without new messages before a batch queued behind
+                a running one is handled
+            max_delay: Maximum seconds the first message of a batch waits
+            max_batch_size: Maximum number of messages per batch
+        """
+        self.handler = handler
+        self.key = key
+        self.window = window
+        self.max_delay = max_delay
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.coalesced = 0
+        self._queues: dict[Hashable, list[tuple[Message, asyncio.Future]]] = {}
+        self._last_arrival: dict[Hashable, float] = {}
+        self._workers: dict[Hashable, asyncio.Task] = {}
+
+    def stats(self) -> dict[str, int]:
+        """Get the batch counters and the number of queued messages."""
+        return {
+            "batches": self.batches,
+            "coalesced": self.coalesced,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "active": len(self._workers),
+        }
+
+    async def submit(self, message: Message) -> None:
+        """Queue a message and wait until the batch holding it is handled.
+
+        Raises:
+            Exception: Any exception raised by the handler for the batch
+        """
+        key = self.key(message)
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, []).append((message, future))
+        self._last_arrival[key] = time.monotonic()
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._work(key))
+        await future
+
+    async def _debounce(self, key: Hashable) -> None:
+        started = time.monotonic()
+        while len(self._queues[key]) < self.max_batch_size:
+            now = time.monotonic()
+            remaining = min(
+                self._last_arrival[key] + self.window - now,
+                started + self.max_delay - now,
+            )
+            if remaining <= 0:
+                break
+            await asyncio.sleep(remaining)
+
+    async def _work(self, key: Hashable) -> None:
+        try:
+            # Only batches queued behind a running one wait for more messages
+            idle = True
+            while self._queues.get(key):
+                if not idle:
+                    await self._debounce(key)
+                idle = False
+                queue = self._queues[key]
+                batch = queue[: self.max_batch_size]
+                self._queues[key] = queue[self.max_batch_size :]
+                self.batches += 1
+                self.coalesced += len(batch) - 1
+                if len(batch) > 1:
+                    logger.info(f"Coalesced {len(batch)} messages for {key}")
+                try:
+                    await self.handler([message for message, _ in batch])
+                except asyncio.CancelledError:
+                    self._queues[key] = batch + self._queues[key]
+                    raise
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_result(None)
+        finally:
+            del self._workers[key]
+            self._last_arrival.pop(key, None)
+            for _, future in self._queues.pop(key, []):
+                future.cancel()
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+from contextlib import suppress
+
+from discord import Message
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.runnables import Runnable
+from langgraph.store.base import BaseStore
+from langmem import create_memory_store_manager
+
+logger = logging.getLogger(__name__)
+
+MEMORY_NAMESPACE = "memories"
+
+MEMORY_INSTRUCTIONS = """\
+Extract durable facts worth remembering about the users of this Discord
+channel and about the channel itself: who people are, their preferences,
+projects, recurring topics and agreements. Ignore small talk and anything
+only relevant to the current moment. Keep each memory short and name the
+user it is about."""
+
+
+def create_memory_namespace(message: Message) -> tuple[str, ...]:
+    """Create the store namespace of the memories of a message's channel."""
+    return (
+        MEMORY_NAMESPACE,
+        "guild",
+        str(message.guild.id) if message.guild else "__private__",
+        "channel",
+        str(message.channel.id),
+    )
+
+
+def create_memory_manager(model: BaseChatModel, store: BaseStore) -> Runnable:
+    """Create a langmem manager consolidating memories of a channel."""
+    return create_memory_store_manager(
+        model,
+        instructions=MEMORY_INSTRUCTIONS,
+        enable_inserts=True,
+        enable_deletes=True,
+        namespace=(
+            MEMORY_NAMESPACE,
+            "guild",
+            "{guild_id}",
+            "channel",
+            "{channel_id}",
+        ),
+        store=store,
+    )
+
+
+def create_turn(messages: list[Message], replies: list[Message]) -> list[BaseMessage]:
+    """Render a finished turn as plain chat messages for extraction."""
+    turn: list[BaseMessage] = [
+        HumanMessage(
+            content=f"{message.author.display_name} "
+            f"(ID {message.author.id}): {message.content}"
+        )
+        for message in messages
+        if message.content
+    ]
+    if reply := "\n".join(reply.content for reply in replies if reply.content):
+        turn.append(AIMessage(content=reply))
+    return turn
+
+
+class MemoryConsolidator:
+    """Background worker extracting durable memories from finished turns.
+
+    Turns are queued once a reply has been sent and a single worker task
+    consolidates them with a memory manager, off the reply path. Queued
+    turns of the same channel are merged into one extraction, extractions
+    are spaced by at least `interval` seconds, and turns submitted while
+    the queue is full are dropped rather than delaying anything.
+    """
+
+    def __init__(
+        self,
+        manager: Runnable,
+        max_queue: int = 256,
+        max_batch_size: int = 16,
+        interval: float = 5.0,
+    ) -> None:
+        """Initialize the worker, started on the first submitted turn.
+
+        Args:
+            manager: Runnable consolidating messages into the store
+            max_queue: Maximum number of turns waiting to be consolidated
+            max_batch_size: Maximum number of turns pulled at once
+            interval: Minimum seconds between two extractions
+        """
+        self.manager = manager
+        self.max_batch_size = max_batch_size
+        self.interval = interval
+        self.submitted = 0
+        self.dropped = 0
+        self.extractions = 0
+        self.failures = 0
+        self._queue: asyncio.Queue[tuple[Message, list[BaseMessage]]] = asyncio.Queue(
+            maxsize=max_queue
+        )
+        self._worker: asyncio.Task | None = None
+        self._next_run = 0.0
+
+    def stats(self) -> dict[str, int]:
+        """Get the backlog and the extraction counters."""
+        return {
+            "backlog": self._queue.qsize(),
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "extractions": self.extractions,
+            "failures": self.failures,
+        }
+
+    def submit(
+        self, messages: list[Message], replies: list[Message] | None = None
+    ) -> bool:
+        """Queue a finished turn without waiting.
+
+        Returns:
+            Whether the turn was queued, False if the backlog is full
+        """
+        turn = create_turn(messages, replies or [])
+        if not turn:
+            return False
+        try:
+            self._queue.put_nowait((messages[-1], turn))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Dropping turn of message {messages[-1].id} for memory")
+            return False
+        self.submitted += 1
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._work())
+        return True
+
+    async def close(self) -> None:
+        """Cancel the worker, dropping the turns not consolidated yet."""
+        if self._worker is not None:
+            self._worker.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+
+    def _pull(self) -> dict[tuple[str, ...], tuple[Message, list[BaseMessage]]]:
+        # Merge the turns of each channel in submission order
+        groups: dict[tuple[str, ...], tuple[Message, list[BaseMessage]]] = {}
+        for _ in range(min(self._queue.qsize(), self.max_batch_size)):
+            message, turn = self._queue.get_nowait()
+            namespace = create_memory_namespace(message)
+            if namespace in groups:
+                groups[namespace][1].extend(turn)
+            else:
+                groups[namespace] = (message, list(turn))
+        return groups
+
+    async def _work(self) -> None:
+        while not self._queue.empty():
+            for message, turn in self._pull().values():
+                delay = self._next_run - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._next_run = time.monotonic() + self.interval
+                await self._extract(message, turn)
+
+    async def _extract(self, message: Message, turn: list[BaseMessage]) -> None:
+        config = {
+            "configurable": {
+                "guild_id": str(message.guild.id) if message.guild else "__private__",
+                "channel_id": str(message.channel.id),
+            }
+        }
+        started = time.monotonic()
+        try:
+            updates = await self.manager.ainvoke({"messages": turn}, config=config)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to consolidate memories: {str(e)}")
+            return
+        self.extractions += 1
+        logger.info(
+            f"Consolidated {len(updates)} memories from {len(turn)} messages "
+            f"of channel {message.channel.id} in {time.monotonic() - started:.2f}s"
+        )
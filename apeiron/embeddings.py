@@ -0,0 +1,334 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from os import PathLike
+from pathlib import Path
+
+import numpy as np
+from langchain.embeddings import init_embeddings
+from langchain_core.embeddings import Embeddings
+
+from apeiron.checkpoint.sqlite import connect
+from apeiron.utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    hash TEXT PRIMARY KEY,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+"""
+
+
+class EmbeddingCache:
+    """On-disk cache of embedding vectors keyed by content hash.
+
+    Vectors are stored as float32 blobs in SQLite and the least recently
+    used ones are evicted once the cache grows over max_bytes.
+    """
+
+    def __init__(self, path: str | PathLike, max_bytes: int = 512 * 1024 * 1024):
+        """Open or create a cache.
+
+        Args:
+            path: Path of the SQLite database file
+            max_bytes: Maximum total size of the cached vectors
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.conn = connect(self.path)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        (self.size_bytes,) = self.conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        """Get the cached vectors of the given keys."""
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                found.update(
+                    (key, np.frombuffer(vector, dtype=np.float32).tolist())
+                    for key, vector in self.conn.execute(
+                        "SELECT hash, vector FROM embeddings"
+                        f" WHERE hash IN ({placeholders})",
+                        chunk,
+                    )
+                )
+                self.conn.execute(
+                    "UPDATE embeddings SET last_used = ?"
+                    f" WHERE hash IN ({placeholders})",
+                    (time.time(), *chunk),
+                )
+        return found
+
+    def put_many(self, vectors: dict[str, list[float]]) -> None:
+        """Cache vectors, evicting the least recently used ones when full."""
+        now = time.time()
+        records = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in vectors.items()
+        ]
+        keys = list(vectors)
+        with self.lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                # Replaced vectors no longer count towards the size
+                replaced = 0
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start : start + 500]
+                    placeholders = ", ".join("?" * len(chunk))
+                    (size,) = self.conn.execute(
+                        "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+                        f" WHERE hash IN ({placeholders})",
+                        chunk,
+                    ).fetchone()
+                    replaced += size
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", records
+                )
+            self.size_bytes += sum(len(record[1]) for record in records) - replaced
+            if self.size_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Evict down to 90% of the limit so eviction does not run on every put
+        target = self.max_bytes * 0.9
+        with self.conn:
+            self.conn.execute("BEGIN")
+            cursor = self.conn.execute(
+                "SELECT hash, LENGTH(vector) FROM embeddings ORDER BY last_used"
+            )
+            evicted = []
+            for key, size in cursor:
+                if self.size_bytes <= target:
+                    break
+                evicted.append((key,))
+                self.size_bytes -= size
+            self.conn.executemany("DELETE FROM embeddings WHERE hash = ?", evicted)
+        self.evictions += len(evicted)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper deduplicating, caching and micro-batching requests.
+
+    Texts are keyed by a hash of the model and content. Known vectors are
+    served from an in-memory LRU backed by an optional EmbeddingCache, and
+    concurrent async requests for unknown documents arriving within
+    batch_window are merged into a single call to the wrapped embeddings.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        cache: EmbeddingCache | None = None,
+        maxsize: int = 4096,
+        batch_window: float = 0.01,
+        max_batch_size: int = 128,
+    ) -> None:
+        """Initialize the wrapper.
+
+        Args:
+            embeddings: The embeddings to wrap
+            model: Model name, part of the cache key
+            cache: Optional on-disk cache shared across restarts
+            maxsize: Maximum number of vectors kept in memory
+            batch_window: Seconds to wait for more texts before embedding
+            max_batch_size: Maximum number of texts per embedding request
+        """
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+        self.memory: LRUCache[str, list[float]] = LRUCache(maxsize=maxsize)
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.requests = 0
+        self.embedded = 0
+        self._inflight: dict[str, asyncio.Future[list[float]]] = {}
+        self._pending: dict[str, str] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def stats(self) -> dict[str, int]:
+        """Get the cache and request counters."""
+        return {
+            **self.memory.stats(),
+            "requests": self.requests,
+            "embedded": self.embedded,
+            "disk_evictions": self.cache.evictions if self.cache else 0,
+        }
+
+    def _key(self, text: str, kind: str = "document") -> str:
+        return hashlib.sha256(f"{self.model}\0{kind}\0{text}".encode()).hexdigest()
+
+    def _lookup_memory(self, keys: list[str]) -> dict[str, list[float]]:
+        return {
+            key: vector for key in keys if (vector := self.memory.get(key)) is not None
+        }
+
+    def _put_memory(self, vectors: dict[str, list[float]]) -> None:
+        for key, vector in vectors.items():
+            self.memory.put(key, vector)
+
+    def _lookup(self, keys: list[str]) -> dict[str, list[float]]:
+        found = self._lookup_memory(keys)
+        missing = [key for key in keys if key not in found]
+        if missing and self.cache is not None:
+            cached = self.cache.get_many(missing)
+            self._put_memory(cached)
+            found.update(cached)
+        return found
+
+    def _store(self, vectors: dict[str, list[float]]) -> None:
+        self._put_memory(vectors)
+        if self.cache is not None:
+            self.cache.put_many(vectors)
+
+    async def _alookup(self, keys: list[str]) -> dict[str, list[float]]:
+        found = self._lookup_memory(keys)
+        missing = [key for key in keys if key not in found]
+        if missing and self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get_many, missing)
+            self._put_memory(cached)
+            found.update(cached)
+        return found
+
+    async def _astore(self, vectors: dict[str, list[float]]) -> None:
+        self._put_memory(vectors)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put_many, vectors)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        missing = {key: text for key, text in zip(keys, texts, strict=True)}
+        missing = {key: text for key, text in missing.items() if key not in found}
+        if missing:
+            self.requests += 1
+            self.embedded += len(missing)
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing, vectors, strict=True))
+            self._store(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self._key(text, "query")
+        found = self._lookup([key])
+        if key not in found:
+            self.requests += 1
+            self.embedded += 1
+            found[key] = self.embeddings.embed_query(text)
+            self._store({key: found[key]})
+        return found[key]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self._key(text) for text in texts]
+        found = await self._alookup(list(dict.fromkeys(keys)))
+        futures = {
+            key: self._submit(key, text)
+            for key, text in zip(keys, texts, strict=True)
+            if key not in found
+        }
+        if futures:
+            # Shielded so a cancelled caller does not fail the shared batch
+            vectors = await asyncio.gather(
+                *(asyncio.shield(future) for future in futures.values())
+            )
+            found.update(zip(futures, vectors, strict=True))
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        key = self._key(text, "query")
+        found = await self._alookup([key])
+        if key in found:
+            return found[key]
+        if (task := self._inflight.get(key)) is None:
+            # Run in a task shared by the callers, so cancelling one of them
+            # neither cancels the request nor leaves the others waiting
+            task = asyncio.create_task(self._embed_query(key, text))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _embed_query(self, key: str, text: str) -> list[float]:
+        self.requests += 1
+        self.embedded += 1
+        vector = await self.embeddings.aembed_query(text)
+        await self._astore({key: vector})
+        return vector
+
+    def _submit(self, key: str, text: str) -> asyncio.Future[list[float]]:
+        """Queue a document for the next batch, sharing in-flight requests."""
+        if key in self._inflight:
+            return self._inflight[key]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[key] = future
+        self._pending[key] = text
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        if pending:
+            # Keep a reference so the batch is not collected mid-flight
+            task = asyncio.create_task(self._embed_batch(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _embed_batch(self, pending: dict[str, str]) -> None:
+        try:
+            self.requests += 1
+            self.embedded += len(pending)
+            vectors = await self.embeddings.aembed_documents(list(pending.values()))
+            computed = dict(zip(pending, vectors, strict=True))
+            await self._astore(computed)
+        except asyncio.CancelledError:
+            for key in pending:
+                if (future := self._inflight.pop(key, None)) and not future.done():
+                    future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Failed to embed {len(pending)} documents: {e}")
+            for key in pending:
+                if (future := self._inflight.pop(key, None)) and not future.done():
+                    future.set_exception(e)
+            return
+        for key, vector in computed.items():
+            if (future := self._inflight.pop(key, None)) and not future.done():
+                future.set_result(vector)
+
+
+def create_embeddings(model: str, **kwargs) -> Embeddings:
+    """Initialize cached embeddings based on the provider and model name.
+
+    Vectors are persisted to APEIRON_EMBEDDING_CACHE_PATH when it is set.
+    """
+    cache = None
+    if path := os.getenv("APEIRON_EMBEDDING_CACHE_PATH"):
+        cache = EmbeddingCache(
+            path,
+            max_bytes=int(
+                os.getenv("APEIRON_EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024))
+            ),
+        )
+    return CachedEmbeddings(init_embeddings(model, **kwargs), model=model, cache=cache)
@@ -0,0 +1,407 @@
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from os import PathLike
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+import aiohttp
+from langchain_core.messages import BaseMessage
+from PIL import Image, ImageOps
+
+from apeiron.checkpoint.sqlite import connect
+from apeiron.utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    hash TEXT PRIMARY KEY,
+    mime TEXT NOT NULL,
+    data BLOB NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_last_used ON images (last_used);
+CREATE TABLE IF NOT EXISTS sources (
+    url TEXT PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS captions (
+    hash TEXT PRIMARY KEY,
+    caption TEXT NOT NULL
+);
+"""
+
+
+class ImageTooLargeError(Exception):
+    """Raised when an image exceeds the download size cap."""
+
+
+def source_key(url: str) -> str:
+    """Get the cache key of an image URL.
+
+    Discord CDN URLs carry expiring signature parameters, while the path
+    (channel, attachment ID and filename) identifies the upload.
+    """
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+
+
+def encode_image(data: bytes, max_size: int, quality: int = 85) -> tuple[str, bytes]:
+    """Downscale an image to fit max_size pixels and re-encode it compactly.
+
+    Opaque images are encoded as JPEG and transparent ones as PNG. Only the
+    first frame of animated images is kept.
+
+    Returns:
+        The MIME type and the encoded bytes
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        # Let the JPEG decoder downscale while decoding
+        image.draft("RGB", (max_size, max_size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size))
+        output = io.BytesIO()
+        if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+            image.convert("RGBA").save(output, "PNG", optimize=True)
+            return "image/png", output.getvalue()
+        image.convert("RGB").save(output, "JPEG", quality=quality, optimize=True)
+        return "image/jpeg", output.getvalue()
+
+
+class ImageCache:
+    """On-disk cache of encoded images keyed by content hash.
+
+    Images are stored as blobs in SQLite alongside the source URLs they
+    were downloaded from, and the least recently used ones are evicted once
+    the cache grows over max_bytes. Captions are kept by content hash even
+    once their image is evicted, they are a few bytes each.
+    """
+
+    def __init__(self, path: str | PathLike, max_bytes: int = 256 * 1024 * 1024):
+        """Open or create a cache.
+
+        Args:
+            path: Path of the SQLite database file
+            max_bytes: Maximum total size of the cached images
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.conn = connect(self.path)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        (self.size_bytes,) = self.conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM images"
+        ).fetchone()
+
+    def get_source(self, url: str) -> tuple[str, bytes] | None:
+        """Get the cached image downloaded from a source URL."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT images.hash, mime, data FROM sources"
+                " JOIN images ON images.hash = sources.hash WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE images SET last_used = ? WHERE hash = ?", (time.time(), row[0])
+            )
+        return row[1], row[2]
+
+    def get(self, key: str, url: str) -> tuple[str, bytes] | None:
+        """Get a cached image by content hash, recording its source URL."""
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            row = self.conn.execute(
+                "SELECT mime, data FROM images WHERE hash = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE images SET last_used = ? WHERE hash = ?", (time.time(), key)
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?)", (url, key)
+            )
+        return row
+
+    def put(self, key: str, url: str, mime: str, data: bytes) -> None:
+        """Cache an image, evicting the least recently used ones when full."""
+        with self.lock:
+            with self.conn:
+                self.conn.execute("BEGIN")
+                # The same content may be downloaded from two URLs at once
+                (replaced,) = self.conn.execute(
+                    "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM images WHERE hash = ?",
+                    (key,),
+                ).fetchone()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)",
+                    (key, mime, data, time.time()),
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sources VALUES (?, ?)", (url, key)
+                )
+            self.size_bytes += len(data) - replaced
+            if self.size_bytes > self.max_bytes:
+                self._evict()
+
+    def get_caption(self, url: str) -> str | None:
+        """Get the caption of the image downloaded from a source URL."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT caption FROM sources"
+                " JOIN captions ON captions.hash = sources.hash WHERE url = ?",
+                (url,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_caption(self, url: str, caption: str) -> None:
+        """Cache the caption of the image downloaded from a source URL."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO captions"
+                " SELECT hash, ? FROM sources WHERE url = ?",
+                (caption, url),
+            )
+
+    def _evict(self) -> None:
+        # Evict down to 90% of the limit so eviction does not run on every put
+        target = self.max_bytes * 0.9
+        with self.conn:
+            self.conn.execute("BEGIN")
+            cursor = self.conn.execute(
+                "SELECT hash, LENGTH(data) FROM images ORDER BY last_used"
+            )
+            evicted = []
+            for key, size in cursor:
+                if self.size_bytes <= target:
+                    break
+                evicted.append((key,))
+                self.size_bytes -= size
+            self.conn.executemany("DELETE FROM images WHERE hash = ?", evicted)
+            self.conn.executemany("DELETE FROM sources WHERE hash = ?", evicted)
+        self.evictions += len(evicted)
+
+
+class ImagePipeline:
+    """Inline image attachments as compact data URLs.
+
+    Each image is downloaded once, up to max_download_bytes, downscaled to
+    fit max_size pixels and re-encoded in a worker thread. Encoded images
+    are kept in memory and in an optional ImageCache keyed by the hash of
+    the original content, so reposted images are only encoded once and
+    expired CDN links keep working. Concurrent requests for the same image
+    share a single download.
+    """
+
+    def __init__(
+        self,
+        cache: ImageCache | None = None,
+        max_size: int = 1024,
+        quality: int = 85,
+        max_download_bytes: int = 20 * 1024 * 1024,
+        timeout: float = 10.0,
+        maxsize: int = 64,
+    ) -> None:
+        """Initialize the pipeline.
+
+        Args:
+            cache: Optional on-disk cache shared across restarts
+            max_size: Maximum width and height of the encoded images
+            quality: JPEG quality of the encoded images
+            max_download_bytes: Images larger than this are not downloaded
+            timeout: Seconds after which a download is abandoned
+            maxsize: Maximum number of data URLs kept in memory
+        """
+        self.cache = cache
+        self.max_size = max_size
+        self.quality = quality
+        self.max_download_bytes = max_download_bytes
+        self.timeout = timeout
+        self.memory: LRUCache[str, str] = LRUCache(maxsize=maxsize)
+        self.downloads = 0
+        self.disk_hits = 0
+        self.failures = 0
+        self.downloaded_bytes = 0
+        self.encoded_bytes = 0
+        self._inflight: dict[str, asyncio.Future[str | None]] = {}
+        self._session: aiohttp.ClientSession | None = None
+
+    def stats(self) -> dict[str, int]:
+        """Get the cache, download and size counters."""
+        stats = {
+            "memory": self.memory.stats(),
+            "disk_hits": self.disk_hits,
+            "downloads": self.downloads,
+            "failures": self.failures,
+            "downloaded_bytes": self.downloaded_bytes,
+            "encoded_bytes": self.encoded_bytes,
+        }
+        if self.cache is not None:
+            stats["disk_bytes"] = self.cache.size_bytes
+            stats["disk_evictions"] = self.cache.evictions
+        return stats
+
+    async def inline(self, messages: list[BaseMessage]) -> list[BaseMessage]:
+        """Replace the image URLs of messages with data URLs.
+
+        Images that cannot be downloaded or decoded keep their URL.
+        """
+        urls = {
+            url
+            for message in messages
+            for part in _image_parts(message)
+            if not (url := _image_url(part)).startswith("data:")
+        }
+        if not urls:
+            return messages
+        data_urls = dict(
+            zip(
+                urls,
+                await asyncio.gather(*(self.data_url(url) for url in urls)),
+                strict=True,
+            )
+        )
+
+        inlined = []
+        for message in messages:
+            if next(_image_parts(message), None) is None:
+                inlined.append(message)
+                continue
+            content = []
+            for part in message.content:
+                if (
+                    isinstance(part, dict)
+                    and part.get("type") == "image_url"
+                    and (data_url := data_urls.get(_image_url(part)))
+                ):
+                    part = {**part, "image_url": data_url}
+                content.append(part)
+            inlined.append(message.model_copy(update={"content": content}))
+        return inlined
+
+    async def data_url(self, url: str) -> str | None:
+        """Get the data URL of an image, None if it cannot be inlined."""
+        key = source_key(url)
+        if (data_url := self.memory.get(key)) is not None:
+            return data_url
+        if (future := self._inflight.get(key)) is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data_url = await self._load(url, key)
+        except asyncio.CancelledError:
+            # The callers sharing the download fall back to the URL
+            future.set_result(None)
+            raise
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Failed to inline image {key}: {str(e)}")
+            data_url = None
+        finally:
+            del self._inflight[key]
+        future.set_result(data_url)
+        if data_url is not None:
+            self.memory.put(key, data_url)
+        return data_url
+
+    async def _load(self, url: str, key: str) -> str:
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get_source, key)
+            if cached is not None:
+                self.disk_hits += 1
+                return _to_data_url(*cached)
+
+        data = await self._download(url)
+        content_hash = "/".join(
+            [
+                hashlib.sha256(data).hexdigest(),
+                str(self.max_size),
+                str(self.quality),
+            ]
+        )
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, content_hash, key)
+            if cached is not None:
+                self.disk_hits += 1
+                return _to_data_url(*cached)
+
+        mime, encoded = await asyncio.to_thread(
+            encode_image, data, self.max_size, self.quality
+        )
+        self.encoded_bytes += len(encoded)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, content_hash, key, mime, encoded)
+        return _to_data_url(mime, encoded)
+
+    async def _download(self, url: str) -> bytes:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        async with self._session.get(url) as response:
+            response.raise_for_status()
+            if (response.content_length or 0) > self.max_download_bytes:
+                raise ImageTooLargeError(f"{response.content_length} bytes")
+            data = bytearray()
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                data += chunk
+                if len(data) > self.max_download_bytes:
+                    raise ImageTooLargeError(f"Over {self.max_download_bytes} bytes")
+        self.downloads += 1
+        self.downloaded_bytes += len(data)
+        return bytes(data)
+
+    async def close(self) -> None:
+        """Close the HTTP session."""
+        if self._session is not None:
+            await self._session.close()
+
+
+def _image_parts(message: BaseMessage):
+    if isinstance(message.content, list):
+        for part in message.content:
+            if isinstance(part, dict) and part.get("type") == "image_url":
+                yield part
+
+
+def _image_url(part: dict) -> str:
+    image_url = part["image_url"]
+    return image_url["url"] if isinstance(image_url, dict) else image_url
+
+
+def _to_data_url(mime: str, data: bytes) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+def create_image_pipeline() -> ImagePipeline:
+    """Create an image pipeline configured from the environment.
+
+    Encoded images are persisted to APEIRON_IMAGE_CACHE_PATH when it is set.
+    """
+    cache = None
+    if path := os.getenv("APEIRON_IMAGE_CACHE_PATH"):
+        cache = ImageCache(
+            path,
+            max_bytes=int(
+                os.getenv("APEIRON_IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024))
+            ),
+        )
+    return ImagePipeline(
+        cache,
+        max_size=int(os.getenv("APEIRON_IMAGE_MAX_SIZE", "1024")),
+        max_download_bytes=int(
+            os.getenv("APEIRON_IMAGE_MAX_DOWNLOAD_BYTES", str(20 * 1024 * 1024))
+        ),
+    )
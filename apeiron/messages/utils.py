@@ -1,9 +1,70 @@
 import logging
+from collections.abc import Callable, Sequence
 
-from langchain_core.messages import BaseMessage
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage, SystemMessage
+
+from apeiron.utils import LRUCache
 
 logger = logging.getLogger(__name__)
 
+TokenCounter = Callable[[list[BaseMessage]], int] | BaseLanguageModel
+
+
+def count_tokens(token_counter: TokenCounter, messages: list[BaseMessage]) -> int:
+    """Count the tokens of messages with a model or a counting function."""
+    if isinstance(token_counter, BaseLanguageModel):
+        return token_counter.get_num_tokens_from_messages(messages)
+    return token_counter(messages)
+
+
+class MessageTokenCounter:
+    """Token counter caching the token cost of each message text.
+
+    Rendered messages share their text across requests, so each message is
+    tokenized once and subsequent counts are dictionary lookups.
+    """
+
+    def __init__(
+        self,
+        get_token_ids: Callable[[str], list[int]],
+        maxsize: int = 8192,
+        tokens_per_message: int = 3,
+    ) -> None:
+        """Initialize the counter.
+
+        Args:
+            get_token_ids: Function encoding a text into token IDs
+            maxsize: Maximum number of message costs kept in the cache
+            tokens_per_message: Fixed overhead added for each message
+        """
+        self.get_token_ids = get_token_ids
+        self.tokens_per_message = tokens_per_message
+        self.cache: LRUCache[str, int] = LRUCache(maxsize=maxsize)
+
+    def count_message(self, message: BaseMessage) -> int:
+        """Count the tokens of a single message."""
+        text = str(message.text)
+        tokens = self.cache.get(text)
+        if tokens is None:
+            tokens = len(self.get_token_ids(text))
+            self.cache.put(text, tokens)
+        return tokens + self.tokens_per_message
+
+    def __call__(self, messages: list[BaseMessage]) -> int:
+        return sum(self.count_message(message) for message in messages)
+
+
+def count_images(message: BaseMessage) -> int:
+    """Count the image parts of a message."""
+    if not isinstance(message.content, list):
+        return 0
+    return sum(
+        1
+        for content in message.content
+        if isinstance(content, dict) and content.get("type") == "image_url"
+    )
+
 
 def trim_messages_images(
     messages: list[BaseMessage], max_images: int = 8
@@ -22,16 +83,72 @@ def trim_messages_images(
 
     # Process messages in reverse order (newest to oldest)
     for i, message in enumerate(reversed(messages)):
-        if isinstance(message.content, list):
-            # Count images in the message content
-            for content in message.content:
-                if isinstance(content, dict) and content.get("type") == "image_url":
-                    image_count += 1
-                    if image_count > max_images:
-                        slice_index = len(messages) - i - 1
-                        break
+        image_count += count_images(message)
         if image_count > max_images:
+            slice_index = len(messages) - i - 1
             break
 
     # Return messages from slice_index to the end
     return messages[slice_index + 1 :]
+
+
+def _is_message_type(message: BaseMessage, types: str | Sequence[str]) -> bool:
+    if isinstance(types, str):
+        types = (types,)
+    return message.type in types
+
+
+def trim_messages_budget(
+    messages: list[BaseMessage],
+    token_counter: TokenCounter,
+    max_tokens: int,
+    max_images: int | None = None,
+    start_on: str | Sequence[str] | None = None,
+    end_on: str | Sequence[str] | None = None,
+    include_system: bool = False,
+) -> list[BaseMessage]:
+    """Keep the last messages fitting both a token and an image budget.
+
+    Equivalent to trim_messages_images followed by trim_messages with the
+    "last" strategy, in a single newest to oldest pass counting each message
+    once.
+
+    Args:
+        messages: List of messages to trim
+        token_counter: Token counter, per message costs are summed
+        max_tokens: Maximum number of tokens to keep
+        max_images: Maximum number of images to keep (None for no limit)
+        start_on: Message types the trimmed history must start on
+        end_on: Message types the trimmed history must end on
+        include_system: Whether to keep a leading system message
+
+    Returns:
+        List of trimmed messages in chronological order
+    """
+    system: BaseMessage | None = None
+    if include_system and messages and isinstance(messages[0], SystemMessage):
+        system, messages = messages[0], messages[1:]
+
+    end = len(messages)
+    if end_on is not None:
+        while end > 0 and not _is_message_type(messages[end - 1], end_on):
+            end -= 1
+
+    tokens = count_tokens(token_counter, [system]) if system else 0
+    images = 0
+    start = end
+    while start > 0:
+        message = messages[start - 1]
+        tokens += count_tokens(token_counter, [message])
+        if max_images is not None:
+            images += count_images(message)
+        if tokens > max_tokens or (max_images is not None and images > max_images):
+            break
+        start -= 1
+
+    if start_on is not None:
+        while start < end and not _is_message_type(messages[start], start_on):
+            start += 1
+
+    trimmed = messages[start:end]
+    return [system, *trimmed] if system else trimmed
@@ -0,0 +1,13 @@
+from collections.abc import Callable
+
+_stats: dict[str, Callable[[], dict]] = {}
+
+
+def register_stats(name: str, stats: Callable[[], dict]) -> None:
+    """Register a function returning the counters of a component."""
+    _stats[name] = stats
+
+
+def collect_stats() -> dict[str, dict]:
+    """Collect the counters of every registered component."""
+    return {name: stats() for name, stats in _stats.items()}
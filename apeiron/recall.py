@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import time
+
+from discord import Message
+from langchain_core.messages import HumanMessage
+from langgraph.store.base import BaseStore, PutOp, SearchItem
+
+from apeiron.consolidation import MEMORY_NAMESPACE, create_memory_namespace
+from apeiron.tools.discord.encoding import estimate_tokens
+from apeiron.tools.discord.utils import create_thread_id
+
+logger = logging.getLogger(__name__)
+
+RECALL_NAMESPACE = "recall"
+
+
+def create_recall_namespace(message: Message) -> tuple[str, ...]:
+    """Create the store namespace of the conversation of a message."""
+    return (RECALL_NAMESPACE, *create_thread_id(message).split("/"))
+
+
+class ConversationRecall:
+    """Long-range context recalled from the store by semantic search.
+
+    Messages of the conversations the bot takes part in are embedded and
+    written to the store, namespaced per guild and channel. When a message
+    is handled, the older messages and the consolidated memories of the
+    channel most similar to it are searched and rendered as one compact
+    context block, so context beyond the raw history window costs a fixed,
+    small number of tokens.
+    """
+
+    def __init__(
+        self,
+        store: BaseStore,
+        k: int = 5,
+        min_score: float = 0.7,
+        max_tokens: int = 300,
+        max_chars: int = 300,
+        timeout: float = 2.0,
+    ) -> None:
+        """Initialize the recall stage.
+
+        Args:
+            store: Store holding the embedded messages
+            k: Maximum number of messages recalled
+            min_score: Minimum similarity of a recalled message
+            max_tokens: Approximate token budget of the context block
+            max_chars: Maximum characters kept of each recalled message
+            timeout: Seconds after which the recall is skipped
+        """
+        self.store = store
+        self.k = k
+        self.min_score = min_score
+        self.max_tokens = max_tokens
+        self.max_chars = max_chars
+        self.timeout = timeout
+        self.searches = 0
+        self.recalled = 0
+        self.timeouts = 0
+        self.remembered = 0
+        self._tasks: set[asyncio.Task] = set()
+
+    def stats(self) -> dict[str, int]:
+        """Get the search, recall and write counters."""
+        return {
+            "searches": self.searches,
+            "recalled": self.recalled,
+            "timeouts": self.timeouts,
+            "remembered": self.remembered,
+            "pending_writes": len(self._tasks),
+        }
+
+    async def search(self, message: Message) -> list[SearchItem]:
+        """Search the messages and memories most similar to a message.
+
+        Errors and searches exceeding the timeout return no items, so recall
+        never fails or stalls a reply.
+        """
+        if not message.content or self.k <= 0:
+            return []
+        try:
+            messages, memories = await asyncio.wait_for(
+                asyncio.gather(
+                    self.store.asearch(
+                        create_recall_namespace(message),
+                        query=message.content,
+                        # Leave room for the messages filtered out afterwards
+                        limit=self.k * 2,
+                    ),
+                    self.store.asearch(
+                        create_memory_namespace(message),
+                        query=message.content,
+                        limit=self.k,
+                    ),
+                ),
+                timeout=self.timeout,
+            )
+        except TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"Recall for message {message.id} timed out")
+            return []
+        except Exception as e:
+            logger.error(f"Failed to recall messages: {str(e)}")
+            return []
+        self.searches += 1
+        return memories + messages
+
+    def render(
+        self, items: list[SearchItem], before: int | None = None
+    ) -> HumanMessage | None:
+        """Render recalled memories and messages as a compact context block.
+
+        Args:
+            items: Search results, memories first, each best match first
+            before: Only keep messages older than this message ID, the newer
+                ones being part of the raw history already
+
+        Returns:
+            The context block, None if nothing is relevant
+        """
+        memories = []
+        messages = []
+        for item in items:
+            if item.score is not None and item.score < self.min_score:
+                continue
+            if item.namespace[0] == MEMORY_NAMESPACE:
+                if len(memories) < self.k:
+                    memories.append(f"- {item.value['content']['content']}")
+            elif len(messages) < self.k and (
+                before is None or int(item.value["message_id"]) < before
+            ):
+                messages.append(item)
+
+        # Chronological order reads as a conversation
+        messages.sort(key=lambda item: int(item.value["message_id"]))
+        sections = [
+            ("## Memories", memories),
+            (
+                "## Recalled Messages",
+                [
+                    f"- [{item.value['timestamp']}] {item.value['text']}"
+                    for item in messages
+                ],
+            ),
+        ]
+
+        blocks = []
+        tokens = 0
+        for header, lines in sections:
+            kept = []
+            for line in lines:
+                if len(line) > self.max_chars:
+                    line = line[: self.max_chars] + "..."
+                cost = estimate_tokens(line)
+                if not kept:
+                    cost += estimate_tokens(header)
+                if tokens + cost > self.max_tokens:
+                    break
+                tokens += cost
+                kept.append(line)
+            if kept:
+                blocks.append("\n".join([header, *kept]))
+                self.recalled += len(kept)
+        if not blocks:
+            return None
+        return HumanMessage(content="\n\n".join(blocks))
+
+    async def remember(self, messages: list[Message]) -> None:
+        """Embed and write messages to the store."""
+        ops = [
+            PutOp(
+                create_recall_namespace(message),
+                str(message.id),
+                {
+                    "text": f"{message.author.display_name}: {message.content}",
+                    "message_id": str(message.id),
+                    "author_id": str(message.author.id),
+                    "timestamp": message.created_at.strftime("%Y-%m-%d %H:%M"),
+                },
+            )
+            for message in messages
+            if message.content
+        ]
+        if ops:
+            started = time.monotonic()
+            await self.store.abatch(ops)
+            self.remembered += len(ops)
+            logger.debug(
+                f"Remembered {len(ops)} messages in {time.monotonic() - started:.2f}s"
+            )
+
+    def remember_later(self, messages: list[Message]) -> None:
+        """Write messages to the store in the background."""
+
+        async def remember():
+            try:
+                await self.remember(messages)
+            except Exception as e:
+                logger.error(f"Failed to remember messages: {str(e)}")
+
+        task = asyncio.create_task(remember())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+
+import numpy as np
+from discord import Message
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.tools import BaseTool
+
+from apeiron.utils import TTLCache
+
+logger = logging.getLogger(__name__)
+
+MENTION_PATTERN = re.compile(r"<(?:@[!&]?|#)\d+>")
+
+# Words whose meaning depends on the author or on earlier messages
+CONTEXT_PATTERN = re.compile(
+    r"\b(?:i|me|my|mine|myself|im|ive|we|us|our|ours|he|him|his|she|her|hers|"
+    r"they|them|their|it|its|this|that|these|those|above|earlier|previous|"
+    r"again|before|same)\b"
+)
+
+
+def normalize_request(text: str) -> str:
+    """Normalize a request, ignoring case, punctuation, spacing and mentions."""
+    text = MENTION_PATTERN.sub(" ", text).casefold().replace("'", "")
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def get_side_effect_tools(tools: list[BaseTool]) -> set[str]:
+    """Get the names of the tools marked as having side effects."""
+    return {tool.name for tool in tools if (tool.metadata or {}).get("side_effects")}
+
+
+def get_tool_calls(messages: list[BaseMessage]) -> list[str]:
+    """Get the names of the tools called since the last human message."""
+    names = []
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, AIMessage):
+            names.extend(tool_call["name"] for tool_call in message.tool_calls)
+    return names
+
+
+class ResponseCache:
+    """Replies to repeated requests, served without running the agent.
+
+    Replies are keyed per channel on the normalized request, the agent and
+    the model, and expire after ttl seconds or once maxsize newer replies have
+    been cached. With embeddings, a request without an exact match reuses the
+    reply of the most similar request of the channel above min_score.
+
+    Only standalone requests are cached. Messages in private channels, with
+    attachments, replying to another message or mentioning anyone but the
+    bot always run the agent, and so do requests shorter than min_words or
+    longer than max_chars, or referring to their author or to earlier
+    messages ("my role", "that one"). Replies of runs that called a tool with
+    side effects are never cached, so replaying a reply never skips an
+    action.
+    """
+
+    def __init__(
+        self,
+        agent: str,
+        model: str,
+        side_effect_tools: set[str],
+        embeddings: Embeddings | None = None,
+        maxsize: int = 1024,
+        ttl: float = 3600.0,
+        min_score: float = 0.95,
+        min_words: int = 3,
+        max_chars: int = 200,
+        timeout: float = 1.0,
+    ) -> None:
+        """Initialize an empty cache.
+
+        Args:
+            agent: Name of the agent replying, part of the key
+            model: Name of the model replying, part of the key
+            side_effect_tools: Names of the tools whose runs are not cached
+            embeddings: Embeddings matching similar requests, exact matches
+                only if omitted
+            maxsize: Maximum number of cached replies
+            ttl: Seconds after which a cached reply expires
+            min_score: Minimum cosine similarity of a similar request
+            min_words: Minimum number of words of a cached request
+            max_chars: Maximum length of a cached request
+            timeout: Seconds after which the similarity match is skipped
+        """
+        self.agent = agent
+        self.model = model
+        self.side_effect_tools = side_effect_tools
+        self.embeddings = embeddings
+        self.min_score = min_score
+        self.min_words = min_words
+        self.max_chars = max_chars
+        self.timeout = timeout
+        self.entries: TTLCache[str, dict] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.uncacheable = 0
+        self.latency_saved = 0.0
+
+    def stats(self) -> dict:
+        """Get the hit, miss and bypass counters and the latency saved."""
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "entries": self.entries.stats(),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "uncacheable": self.uncacheable,
+            "hit_rate": hits / (hits + self.misses) if hits + self.misses else 0.0,
+            "latency_saved": round(self.latency_saved, 3),
+        }
+
+    def _scope(self, message: Message) -> tuple[str, ...] | None:
+        if (
+            message.guild is None
+            or not message.content
+            or len(message.content) > self.max_chars
+            or message.attachments
+            or message.reference is not None
+            or message.role_mentions
+            or message.channel_mentions
+            or any(user.id != message.guild.me.id for user in message.mentions)
+        ):
+            return None
+        request = normalize_request(message.content)
+        if len(request.split()) < self.min_words or CONTEXT_PATTERN.search(request):
+            return None
+        return (
+            str(message.guild.id),
+            str(message.channel.id),
+            self.agent,
+            self.model,
+        )
+
+    def _key(self, scope: tuple[str, ...], request: str) -> str:
+        return hashlib.sha256("\0".join([*scope, request]).encode()).hexdigest()
+
+    async def _embed(self, request: str) -> np.ndarray | None:
+        if self.embeddings is None:
+            return None
+        try:
+            vector = await asyncio.wait_for(
+                self.embeddings.aembed_query(request), timeout=self.timeout
+            )
+        except Exception as e:
+            logger.warning(f"Failed to embed request for the response cache: {str(e)}")
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    async def get(self, message: Message) -> str | None:
+        """Get the cached reply to a message.
+
+        Returns:
+            The reply, None if the agent must run
+        """
+        if (scope := self._scope(message)) is None:
+            self.bypassed += 1
+            return None
+        started = time.monotonic()
+        request = normalize_request(message.content)
+        entry = self.entries.get(self._key(scope, request))
+        if entry is not None:
+            self.exact_hits += 1
+        elif (vector := await self._embed(request)) is not None:
+            candidates = [
+                (key, entry)
+                for key, entry in self.entries.items()
+                if entry["scope"] == scope and entry["vector"] is not None
+            ]
+            if candidates:
+                scores = np.stack([entry["vector"] for _, entry in candidates]) @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.min_score:
+                    # Mark the matched reply as recently used
+                    entry = self.entries.get(candidates[best][0])
+                    self.semantic_hits += 1
+        if entry is None:
+            self.misses += 1
+            return None
+        self.latency_saved += max(0.0, entry["latency"] - (time.monotonic() - started))
+        logger.info(f"Serving cached reply to message {message.id}")
+        return entry["reply"]
+
+    async def put(
+        self,
+        message: Message,
+        reply: str,
+        messages: list[BaseMessage],
+        latency: float,
+    ) -> bool:
+        """Cache the reply of a finished run.
+
+        Args:
+            message: The message replied to
+            reply: The reply sent
+            messages: Messages of the run, checked for side effects
+            latency: Seconds the run took, saved by every hit
+
+        Returns:
+            Whether the reply was cached
+        """
+        if (scope := self._scope(message)) is None or not reply:
+            return False
+        if self.side_effect_tools.intersection(get_tool_calls(messages)):
+            self.uncacheable += 1
+            return False
+        request = normalize_request(message.content)
+        self.entries.put(
+            self._key(scope, request),
+            {
+                "scope": scope,
+                "reply": reply,
+                "vector": await self._embed(request),
+                "latency": latency,
+            },
+        )
+        return True
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Hashable
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerOverloadedError(Exception):
+    """Raised when a request is shed because the scheduler queue is full."""
+
+
+class AdmissionScheduler:
+    """Admission control for agent runs with per-guild fair queuing.
+
+    At most max_concurrency runs hold a slot at once. Further requests wait
+    in one of two lanes: the priority lane (DMs and replies to the bot) is
+    always served first. Within a lane, guilds are served round robin so a
+    single busy guild cannot starve the others. Once max_queue requests are
+    waiting, new requests are rejected with SchedulerOverloadedError.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_queue: int = 64,
+        wait_window: int = 1024,
+    ) -> None:
+        """Initialize the scheduler.
+
+        Args:
+            max_concurrency: Maximum number of concurrent runs
+            max_queue: Maximum number of waiting requests before shedding
+            wait_window: Number of recent wait times kept for percentiles
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.running = 0
+        self.admitted = 0
+        self.shed = 0
+        self._lanes: tuple[OrderedDict[Hashable, deque], ...] = (
+            OrderedDict(),
+            OrderedDict(),
+        )
+        self._depth = 0
+        self._waits: deque[float] = deque(maxlen=wait_window)
+
+    def stats(self) -> dict[str, float]:
+        """Get the queue depth, admission counters and wait time percentiles."""
+        waits = sorted(self._waits)
+
+        def percentile(p: float) -> float:
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        return {
+            "running": self.running,
+            "queued": self._depth,
+            "queued_priority": sum(len(q) for q in self._lanes[0].values()),
+            "queued_guilds": len(self._lanes[0]) + len(self._lanes[1]),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "wait_p50": percentile(0.5),
+            "wait_p95": percentile(0.95),
+            "wait_max": waits[-1] if waits else 0.0,
+        }
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable, priority: bool = False) -> AsyncIterator[None]:
+        """Hold a run slot, waiting for one if the scheduler is saturated.
+
+        Args:
+            key: Fairness key, usually the guild ID (None for DMs)
+            priority: Whether the request goes to the priority lane
+
+        Raises:
+            SchedulerOverloadedError: If the queue is full
+        """
+        await self._acquire(key, priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, key: Hashable, priority: bool) -> None:
+        started = time.monotonic()
+        if self.running < self.max_concurrency and not self._depth:
+            self.running += 1
+            self._admit(started)
+            return
+        if self._depth >= self.max_queue:
+            self.shed += 1
+            raise SchedulerOverloadedError(
+                f"Scheduler queue is full ({self._depth} waiting)"
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        lane = self._lanes[0 if priority else 1]
+        lane.setdefault(key, deque()).append(future)
+        self._depth += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted right before the cancellation
+                self._release()
+            else:
+                self._discard(lane, key, future)
+            raise
+        self._admit(started)
+
+    def _admit(self, started: float) -> None:
+        self.admitted += 1
+        self._waits.append(time.monotonic() - started)
+
+    def _discard(self, lane: OrderedDict, key: Hashable, future: asyncio.Future):
+        queue = lane.get(key)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self._depth -= 1
+            if not queue:
+                del lane[key]
+
+    def _release(self) -> None:
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.running < self.max_concurrency and self._depth:
+            lane = self._lanes[0] if self._lanes[0] else self._lanes[1]
+            key, queue = next(iter(lane.items()))
+            future = queue.popleft()
+            self._depth -= 1
+            # Serve the next guild in turn
+            del lane[key]
+            if queue:
+                lane[key] = queue
+            if not future.done():
+                self.running += 1
+                future.set_result(None)
@@ -0,0 +1,38 @@
+import os
+
+from langgraph.store.base import BaseStore
+from langgraph.store.memory import InMemoryStore
+
+from apeiron.embeddings import create_embeddings
+from apeiron.store.persistent import PersistentStore
+
+# Recalled messages are embedded by their text, langmem memories by content
+MEMORY_FIELDS = ["text", "content.content"]
+
+
+def create_store(model: str, **kwargs) -> BaseStore:
+    """Create a store configured from the environment.
+
+    The backend is selected with APEIRON_STORE, either "memory" or
+    "persistent" to keep items and vectors under APEIRON_STORE_PATH.
+    Embeddings are cached and batched, see create_embeddings.
+    """
+    match os.getenv("APEIRON_STORE", "memory"):
+        case "memory":
+            return InMemoryStore(
+                index={
+                    "dims": 1536,
+                    "embed": create_embeddings(model, **kwargs),
+                    "fields": MEMORY_FIELDS,
+                }
+            )
+        case "persistent":
+            return PersistentStore(
+                os.getenv("APEIRON_STORE_PATH", "/var/lib/apeiron/store"),
+                index={
+                    "embed": create_embeddings(model, **kwargs),
+                    "fields": MEMORY_FIELDS,
+                },
+            )
+        case store:
+            raise ValueError(f"Unknown store: {store}")
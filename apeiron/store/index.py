@@ -0,0 +1,237 @@
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex:
+    """Memory-mapped vector index with an inverted file (IVF) ANN search.
+
+    Vectors are normalized and stored in a float32 memory-mapped file, so
+    cosine similarity is a dot product. Once enough vectors are stored, a
+    k-means coarse quantizer is trained and each vector is assigned to its
+    nearest centroid. Searches then only score the vectors of the nprobe
+    lists closest to the query instead of the whole index.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        dims: int,
+        *,
+        initial_capacity: int = 1024,
+        train_threshold: int = 8192,
+        nprobe: int = 8,
+    ) -> None:
+        """Open or create an index.
+
+        Args:
+            path: Directory holding the index files
+            dims: Number of dimensions of the vectors
+            initial_capacity: Number of rows allocated for a new index
+            train_threshold: Number of vectors from which the IVF is trained
+            nprobe: Number of inverted lists scanned per search
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dims = dims
+        self.train_threshold = train_threshold
+        self.nprobe = nprobe
+
+        meta = self._read_meta()
+        if meta and meta["dims"] != dims:
+            raise ValueError(
+                f"Index at {self.path} has {meta['dims']} dimensions, got {dims}"
+            )
+        capacity = meta["capacity"] if meta else initial_capacity
+        self.vectors = self._open_vectors(capacity)
+        # Inverted list of each row, -1 for free rows and -2 before training
+        self.assignments = np.full(capacity, -1, dtype=np.int32)
+        # Caller defined label of each row, used to restrict searches
+        self.labels = np.full(capacity, -1, dtype=np.int32)
+        self.centroids: np.ndarray | None = None
+        self.trained_size = 0
+        centroids_path = self.path / "centroids.npy"
+        if centroids_path.exists():
+            self.centroids = np.load(centroids_path)
+            self.trained_size = meta.get("trained_size", 0) if meta else 0
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.assignments != -1))
+
+    @property
+    def capacity(self) -> int:
+        return self.vectors.shape[0]
+
+    def _read_meta(self) -> dict | None:
+        meta_path = self.path / "index.json"
+        if not meta_path.exists():
+            return None
+        return json.loads(meta_path.read_text())
+
+    def _write_meta(self) -> None:
+        (self.path / "index.json").write_text(
+            json.dumps(
+                {
+                    "dims": self.dims,
+                    "capacity": self.capacity,
+                    "trained_size": self.trained_size,
+                }
+            )
+        )
+
+    def _open_vectors(self, capacity: int) -> np.memmap:
+        vectors_path = self.path / "vectors.f32"
+        size = capacity * self.dims * np.dtype(np.float32).itemsize
+        with open(vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(
+            vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dims)
+        )
+
+    def _grow(self, capacity: int) -> None:
+        self.vectors.flush()
+        del self.vectors
+        self.vectors = self._open_vectors(capacity)
+        assignments = np.full(capacity, -1, dtype=np.int32)
+        assignments[: len(self.assignments)] = self.assignments
+        self.assignments = assignments
+        labels = np.full(capacity, -1, dtype=np.int32)
+        labels[: len(self.labels)] = self.labels
+        self.labels = labels
+        self._write_meta()
+
+    def restore(self, rows: list[int], lists: list[int], labels: list[int]) -> None:
+        """Restore the row assignments and labels persisted alongside the index."""
+        if rows:
+            rows = np.asarray(rows)
+            self.assignments[rows] = np.asarray(lists, dtype=np.int32)
+            self.labels[rows] = np.asarray(labels, dtype=np.int32)
+
+    def allocate(self, count: int) -> np.ndarray:
+        """Reserve free rows for new vectors."""
+        free = np.flatnonzero(self.assignments == -1)
+        if len(free) < count:
+            capacity = self.capacity
+            while capacity - len(self) < count:
+                capacity *= 2
+            self._grow(capacity)
+            free = np.flatnonzero(self.assignments == -1)
+        rows = free[:count]
+        self.assignments[rows] = -2
+        return rows
+
+    def add(
+        self, rows: np.ndarray, vectors: np.ndarray, labels: np.ndarray
+    ) -> np.ndarray:
+        """Write labelled vectors to allocated rows.
+
+        Returns:
+            The inverted list assigned to each row
+        """
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        self.vectors[rows] = vectors
+        self.labels[rows] = labels
+        if self.centroids is None:
+            lists = np.full(len(rows), -2, dtype=np.int32)
+        else:
+            lists = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+        self.assignments[rows] = lists
+        return lists
+
+    def remove(self, rows: list[int] | np.ndarray) -> None:
+        """Free rows so they can be reused."""
+        if len(rows):
+            rows = np.asarray(rows)
+            self.assignments[rows] = -1
+            self.labels[rows] = -1
+
+    def needs_training(self) -> bool:
+        """Whether the coarse quantizer should be (re)trained."""
+        size = len(self)
+        return size >= self.train_threshold and size >= 4 * self.trained_size
+
+    def train(self, iterations: int = 10, sample_size: int = 65536) -> np.ndarray:
+        """Train the coarse quantizer with k-means and reassign all rows.
+
+        Returns:
+            The inverted list assigned to each used row, in row order
+        """
+        used = np.flatnonzero(self.assignments != -1)
+        nlist = max(1, int(np.sqrt(len(used))))
+        rng = np.random.default_rng(0)
+        sample = self.vectors[
+            np.sort(rng.choice(used, min(len(used), sample_size), replace=False))
+        ]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            # Keep the previous centroid of empty lists
+            filled = np.bincount(nearest, minlength=nlist) > 0
+            centroids[filled] = _normalize(sums[filled])
+
+        self.centroids = centroids
+        for start in range(0, len(used), 65536):
+            chunk = used[start : start + 65536]
+            self.assignments[chunk] = np.argmax(
+                self.vectors[chunk] @ centroids.T, axis=1
+            )
+        self.trained_size = len(used)
+        np.save(self.path / "centroids.npy", centroids)
+        self._write_meta()
+        logger.info(f"Trained vector index with {nlist} lists on {len(used)} rows")
+        return self.assignments[used]
+
+    def search(
+        self,
+        query: np.ndarray,
+        labels: list[int] | None = None,
+        k: int = 10,
+        exact_threshold: int = 16384,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find the rows most similar to a query.
+
+        Args:
+            query: Query vector
+            labels: Labels of the rows to search (None for all rows)
+            k: Number of results
+            exact_threshold: Candidate count under which search is exhaustive
+
+        Returns:
+            Rows and scores sorted by decreasing similarity
+        """
+        query = _normalize(np.asarray(query, dtype=np.float32)[None, :])[0]
+        if labels is None:
+            rows = np.flatnonzero(self.assignments != -1)
+        else:
+            rows = np.flatnonzero(np.isin(self.labels, labels))
+        if len(rows) > exact_threshold and self.centroids is not None:
+            probes = np.argsort(self.centroids @ query)[-self.nprobe :]
+            lists = self.assignments[rows]
+            # Rows added before training are always scanned
+            rows = rows[np.isin(lists, probes) | (lists == -2)]
+        if not len(rows):
+            return rows, np.empty(0, dtype=np.float32)
+        rows = np.sort(rows)
+        scores = self.vectors[rows] @ query
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def flush(self) -> None:
+        """Flush the memory-mapped vectors to disk."""
+        self.vectors.flush()
+        self._write_meta()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
@@ -0,0 +1,503 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import UTC, datetime
+from os import PathLike
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langgraph.store.base import (
+    BaseStore,
+    GetOp,
+    IndexConfig,
+    Item,
+    ListNamespacesOp,
+    MatchCondition,
+    Op,
+    PutOp,
+    Result,
+    SearchItem,
+    SearchOp,
+    ensure_embeddings,
+    get_text_at_path,
+    tokenize_path,
+)
+
+from apeiron.store.index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS vectors (
+    row INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    list INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS vectors_item ON vectors (namespace, key);
+"""
+
+# Texts to embed, mapped to the (namespace, key, path) they are indexed under
+ToEmbed = dict[str, list[tuple[tuple[str, ...], str, str]]]
+
+
+def _join_namespace(namespace: tuple[str, ...]) -> str:
+    # Namespace labels cannot contain periods
+    return ".".join(namespace)
+
+
+def _split_namespace(namespace: str) -> tuple[str, ...]:
+    return tuple(namespace.split(".")) if namespace else ()
+
+
+def _has_prefix(namespace: tuple[str, ...], prefix: tuple[str, ...]) -> bool:
+    return namespace[: len(prefix)] == prefix
+
+
+def _does_match(condition: MatchCondition, namespace: tuple[str, ...]) -> bool:
+    path = condition.path
+    if len(namespace) < len(path):
+        return False
+    labels = (
+        namespace[: len(path)]
+        if condition.match_type == "prefix"
+        else (namespace[len(namespace) - len(path) :])
+    )
+    return all(p == "*" or p == label for p, label in zip(path, labels, strict=True))
+
+
+def _matches_filter(value: dict[str, Any], filter: dict[str, Any] | None) -> bool:
+    if not filter:
+        return True
+    for key, expected in filter.items():
+        actual = value.get(key)
+        if isinstance(expected, dict) and all(k.startswith("$") for k in expected):
+            for operator, operand in expected.items():
+                match operator:
+                    case "$eq":
+                        ok = actual == operand
+                    case "$ne":
+                        ok = actual != operand
+                    case "$gt":
+                        ok = actual is not None and actual > operand
+                    case "$gte":
+                        ok = actual is not None and actual >= operand
+                    case "$lt":
+                        ok = actual is not None and actual < operand
+                    case "$lte":
+                        ok = actual is not None and actual <= operand
+                    case _:
+                        raise ValueError(f"Unsupported filter operator: {operator}")
+                if not ok:
+                    return False
+        elif actual != expected:
+            return False
+    return True
+
+
+class PersistentStore(BaseStore):
+    """Store persisting items in SQLite and vectors in a memory-mapped index.
+
+    Items are kept in a SQLite database and their embeddings in a VectorIndex
+    next to it, so the store survives restarts and searches scale with an
+    approximate nearest neighbour index. The embedding dimension is detected
+    from the first embedding computed.
+    """
+
+    def __init__(
+        self,
+        path: str | PathLike,
+        *,
+        index: IndexConfig | None = None,
+        nprobe: int = 8,
+        train_threshold: int = 8192,
+    ) -> None:
+        """Open or create a store.
+
+        Args:
+            path: Directory holding the database and index files
+            index: Index configuration, dims is detected when omitted
+            nprobe: Number of inverted lists scanned per search
+            train_threshold: Number of vectors from which the ANN is trained
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+
+        # Operations run in worker threads, one at a time
+        self.conn = sqlite3.connect(
+            self.path / "store.sqlite", check_same_thread=False, isolation_level=None
+        )
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+        self.index_config = index.copy() if index else None
+        self.embeddings: Embeddings | None = None
+        if self.index_config:
+            self.embeddings = ensure_embeddings(self.index_config.get("embed"))
+            self.index_config["__tokenized_fields"] = [
+                (p, tokenize_path(p)) if p != "$" else (p, p)
+                for p in (self.index_config.get("fields") or ["$"])
+            ]
+
+        self.vectors: VectorIndex | None = None
+        # Namespace -> label of its rows in the vector index
+        self._namespace_labels: dict[str, int] = {}
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'dims'").fetchone()
+        dims = int(row[0]) if row else (index or {}).get("dims")
+        if dims:
+            self._open_index(dims)
+
+    @property
+    def dims(self) -> int | None:
+        return self.vectors.dims if self.vectors else None
+
+    def _open_index(self, dims: int) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('dims', ?)", (str(dims),)
+        )
+        if self.index_config is not None:
+            self.index_config["dims"] = dims
+        self.vectors = VectorIndex(
+            self.path / "index",
+            dims,
+            nprobe=self.nprobe,
+            train_threshold=self.train_threshold,
+        )
+        rows, lists, labels = [], [], []
+        for row, namespace, list_ in self.conn.execute(
+            "SELECT row, namespace, list FROM vectors"
+        ):
+            rows.append(row)
+            lists.append(list_)
+            labels.append(self._namespace_label(namespace))
+        self.vectors.restore(rows, lists, labels)
+
+    def _namespace_label(self, namespace: str) -> int:
+        return self._namespace_labels.setdefault(namespace, len(self._namespace_labels))
+
+    # Operations
+
+    def batch(self, ops: Iterable[Op]) -> list[Result]:
+        ops = list(ops)
+        queries = self._extract_queries(ops)
+        to_embed = self._extract_texts(ops)
+        vectors = {}
+        if self.embeddings and (queries or to_embed):
+            texts = list(to_embed)
+            embedded = self.embeddings.embed_documents(texts) if texts else []
+            vectors = dict(zip(texts, embedded, strict=True))
+            for query in queries:
+                vectors[query] = self.embeddings.embed_query(query)
+        return self._apply(ops, to_embed, vectors)
+
+    async def abatch(self, ops: Iterable[Op]) -> list[Result]:
+        ops = list(ops)
+        queries = self._extract_queries(ops)
+        to_embed = self._extract_texts(ops)
+        vectors = {}
+        if self.embeddings and (queries or to_embed):
+            texts = list(to_embed)
+            embedded = await self.embeddings.aembed_documents(texts) if texts else []
+            vectors = dict(zip(texts, embedded, strict=True))
+            for query in queries:
+                vectors[query] = await self.embeddings.aembed_query(query)
+        # Writes and training the index can take seconds on large stores
+        return await asyncio.to_thread(self._apply, ops, to_embed, vectors)
+
+    def _apply(
+        self, ops: list[Op], to_embed: ToEmbed, vectors: dict[str, list[float]]
+    ) -> list[Result]:
+        with self.lock:
+            if vectors and self.vectors is None:
+                self._open_index(len(next(iter(vectors.values()))))
+
+            results: list[Result] = []
+            with self.conn:
+                self.conn.execute("BEGIN")
+                for op in ops:
+                    match op:
+                        case GetOp():
+                            results.append(self._get(op))
+                        case SearchOp():
+                            results.append(self._search(op, vectors.get(op.query)))
+                        case ListNamespacesOp():
+                            results.append(self._list_namespaces(op))
+                        case PutOp():
+                            self._put(op)
+                            results.append(None)
+                        case _:
+                            raise ValueError(f"Unknown operation type: {type(op)}")
+                self._insert_vectors(to_embed, vectors)
+                if self.vectors is not None and self.vectors.needs_training():
+                    self._train()
+            return results
+
+    def _extract_queries(self, ops: list[Op]) -> set[str]:
+        return {op.query for op in ops if isinstance(op, SearchOp) and op.query}
+
+    def _extract_texts(self, ops: list[Op]) -> ToEmbed:
+        to_embed: ToEmbed = defaultdict(list)
+        if not self.index_config:
+            return to_embed
+        puts = {(op.namespace, op.key): op for op in ops if isinstance(op, PutOp)}
+        for op in puts.values():
+            if op.value is None or op.index is False:
+                continue
+            if op.index is None:
+                paths = self.index_config["__tokenized_fields"]
+            else:
+                paths = [(ix, tokenize_path(ix)) for ix in op.index]
+            for path, field in paths:
+                texts = get_text_at_path(op.value, field)
+                if len(texts) > 1:
+                    for i, text in enumerate(texts):
+                        to_embed[text].append((op.namespace, op.key, f"{path}.{i}"))
+                elif texts:
+                    to_embed[texts[0]].append((op.namespace, op.key, path))
+        return to_embed
+
+    def _get(self, op: GetOp) -> Item | None:
+        row = self.conn.execute(
+            "SELECT value, created_at, updated_at FROM items "
+            "WHERE namespace = ? AND key = ?",
+            (_join_namespace(op.namespace), op.key),
+        ).fetchone()
+        if row is None:
+            return None
+        value, created_at, updated_at = row
+        return Item(
+            value=json.loads(value),
+            key=op.key,
+            namespace=op.namespace,
+            created_at=created_at,
+            updated_at=updated_at,
+        )
+
+    def _put(self, op: PutOp) -> None:
+        namespace = _join_namespace(op.namespace)
+        self._delete_vectors(namespace, op.key)
+        if op.value is None:
+            self.conn.execute(
+                "DELETE FROM items WHERE namespace = ? AND key = ?",
+                (namespace, op.key),
+            )
+            return
+        now = datetime.now(UTC).isoformat()
+        self.conn.execute(
+            "INSERT INTO items VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET "
+            "value = excluded.value, updated_at = excluded.updated_at",
+            (namespace, op.key, json.dumps(op.value), now, now),
+        )
+
+    def _delete_vectors(self, namespace: str, key: str) -> None:
+        if self.vectors is None:
+            return
+        rows = [
+            row
+            for (row,) in self.conn.execute(
+                "SELECT row FROM vectors WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            )
+        ]
+        if rows:
+            self.conn.execute(
+                "DELETE FROM vectors WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            )
+            self.vectors.remove(rows)
+
+    def _insert_vectors(self, to_embed: ToEmbed, vectors: dict[str, list[float]]):
+        if self.vectors is None:
+            return
+        entries = [
+            (vectors[text], namespace, key, path)
+            for text, indices in to_embed.items()
+            if text in vectors
+            for namespace, key, path in indices
+        ]
+        if not entries:
+            return
+        namespaces = [_join_namespace(entry[1]) for entry in entries]
+        rows = self.vectors.allocate(len(entries))
+        lists = self.vectors.add(
+            rows,
+            np.array([entry[0] for entry in entries]),
+            np.array([self._namespace_label(ns) for ns in namespaces]),
+        )
+        records = [
+            (row, namespace, key, path, list_)
+            for row, list_, namespace, (_, _, key, path) in zip(
+                rows.tolist(), lists.tolist(), namespaces, entries, strict=True
+            )
+        ]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?, ?)", records
+        )
+
+    def _train(self) -> None:
+        lists = self.vectors.train()
+        used = np.flatnonzero(self.vectors.assignments != -1)
+        self.conn.executemany(
+            "UPDATE vectors SET list = ? WHERE row = ?",
+            zip(lists.tolist(), used.tolist(), strict=True),
+        )
+
+    def _search_labels(self, prefix: tuple[str, ...]) -> list[int] | None:
+        if not prefix:
+            return None
+        return [
+            label
+            for namespace, label in self._namespace_labels.items()
+            if _has_prefix(_split_namespace(namespace), prefix)
+        ]
+
+    def _resolve_rows(self, rows: list[int]) -> dict[int, tuple[str, str]]:
+        resolved = {}
+        for start in range(0, len(rows), 500):
+            chunk = rows[start : start + 500]
+            resolved.update(
+                (row, (namespace, key))
+                for row, namespace, key in self.conn.execute(
+                    "SELECT row, namespace, key FROM vectors "
+                    f"WHERE row IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+            )
+        return resolved
+
+    def _search(self, op: SearchOp, query: list[float] | None) -> list[SearchItem]:
+        if query is None or self.vectors is None:
+            return self._scan(op, op.offset, op.limit)
+
+        labels = self._search_labels(op.namespace_prefix)
+        wanted = op.offset + op.limit
+        k = wanted * (4 if op.filter else 2)
+        while True:
+            rows, scores = self.vectors.search(query, labels=labels, k=k)
+            resolved = self._resolve_rows(rows.tolist())
+            # Max pooling over the indexed paths of each item
+            hits: dict[tuple[str, str], float] = {}
+            for row, score in zip(rows.tolist(), scores.tolist(), strict=True):
+                if (record := resolved.get(row)) and record not in hits:
+                    hits[record] = score
+            items = [item for item in self._get_items(hits, op.filter) if item]
+            if len(items) >= wanted or len(rows) < k:
+                break
+            k *= 4
+
+        results = [
+            SearchItem(
+                namespace=item.namespace,
+                key=item.key,
+                value=item.value,
+                created_at=item.created_at,
+                updated_at=item.updated_at,
+                score=hits[(_join_namespace(item.namespace), item.key)],
+            )
+            for item in items[op.offset : wanted]
+        ]
+        if len(results) < op.limit:
+            # Fill with items that have no embedding, like InMemoryStore
+            results.extend(
+                item
+                for item in self._scan(op, 0, op.limit + len(hits))
+                if (_join_namespace(item.namespace), item.key) not in hits
+            )
+            results = results[: op.limit]
+        return results
+
+    def _get_items(
+        self, keys: Iterable[tuple[str, str]], filter: dict[str, Any] | None
+    ) -> list[Item | None]:
+        items = []
+        for namespace, key in keys:
+            item = self._get(GetOp(_split_namespace(namespace), key))
+            items.append(
+                item
+                if item is not None and _matches_filter(item.value, filter)
+                else None
+            )
+        return items
+
+    def _scan(self, op: SearchOp, offset: int, limit: int) -> list[SearchItem]:
+        prefix = _join_namespace(op.namespace_prefix)
+        cursor = self.conn.execute(
+            "SELECT namespace, key, value, created_at, updated_at FROM items "
+            "WHERE ? = '' OR namespace = ? OR substr(namespace, 1, ?) = ? "
+            "ORDER BY updated_at DESC",
+            (prefix, prefix, len(prefix) + 1, f"{prefix}."),
+        )
+        results = []
+        for namespace, key, value, created_at, updated_at in cursor:
+            value = json.loads(value)
+            if not _matches_filter(value, op.filter):
+                continue
+            if offset > 0:
+                offset -= 1
+                continue
+            results.append(
+                SearchItem(
+                    namespace=_split_namespace(namespace),
+                    key=key,
+                    value=value,
+                    created_at=created_at,
+                    updated_at=updated_at,
+                )
+            )
+            if len(results) >= limit:
+                break
+        return results
+
+    def _list_namespaces(self, op: ListNamespacesOp) -> list[tuple[str, ...]]:
+        namespaces = [
+            _split_namespace(namespace)
+            for (namespace,) in self.conn.execute(
+                "SELECT DISTINCT namespace FROM items"
+            )
+        ]
+        if op.match_conditions:
+            namespaces = [
+                ns
+                for ns in namespaces
+                if all(_does_match(c, ns) for c in op.match_conditions)
+            ]
+        if op.max_depth is not None:
+            namespaces = sorted({ns[: op.max_depth] for ns in namespaces})
+        else:
+            namespaces = sorted(namespaces)
+        return namespaces[op.offset : op.offset + op.limit]
+
+    def close(self) -> None:
+        """Flush the vector index and close the database."""
+        with self.lock:
+            if self.vectors is not None:
+                self.vectors.flush()
+            self.conn.close()
+
+    async def aclose(self) -> None:
+        """Close the store without blocking the event loop."""
+        await asyncio.to_thread(self.close)
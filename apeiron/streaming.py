@@ -0,0 +1,213 @@
+import json
+import logging
+import time
+
+from discord import Message
+from discord.abc import Messageable
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.utils.json import parse_partial_json
+
+logger = logging.getLogger(__name__)
+
+DISCORD_MESSAGE_LIMIT = 2000
+
+
+def split_text(text: str, limit: int = DISCORD_MESSAGE_LIMIT) -> int:
+    """Find where to cut a text longer than limit, preferring line breaks.
+
+    Returns:
+        The length of the first part
+    """
+    for separator in ("\n", " "):
+        # Only cut at a separator in the last quarter, to keep messages full
+        cut = text.rfind(separator, limit * 3 // 4, limit)
+        if cut != -1:
+            return cut + 1
+    return limit
+
+
+def extract_field(partial: str, field: str) -> str | None:
+    """Extract a string field from a partial JSON object."""
+    try:
+        value = parse_partial_json(partial)
+    except json.JSONDecodeError:
+        return None
+    if isinstance(value, dict) and isinstance(value.get(field), str):
+        return value[field]
+    return None
+
+
+class MessageStream:
+    """Render a growing reply into Discord messages as it is generated.
+
+    The first update is sent right away, later ones edit the last message
+    at most once per interval. Text beyond the Discord message length limit
+    overflows into new messages, and messages that overflowed are never
+    edited again.
+    """
+
+    def __init__(
+        self,
+        channel: Messageable,
+        interval: float = 1.0,
+        limit: int = DISCORD_MESSAGE_LIMIT,
+    ) -> None:
+        """Initialize an empty stream.
+
+        Args:
+            channel: Channel the reply is sent to
+            interval: Minimum seconds between two edits
+            limit: Maximum length of a message
+        """
+        self.channel = channel
+        self.interval = interval
+        self.limit = limit
+        self.messages: list[Message] = []
+        self.sends = 0
+        self.edits = 0
+        # Length of the text held by the messages that overflowed
+        self._frozen = 0
+        self._current: Message | None = None
+        self._rendered = ""
+        self._last_render = 0.0
+
+    async def update(self, text: str, final: bool = False) -> None:
+        """Render the text generated so far.
+
+        Args:
+            text: The whole reply generated so far
+            final: Whether the text is complete, bypassing the edit interval
+        """
+        if (
+            not final
+            and self.messages
+            and time.monotonic() - self._last_render < self.interval
+        ):
+            return
+        rest = text[self._frozen :]
+        while len(rest) > self.limit:
+            cut = split_text(rest, self.limit)
+            await self._render(rest[:cut])
+            self._frozen += cut
+            self._current = None
+            self._rendered = ""
+            rest = rest[cut:]
+        await self._render(rest)
+        self._last_render = time.monotonic()
+
+    async def _render(self, text: str) -> None:
+        text = text.strip()
+        if not text or text == self._rendered:
+            return
+        if self._current is not None:
+            await self._current.edit(content=text)
+            self.edits += 1
+        else:
+            self._current = await self.channel.send(text)
+            self.messages.append(self._current)
+            self.sends += 1
+        self._rendered = text
+
+
+async def send_reply(channel: Messageable, text: str) -> list[Message]:
+    """Send a reply, split into as many messages as the length limit needs."""
+    stream = MessageStream(channel)
+    await stream.update(text, final=True)
+    return stream.messages
+
+
+def get_reply(state: dict, field: str | None = "content") -> str | None:
+    """Get the reply of a finished agent run.
+
+    Args:
+        state: The final state of the graph
+        field: Field of the structured response holding the reply, None to
+            reply with the text of the final message
+
+    Returns:
+        The reply, None if the agent did not reply
+    """
+    if field is not None:
+        return getattr(state.get("structured_response"), field, None)
+    messages = state.get("messages") or []
+    if messages and isinstance(messages[-1], AIMessage):
+        return messages[-1].text or None
+    return None
+
+
+async def stream_reply(
+    graph: Runnable,
+    inputs: dict,
+    config: RunnableConfig,
+    channel: Messageable,
+    tool_name: str | None = None,
+    field: str = "content",
+    interval: float = 1.0,
+) -> tuple[dict | None, list[Message]]:
+    """Run an agent, streaming its reply into Discord messages.
+
+    Without tool_name, the reply is the text of the final model message and
+    the text of model messages is streamed until they call a tool. With
+    tool_name, the reply is read from the given field of the structured
+    response while it is generated, whether the model returns it as the
+    arguments of the tool named tool_name or as JSON content.
+
+    Returns:
+        The final state of the graph and the messages sent
+    """
+    stream = MessageStream(channel, interval=interval)
+    state = None
+    message_id = None
+    names: dict = {}
+    arguments: dict = {}
+    content = ""
+    calls_tools = False
+    started = time.monotonic()
+    first_text = None
+
+    async for mode, data in graph.astream(
+        inputs, config=config, stream_mode=["messages", "values"]
+    ):
+        if mode == "values":
+            state = data
+            continue
+        chunk, metadata = data
+        if metadata.get("langgraph_node") != "model" or not isinstance(
+            chunk, AIMessageChunk
+        ):
+            continue
+        # Tool call indexes restart with every model call
+        if chunk.id != message_id:
+            message_id = chunk.id
+            names, arguments, content = {}, {}, ""
+            calls_tools = False
+
+        text = None
+        calls_tools = calls_tools or bool(chunk.tool_call_chunks)
+        for tool_call in chunk.tool_call_chunks:
+            index = tool_call.get("index")
+            if tool_call.get("name"):
+                names[index] = tool_call["name"]
+            arguments[index] = arguments.get(index, "") + (tool_call.get("args") or "")
+            if names.get(index) == tool_name:
+                text = extract_field(arguments[index], field)
+        if chunk.text:
+            content += chunk.text
+            if tool_name is None:
+                text = None if calls_tools else content
+            elif content.lstrip().startswith("{"):
+                text = extract_field(content, field)
+        if text:
+            if first_text is None:
+                first_text = time.monotonic() - started
+            await stream.update(text)
+
+    if state and (text := get_reply(state, field if tool_name else None)):
+        await stream.update(text, final=True)
+    if first_text is not None:
+        logger.info(
+            f"Streamed reply in {len(stream.messages)} messages, first text after "
+            f"{first_text:.2f}s, {stream.edits} edits"
+        )
+    return state, stream.messages
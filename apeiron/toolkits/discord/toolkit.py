@@ -12,7 +12,9 @@ from apeiron.tools.discord.list_channels import create_list_channels_tool
 from apeiron.tools.discord.list_emojis import create_list_emojis_tool
 from apeiron.tools.discord.list_members import create_list_members_tool
 from apeiron.tools.discord.list_messages import create_list_messages_tool
+from apeiron.tools.discord.resolver import DiscordResolver
 from apeiron.tools.discord.search_members import create_search_members_tool
+from apeiron.tools.discord.search_messages import create_search_messages_tool
 from apeiron.tools.discord.send_message import create_send_message_tool
 
 
@@ -20,6 +22,8 @@ class DiscordToolkit(BaseToolkit):
     """Toolkit for Discord operations."""
 
     client: Any = None  #: :meta private:
+    resolver: Any = None  #: :meta private:
+    message_index: Any = None  #: :meta private:
 
     def get_tools(self) -> list[BaseTool]:
         """Get the tools in the toolkit.
@@ -27,17 +31,21 @@ class DiscordToolkit(BaseToolkit):
         Returns:
             List of Discord tools.
         """
-        return [
-            create_add_reaction_tool(self.client),
-            create_get_channel_tool(self.client),
-            create_get_emoji_tool(self.client),
-            create_get_guild_tool(self.client),
-            create_get_message_tool(self.client),
-            create_get_user_tool(self.client),
-            create_list_channels_tool(self.client),
-            create_list_emojis_tool(self.client),
-            create_list_members_tool(self.client),
-            create_list_messages_tool(self.client),
-            create_search_members_tool(self.client),
-            create_send_message_tool(self.client),
+        resolver = self.resolver or DiscordResolver(self.client)
+        tools = [
+            create_add_reaction_tool(self.client, resolver),
+            create_get_channel_tool(self.client, resolver),
+            create_get_emoji_tool(self.client, resolver),
+            create_get_guild_tool(self.client, resolver),
+            create_get_message_tool(self.client, resolver),
+            create_get_user_tool(self.client, resolver),
+            create_list_channels_tool(self.client, resolver),
+            create_list_emojis_tool(self.client, resolver),
+            create_list_members_tool(self.client, resolver),
+            create_list_messages_tool(self.client, resolver),
+            create_search_members_tool(self.client, resolver),
+            create_send_message_tool(self.client, resolver),
         ]
+        if self.message_index is not None:
+            tools.append(create_search_messages_tool(self.client, self.message_index))
+        return tools
@@ -7,6 +7,8 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.resolver import DiscordResolver
+
 
 class AddReactionInput(BaseModel):
     """Arguments for adding reactions to Discord messages."""
@@ -20,8 +22,9 @@ class AddReactionInput(BaseModel):
     )
 
 
-def create_add_reaction_tool(client: Client):
+def create_add_reaction_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for adding reactions to Discord messages."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=AddReactionInput)
     async def add_reaction(
@@ -49,11 +52,11 @@ def create_add_reaction_tool(client: Client):
         if channel_id is None and config:
             channel_id = config.get("configurable").get("channel_id")
         try:
-            channel = await client.fetch_channel(channel_id)
+            channel = await resolver.channel(channel_id)
             target: Message | None = None
             if message_id:
                 with suppress(NotFound):
-                    target = await channel.fetch_message(message_id)
+                    target = await resolver.message(channel, message_id)
             if target is None:
                 return f"Message {message_id} not found"
             await target.add_reaction(emoji)
@@ -61,4 +64,6 @@ def create_add_reaction_tool(client: Client):
         except Forbidden as e:
             return f"Failed to add reaction: {str(e)}"
 
+    # Replies of runs calling it must not be replayed from the response cache
+    add_reaction.metadata = {"side_effects": True}
     return add_reaction
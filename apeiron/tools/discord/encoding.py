@@ -0,0 +1,95 @@
+import json
+import math
+from typing import Any
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(value: Any) -> int:
+    """Estimate the number of tokens of a value once serialized to JSON."""
+    text = json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":"))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def encode_table(
+    records: list[dict],
+    fields: list[str] | None = None,
+    references: dict[str, str] | None = None,
+    max_tokens: int | None = None,
+) -> dict:
+    """Encode records as a compact table.
+
+    Records become rows of values under a shared list of columns. Columns
+    holding the same value in every row are hoisted into "common", and
+    nested objects of the referenced columns are replaced by their ID and
+    stored once in a lookup table, e.g. message authors. Rows are dropped
+    once max_tokens is reached, in which case "next" holds the ID of the
+    last row returned so the caller can continue from there.
+
+    Args:
+        records: The records to encode, each with an "id" key
+        fields: Names of the fields to keep ("id" is always kept)
+        references: Map of column names to the name of their lookup table
+        max_tokens: Approximate token budget of the encoded table
+
+    Returns:
+        The encoded table
+    """
+    references = references or {}
+    rows = []
+    tables: dict[str, dict[str, dict]] = {table: {} for table in references.values()}
+    for record in records:
+        row = {}
+        for key, value in record.items():
+            if fields is not None and key not in fields and key != "id":
+                continue
+            if key in references and isinstance(value, dict) and "id" in value:
+                ref_id = str(value["id"])
+                tables[references[key]].setdefault(
+                    ref_id, {k: v for k, v in value.items() if k != "id"}
+                )
+                value = ref_id
+            row[key] = value
+        rows.append(row)
+
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    common = {}
+    if len(rows) > 1:
+        for column in columns:
+            first = rows[0].get(column)
+            if column != "id" and all(row.get(column) == first for row in rows):
+                common[column] = first
+    columns = [column for column in columns if column not in common]
+
+    encoded = {"columns": columns, "rows": []}
+    if common:
+        encoded["common"] = common
+    used = estimate_tokens(encoded)
+    kept_refs: dict[str, dict[str, dict]] = {table: {} for table in tables}
+    for row in rows:
+        values = [row.get(column) for column in columns]
+        cost = estimate_tokens(values)
+        new_refs = [
+            (references[key], row[key])
+            for key in references
+            if key in row
+            and row[key] in tables[references[key]]
+            and row[key] not in kept_refs[references[key]]
+        ]
+        cost += sum(
+            estimate_tokens({ref_id: tables[table][ref_id]})
+            for table, ref_id in new_refs
+        )
+        if max_tokens is not None and encoded["rows"] and used + cost > max_tokens:
+            encoded["truncated"] = len(rows) - len(encoded["rows"])
+            encoded["next"] = str(encoded["rows"][-1][columns.index("id")])
+            break
+        used += cost
+        encoded["rows"].append(values)
+        for table, ref_id in new_refs:
+            kept_refs[table][ref_id] = tables[table][ref_id]
+
+    for table, refs in kept_refs.items():
+        if refs:
+            encoded[table] = refs
+    return encoded
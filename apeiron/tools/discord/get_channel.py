@@ -7,6 +7,7 @@ from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
 from apeiron.tools.discord.list_channels import to_dict
+from apeiron.tools.discord.resolver import DiscordResolver
 
 
 class GetChannelInput(BaseModel):
@@ -17,8 +18,9 @@ class GetChannelInput(BaseModel):
     )
 
 
-def create_get_channel_tool(client: Client):
+def create_get_channel_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for retrieving a specific Discord channel."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=GetChannelInput)
     async def get_channel(
@@ -42,7 +44,7 @@ def create_get_channel_tool(client: Client):
         try:
             channel = None
             with suppress(NotFound):
-                channel = await client.fetch_channel(channel_id)
+                channel = await resolver.channel(channel_id)
             if not isinstance(channel, TextChannel):
                 return f"Channel {channel_id} not found or not a text channel"
             return to_dict(channel)
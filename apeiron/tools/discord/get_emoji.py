@@ -6,6 +6,8 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.resolver import DiscordResolver
+
 
 def to_dict(emoji: Emoji) -> dict:
     """Convert emoji to dictionary representation."""
@@ -31,8 +33,9 @@ class GetEmojiInput(BaseModel):
     )
 
 
-def create_get_emoji_tool(client: Client):
+def create_get_emoji_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for retrieving a specific Discord emoji."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=GetEmojiInput)
     async def get_emoji(
@@ -55,12 +58,12 @@ def create_get_emoji_tool(client: Client):
         try:
             guild = None
             with suppress(NotFound):
-                guild = await client.fetch_guild(guild_id)
+                guild = await resolver.guild(guild_id)
             if guild is None:
                 return f"Guild {guild_id} not found"
             emoji = None
             with suppress(NotFound):
-                emoji = await guild.fetch_emoji(emoji_id)
+                emoji = await resolver.emoji(guild, emoji_id)
             if emoji is None:
                 return f"Emoji {emoji_id} not found in guild {guild_id}"
             return to_dict(emoji)
@@ -6,6 +6,8 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.resolver import DiscordResolver
+
 
 def role_to_dict(role: Role) -> dict:
     """Convert role to dictionary representation."""
@@ -47,8 +49,9 @@ class GetGuildInput(BaseModel):
     )
 
 
-def create_get_guild_tool(client: Client):
+def create_get_guild_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for retrieving Discord guild information."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=GetGuildInput)
     async def get_guild(
@@ -69,7 +72,7 @@ def create_get_guild_tool(client: Client):
         try:
             guild = None
             with suppress(NotFound):
-                guild = await client.fetch_guild(int(guild_id))
+                guild = await resolver.guild(int(guild_id))
             if guild is None:
                 return f"Guild {guild_id} not found"
             return to_dict(guild)
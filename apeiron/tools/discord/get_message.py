@@ -6,6 +6,8 @@ from langchain.tools import tool
 from langchain_core.runnables import RunnableConfig
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.resolver import DiscordResolver
+
 
 def attachment_to_dict(attachment: Attachment) -> dict:
     """Convert attachment to dictionary representation."""
@@ -82,8 +84,9 @@ class GetMessageInput(BaseModel):
     )
 
 
-def create_get_message_tool(client: Client):
+def create_get_message_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for retrieving a specific Discord message."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=GetMessageInput)
     async def get_message(
@@ -109,12 +112,12 @@ def create_get_message_tool(client: Client):
         try:
             channel = None
             with suppress(NotFound):
-                channel = await client.fetch_channel(channel_id)
+                channel = await resolver.channel(channel_id)
             if not channel:
                 return f"Channel {channel_id} not found"
             message = None
             with suppress(NotFound):
-                message = await channel.fetch_message(message_id)
+                message = await resolver.message(channel, message_id)
             if not message:
                 return f"Message {message_id} not found in channel {channel_id}"
             return to_dict(message)
@@ -6,6 +6,8 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.resolver import DiscordResolver
+
 
 def to_dict(user: User) -> dict:
     """Convert user to dictionary representation."""
@@ -25,31 +27,51 @@ class GetUserInput(BaseModel):
     """Arguments for retrieving Discord user profile information."""
 
     user_id: int | None = Field(None, description="Discord user ID to look up")
+    name: str | None = Field(
+        None,
+        description="Name, display name or nickname to look up in the current guild",
+    )
 
 
-def create_get_user_tool(client: Client):
+def create_get_user_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for retrieving Discord user profile information."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=GetUserInput)
     async def get_user(
         user_id: int | None = None,
+        name: str | None = None,
         config: RunnableConfig | None = None,
     ) -> dict:
         """Get user profile information.
 
         Args:
             user_id: The ID of the user to look up.
+            name: Name, display name or nickname to look up in the current guild,
+            matched approximately.
             config: Optional RunnableConfig object.
 
         Returns:
             Dictionary containing user information.
         """
+        if user_id is None and name is not None:
+            guild_id = config.get("configurable").get("guild_id") if config else None
+            if guild_id is None:
+                return "Users can only be looked up by name in a guild"
+            try:
+                guild = await resolver.guild(guild_id)
+                member = await resolver.find_member(guild, name)
+            except (Forbidden, NotFound) as e:
+                return f"Failed to get user: {str(e)}"
+            if member is None:
+                return f"User {name} not found"
+            return to_dict(member)
         if user_id is None and config:
             user_id = config.get("configurable").get("user_id")
         try:
             user = None
             with suppress(NotFound):
-                user = await client.fetch_user(user_id)
+                user = await resolver.user(user_id)
             if user is None:
                 return f"User {user_id} not found"
             return to_dict(user)
@@ -6,6 +6,8 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.resolver import DiscordResolver
+
 
 def to_dict(channel: TextChannel) -> dict:
     """Convert channel to dictionary representation."""
@@ -30,8 +32,9 @@ class ListChannelsInput(BaseModel):
     )
 
 
-def create_list_channels_tool(client: Client):
+def create_list_channels_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for listing Discord channels."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=ListChannelsInput)
     async def list_channels(
@@ -52,10 +55,10 @@ def create_list_channels_tool(client: Client):
         try:
             guild = None
             with suppress(NotFound):
-                guild = await client.fetch_guild(guild_id)
+                guild = await resolver.guild(guild_id)
             if guild is None:
                 return f"Guild {guild_id} not found"
-            channels = await guild.fetch_channels()
+            channels = await resolver.channels(guild)
             return [to_dict(channel) for channel in channels]
         except (Forbidden, NotFound) as e:
             return f"Failed to list channels: {str(e)}"
@@ -6,6 +6,7 @@ from langchain_core.tools.base import ToolException
 from pydantic import BaseModel, Field
 
 from apeiron.tools.discord.get_emoji import to_dict
+from apeiron.tools.discord.resolver import DiscordResolver
 
 
 class ListEmojisInput(BaseModel):
@@ -16,8 +17,9 @@ class ListEmojisInput(BaseModel):
     )
 
 
-def create_list_emojis_tool(client: Client):
+def create_list_emojis_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for listing emojis in a Discord guild."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=ListEmojisInput)
     async def list_emojis(
@@ -39,8 +41,8 @@ def create_list_emojis_tool(client: Client):
         if guild_id is None and config:
             guild_id = config.get("configurable").get("guild_id")
         try:
-            guild = await client.fetch_guild(guild_id)
-            emojis = await guild.fetch_emojis()
+            guild = await resolver.guild(guild_id)
+            emojis = await resolver.emojis(guild)
             return [to_dict(emoji) for emoji in emojis]
         except (Forbidden, NotFound) as e:
             raise ToolException(f"Failed to list emojis: {str(e)}") from e
@@ -3,6 +3,7 @@ from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
 from apeiron.tools.discord.get_guild import to_dict
+from apeiron.tools.discord.resolver import DiscordResolver
 
 
 class ListGuildsInput(BaseModel):
@@ -17,8 +18,9 @@ class ListGuildsInput(BaseModel):
     limit: int = Field(100, description="Number of guilds to retrieve (max 100)")
 
 
-def create_list_guilds_tool(client: Client):
+def create_list_guilds_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for listing Discord guilds the bot is a member of."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=ListGuildsInput)
     async def list_guilds(
@@ -36,13 +38,11 @@ def create_list_guilds_tool(client: Client):
         Returns:
             List of guild dictionaries.
         """
-        kwargs = {"limit": limit}
-        if before:
-            kwargs["before"] = before
-        if after:
-            kwargs["after"] = after
-
-        guilds = await client.fetch_guilds(**kwargs).flatten()
+        guilds = await resolver.guilds(
+            limit=limit,
+            before=int(before) if before else None,
+            after=int(after) if after else None,
+        )
         return [to_dict(guild) for guild in guilds]
 
     return list_guilds
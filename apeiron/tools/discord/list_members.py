@@ -6,6 +6,16 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.encoding import encode_table
+from apeiron.tools.discord.pagination import (
+    clamp_limit,
+    decode_cursor,
+    encode_cursor,
+    snowflake,
+    take,
+)
+from apeiron.tools.discord.resolver import DiscordResolver
+
 
 def to_dict(member: Member) -> dict:
     """Convert member to dictionary representation."""
@@ -29,58 +39,93 @@ class ListMembersInput(BaseModel):
     guild_id: int | None = Field(
         None, description="Discord guild (server) ID to list members from"
     )
-    before: str | None = Field(
-        None, description="Optional member ID to list members before"
-    )
     after: str | None = Field(
         None, description="Optional member ID to list members after"
     )
+    cursor: str | None = Field(
+        None, description="Optional cursor from a previous page to read the next one"
+    )
     limit: int = Field(100, description="Number of members to retrieve (max 100)")
+    compact: bool = Field(
+        True, description="Whether to return a compact table instead of a list"
+    )
+    fields: list[str] | None = Field(
+        None, description="Optional member fields to return in compact mode"
+    )
+    max_tokens: int = Field(
+        2000, description="Approximate token budget of the compact table"
+    )
 
 
-def create_list_members_tool(client: Client):
+def create_list_members_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for listing Discord guild members."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=ListMembersInput)
     async def list_members(
         guild_id: int | None = None,
-        before: str | None = None,
         after: str | None = None,
+        cursor: str | None = None,
         limit: int = 100,
+        compact: bool = True,
+        fields: list[str] | None = None,
+        max_tokens: int = 2000,
         config: RunnableConfig | None = None,
-    ) -> list[dict]:
-        """List members in a guild with optional filters.
+    ) -> dict:
+        """List a page of members in a guild, ordered by ID.
 
         Args:
             guild_id: The ID of the guild to list members from.
-            before: Optional member ID to list members before.
             after: Optional member ID to list members after.
+            cursor: Optional cursor from a previous page to read the next one.
             limit: Number of members to retrieve (max 100).
+            compact: Whether to return a compact table instead of a list.
+            fields: Optional member fields to return in compact mode.
+            max_tokens: Approximate token budget of the compact table.
             config: Optional RunnableConfig object.
 
         Returns:
-            List of member dictionaries.
+            Compact table or dictionary with the list of members. When more
+            members are available, "next" holds the cursor of the next page.
 
         Raises:
             ToolException: If the members cannot be listed.
         """
+        if cursor:
+            try:
+                state = decode_cursor(cursor)
+                guild_id, after = state["guild_id"], state["after"]
+            except (KeyError, ValueError) as e:
+                return f"Invalid pagination arguments: {str(e)}"
         if guild_id is None and config:
             guild_id = config.get("configurable").get("guild_id")
+
+        def next_cursor(last_id: str) -> str:
+            return encode_cursor({"guild_id": guild_id, "after": last_id})
+
         try:
             guild = None
             with suppress(NotFound):
-                guild = await client.fetch_guild(guild_id)
+                guild = await resolver.guild(guild_id)
             if guild is None:
                 return f"Guild {guild_id} not found"
-            kwargs = {"limit": limit}
-            if before:
-                kwargs["before"] = before
-            if after:
-                kwargs["after"] = after
-
-            members = await guild.fetch_members(**kwargs).flatten()
-            return [to_dict(member) for member in members]
+            limit = clamp_limit(limit)
+            members = guild.fetch_members(limit=limit, after=snowflake(after))
+            records = [to_dict(member) for member in await take(members, limit)]
         except (Forbidden, NotFound) as e:
             return f"Failed to list members: {str(e)}"
 
+        has_more = len(records) == limit
+        if compact:
+            table = encode_table(records, fields=fields, max_tokens=max_tokens)
+            if "next" in table:
+                table["next"] = next_cursor(table["next"])
+            elif has_more:
+                table["next"] = next_cursor(records[-1]["id"])
+            return table
+        page = {"members": records}
+        if has_more:
+            page["next"] = next_cursor(records[-1]["id"])
+        return page
+
     return list_members
@@ -6,7 +6,18 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.encoding import encode_table
 from apeiron.tools.discord.get_message import to_dict
+from apeiron.tools.discord.pagination import (
+    clamp_limit,
+    decode_cursor,
+    encode_cursor,
+    since_snowflake,
+    snowflake,
+    take,
+    until_snowflake,
+)
+from apeiron.tools.discord.resolver import DiscordResolver
 
 
 class ListMessagesInput(BaseModel):
@@ -24,11 +35,30 @@ class ListMessagesInput(BaseModel):
     around: str | None = Field(
         None, description="Optional message ID to read messages around"
     )
+    since: str | None = Field(
+        None, description="Optional ISO 8601 time to read messages from"
+    )
+    until: str | None = Field(
+        None, description="Optional ISO 8601 time to read messages until"
+    )
+    cursor: str | None = Field(
+        None, description="Optional cursor from a previous page to read the next one"
+    )
     limit: int = Field(100, description="Number of messages to retrieve (max 100)")
+    compact: bool = Field(
+        True, description="Whether to return a compact table instead of a list"
+    )
+    fields: list[str] | None = Field(
+        None, description="Optional message fields to return in compact mode"
+    )
+    max_tokens: int = Field(
+        2000, description="Approximate token budget of the compact table"
+    )
 
 
-def create_list_messages_tool(client: Client):
+def create_list_messages_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for reading messages from a Discord channel."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=ListMessagesInput)
     async def list_messages(
@@ -36,46 +66,100 @@ def create_list_messages_tool(client: Client):
         before: str | None = None,
         after: str | None = None,
         around: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+        cursor: str | None = None,
         limit: int = 100,
+        compact: bool = True,
+        fields: list[str] | None = None,
+        max_tokens: int = 2000,
         config: RunnableConfig | None = None,
-    ) -> list[dict]:
-        """Read messages from a Discord channel with optional filters.
+    ) -> dict:
+        """Read a page of messages from a Discord channel with optional filters.
 
         Args:
             channel_id: ID of the channel to read messages from.
             before: Optional message ID to read messages before.
             after: Optional message ID to read messages after.
             around: Optional message ID to read messages around.
+            since: Optional ISO 8601 time to read messages from.
+            until: Optional ISO 8601 time to read messages until.
+            cursor: Optional cursor from a previous page to read the next one.
             limit: Number of messages to retrieve (max 100).
+            compact: Whether to return a compact table instead of a list.
+            fields: Optional message fields to return in compact mode.
+            max_tokens: Approximate token budget of the compact table.
             config: Optional RunnableConfig object.
 
         Returns:
-            List containing message objects with metadata and content.
+            Compact table or dictionary with the list of messages. When more
+            messages are available, "next" holds the cursor of the next page.
 
         Raises:
             ToolException: If the messages fail to read.
         """
+        try:
+            if cursor:
+                state = decode_cursor(cursor)
+                channel_id = state["channel_id"]
+                before, after = state.get("before"), state.get("after")
+                oldest_first = state["oldest_first"]
+            else:
+                if since:
+                    after = max(int(after or 0), since_snowflake(since))
+                if until:
+                    bound = until_snowflake(until)
+                    before = min(int(before), bound) if before else bound
+                # Match the order of channel.history, oldest first after an ID
+                oldest_first = after is not None and not around
+        except (KeyError, ValueError) as e:
+            return f"Invalid pagination arguments: {str(e)}"
+
         if channel_id is None and config:
             channel_id = config.get("configurable").get("channel_id")
+
+        def next_cursor(last_id: str) -> str:
+            state = {"channel_id": channel_id, "oldest_first": oldest_first}
+            if oldest_first:
+                state.update(after=last_id, before=before)
+            else:
+                state.update(before=last_id, after=after)
+            return encode_cursor(state)
+
         try:
             channel = None
             with suppress(NotFound):
-                channel = await client.fetch_channel(channel_id)
+                channel = await resolver.channel(channel_id)
             if channel is None:
                 return f"Channel {channel_id} not found"
-            kwargs = {"limit": limit}
-            if before:
-                kwargs["before"] = before
-            if after:
-                kwargs["after"] = after
-            if around:
-                kwargs["around"] = around
-
-            messages = []
-            async for message in channel.history(**kwargs):
-                messages.append(to_dict(message))
-            return messages
+            limit = clamp_limit(limit)
+            history = channel.history(
+                limit=limit,
+                before=snowflake(before),
+                after=snowflake(after),
+                around=snowflake(around),
+                oldest_first=oldest_first,
+            )
+            messages = [to_dict(message) for message in await take(history, limit)]
         except (Forbidden, NotFound) as e:
             return f"Failed to read messages: {str(e)}"
 
+        has_more = len(messages) == limit and not around
+        if compact:
+            table = encode_table(
+                messages,
+                fields=fields,
+                references={"author": "authors", "reference": "references"},
+                max_tokens=max_tokens,
+            )
+            if "next" in table:
+                table["next"] = next_cursor(table["next"])
+            elif has_more:
+                table["next"] = next_cursor(messages[-1]["id"])
+            return table
+        page = {"messages": messages}
+        if has_more:
+            page["next"] = next_cursor(messages[-1]["id"])
+        return page
+
     return list_messages
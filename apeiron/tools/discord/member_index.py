@@ -0,0 +1,234 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from discord import Client, Guild, Member, User
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text: str) -> str:
+    """Normalize a name for case and compatibility insensitive matching."""
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def trigrams(text: str) -> set[str]:
+    """Get the trigrams of a normalized name, padded to match its start."""
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def member_names(member: Member) -> tuple[str, ...]:
+    """Get the names a member can be searched by."""
+    return tuple(
+        name for name in (member.name, member.global_name, member.nick) if name
+    )
+
+
+class GuildMemberIndex:
+    """Prefix and trigram index over the names of the members of a guild.
+
+    Names are kept in a sorted list for prefix lookups with bisect, and in
+    an inverted index of trigrams for fuzzy lookups.
+    """
+
+    def __init__(self) -> None:
+        self.names: dict[int, tuple[str, ...]] = {}
+        self.sorted_names: list[tuple[str, int]] = []
+        self.trigrams: dict[str, set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def build(self, members: dict[int, tuple[str, ...]]) -> None:
+        """Index members in bulk, replacing the current content."""
+        self.names = {
+            member_id: tuple(dict.fromkeys(normalize(name) for name in names))
+            for member_id, names in members.items()
+        }
+        self.sorted_names = sorted(
+            (name, member_id)
+            for member_id, names in self.names.items()
+            for name in names
+        )
+        self.trigrams = {}
+        for member_id, names in self.names.items():
+            for name in names:
+                for gram in trigrams(name):
+                    self.trigrams.setdefault(gram, set()).add(member_id)
+
+    def add(self, member_id: int, names: tuple[str, ...]) -> None:
+        """Index a member, replacing its previous names."""
+        self.remove(member_id)
+        normalized = tuple(dict.fromkeys(normalize(name) for name in names))
+        self.names[member_id] = normalized
+        for name in normalized:
+            insort(self.sorted_names, (name, member_id))
+            for gram in trigrams(name):
+                self.trigrams.setdefault(gram, set()).add(member_id)
+
+    def remove(self, member_id: int) -> None:
+        """Remove a member from the index."""
+        for name in self.names.pop(member_id, ()):
+            i = bisect_left(self.sorted_names, (name, member_id))
+            if i < len(self.sorted_names) and self.sorted_names[i] == (name, member_id):
+                del self.sorted_names[i]
+            for gram in trigrams(name):
+                if (ids := self.trigrams.get(gram)) is not None:
+                    ids.discard(member_id)
+                    if not ids:
+                        del self.trigrams[gram]
+
+    def search(
+        self, query: str, limit: int = 100, min_similarity: float = 0.5
+    ) -> list[int]:
+        """Find members by name.
+
+        Members with a name starting with the query come first, in name
+        order, followed by members sharing at least min_similarity of the
+        query trigrams, most similar first.
+
+        Returns:
+            The IDs of the matching members
+        """
+        query = normalize(query)
+        results: dict[int, None] = {}
+        i = bisect_left(self.sorted_names, (query,))
+        while i < len(self.sorted_names) and len(results) < limit:
+            name, member_id = self.sorted_names[i]
+            if not name.startswith(query):
+                break
+            results.setdefault(member_id)
+            i += 1
+
+        # Short queries share too few trigrams for fuzzy matching
+        if len(results) < limit and len(query) >= 3:
+            postings = sorted(
+                (self.trigrams.get(gram, set()) for gram in trigrams(query)), key=len
+            )
+            # A match shares at least `needed` trigrams, so it shares one of
+            # the len - needed + 1 rarest ones
+            needed = math.ceil(min_similarity * len(postings))
+            candidates = set().union(*postings[: len(postings) - needed + 1])
+            candidates.difference_update(results)
+            scored = []
+            for member_id in candidates:
+                count = sum(member_id in ids for ids in postings)
+                if count >= needed:
+                    scored.append((count, -member_id))
+            for _, member_id in heapq.nlargest(limit - len(results), scored):
+                results.setdefault(-member_id)
+        return list(results)
+
+
+class MemberIndex:
+    """Member name indexes of the guilds cached by the client.
+
+    The index of a guild is built in a worker thread on its first search,
+    once the guild member list has been chunked, and kept up to date from
+    member events once registered with register().
+    """
+
+    def __init__(self, client: Client) -> None:
+        self.client = client
+        self.guilds: dict[int, GuildMemberIndex] = {}
+        self.searches = 0
+        self._building: dict[int, asyncio.Future[GuildMemberIndex]] = {}
+        # Member updates received while an index is being built
+        self._pending: dict[int, list[tuple[int, tuple[str, ...] | None]]] = {}
+
+    def stats(self) -> dict[str, int]:
+        """Get the number of indexed guilds, members and searches."""
+        return {
+            "guilds": len(self.guilds),
+            "members": sum(len(index) for index in self.guilds.values()),
+            "searches": self.searches,
+        }
+
+    async def get(self, guild: Guild) -> GuildMemberIndex | None:
+        """Get the index of a guild, None if its members are not cached."""
+        if (index := self.guilds.get(guild.id)) is not None:
+            return index
+        if (building := self._building.get(guild.id)) is not None:
+            return await asyncio.shield(building)
+        if self.client.get_guild(guild.id) is not guild or not guild.chunked:
+            return None
+
+        building = asyncio.get_running_loop().create_future()
+        self._building[guild.id] = building
+        self._pending[guild.id] = []
+        try:
+            started = time.monotonic()
+            members = {member.id: member_names(member) for member in guild.members}
+            index = GuildMemberIndex()
+            await asyncio.to_thread(index.build, members)
+            for member_id, names in self._pending[guild.id]:
+                self._apply(index, member_id, names)
+            self.guilds[guild.id] = index
+            building.set_result(index)
+            logger.info(
+                f"Indexed {len(index)} members of guild {guild.id} "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+            return index
+        except Exception as e:
+            building.set_exception(e)
+            # Only concurrent searches retrieve the exception
+            building.exception()
+            raise
+        finally:
+            del self._building[guild.id]
+            del self._pending[guild.id]
+
+    async def search(
+        self, guild: Guild, query: str, limit: int = 100
+    ) -> list[Member] | None:
+        """Find members of a guild by name, None if its members are not cached."""
+        if (index := await self.get(guild)) is None:
+            return None
+        self.searches += 1
+        members = (guild.get_member(id) for id in index.search(query, limit=limit))
+        return [member for member in members if member is not None]
+
+    def _apply(
+        self, index: GuildMemberIndex, member_id: int, names: tuple[str, ...] | None
+    ) -> None:
+        if names is None:
+            index.remove(member_id)
+        else:
+            index.add(member_id, names)
+
+    def update(self, guild_id: int, member_id: int, names: tuple[str, ...] | None):
+        """Update the names of a member, or remove it when names is None."""
+        if (index := self.guilds.get(guild_id)) is not None:
+            self._apply(index, member_id, names)
+        elif guild_id in self._pending:
+            self._pending[guild_id].append((member_id, names))
+
+    def register(self, client: Client) -> None:
+        """Keep the indexes up to date from the client's member events."""
+
+        async def on_member_change(member: Member, after: Member | None = None):
+            member = after or member
+            self.update(member.guild.id, member.id, member_names(member))
+
+        async def on_member_remove(member: Member):
+            self.update(member.guild.id, member.id, None)
+
+        async def on_user_update(before: User, after: User):
+            for guild in after.mutual_guilds:
+                if member := guild.get_member(after.id):
+                    self.update(guild.id, member.id, member_names(member))
+
+        async def on_guild_remove(guild: Guild):
+            self.guilds.pop(guild.id, None)
+
+        client.add_listener(on_member_change, "on_member_join")
+        client.add_listener(on_member_change, "on_member_update")
+        client.add_listener(on_member_remove, "on_member_remove")
+        client.add_listener(on_user_update, "on_user_update")
+        client.add_listener(on_guild_remove, "on_guild_remove")
@@ -0,0 +1,292 @@
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from os import PathLike
+from pathlib import Path
+
+from discord import Client, Message
+from discord.abc import GuildChannel
+from discord.raw_models import (
+    RawBulkMessageDeleteEvent,
+    RawMessageDeleteEvent,
+    RawMessageUpdateEvent,
+)
+
+from apeiron.checkpoint.sqlite import connect
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER,
+    channel_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    author TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_channel ON messages (guild_id, channel_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    author,
+    content='messages',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content, author)
+    VALUES (new.id, new.content, new.author);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content, author)
+    VALUES ('delete', old.id, old.content, old.author);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content, author)
+    VALUES ('delete', old.id, old.content, old.author);
+    INSERT INTO messages_fts (rowid, content, author)
+    VALUES (new.id, new.content, new.author);
+END;
+"""
+
+type MessageRow = tuple[int, int | None, int, int, str, str, float]
+
+
+def to_row(message: Message) -> MessageRow:
+    """Convert a message to a row of the index."""
+    return (
+        message.id,
+        message.guild.id if message.guild else None,
+        message.channel.id,
+        message.author.id,
+        message.author.display_name,
+        message.content,
+        message.created_at.timestamp(),
+    )
+
+
+def to_match_query(query: str) -> str:
+    """Quote the terms of a free text query for FTS5, matching all of them.
+
+    Terms also match as prefixes, so "deploy" matches "deploys".
+    """
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in query.split())
+
+
+class MessageIndex:
+    """Full-text index of Discord messages in a local SQLite FTS5 table.
+
+    Messages are written behind by a background thread in batched
+    transactions, so gateway events never wait on disk. Edits replace the
+    indexed content and deletes remove it.
+    """
+
+    def __init__(
+        self,
+        path: str | PathLike,
+        *,
+        flush_interval: float = 1.0,
+        batch_size: int = 1024,
+    ) -> None:
+        """Open or create an index.
+
+        Args:
+            path: Path of the SQLite database file
+            flush_interval: Maximum seconds a write waits before being flushed
+            batch_size: Maximum number of writes flushed in one transaction
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.flushes = 0
+        self.searches = 0
+
+        self._conn = connect(self.path)
+        self._conn.executescript(SCHEMA)
+        self._conn_lock = threading.Lock()
+        self._queue: queue.Queue[tuple | None] = queue.Queue()
+        self._writer = threading.Thread(
+            target=self._run_writer, name="apeiron-message-index-writer", daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.close)
+
+    def stats(self) -> dict[str, int]:
+        """Get the pending writes, flush and search counters."""
+        return {
+            "pending_writes": self._queue.qsize(),
+            "flushes": self.flushes,
+            "searches": self.searches,
+        }
+
+    def add_messages(self, messages: Iterable[Message]) -> None:
+        """Index messages, replacing the ones already indexed."""
+        rows = [to_row(message) for message in messages if message.content]
+        if rows:
+            self._queue.put(("upsert", rows))
+
+    def edit_message(self, message_id: int, content: str) -> None:
+        """Replace the indexed content of a message."""
+        self._queue.put(("edit", [(content, message_id)]))
+
+    def delete_messages(self, message_ids: Iterable[int]) -> None:
+        """Remove messages from the index."""
+        self._queue.put(("delete", [(message_id,) for message_id in message_ids]))
+
+    def delete_channel(self, channel_id: int) -> None:
+        """Remove all the messages of a channel from the index."""
+        self._queue.put(("delete_channel", [(channel_id,)]))
+
+    def _run_writer(self) -> None:
+        conn = connect(self.path)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    self._queue.task_done()
+                    return
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get(
+                            timeout=max(0.0, deadline - time.monotonic())
+                        )
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._queue.put(None)
+                        self._queue.task_done()
+                        break
+                    batch.append(item)
+                try:
+                    self._write_batch(conn, batch)
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to index messages: {e}")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: list[tuple]) -> None:
+        with conn:
+            conn.execute("BEGIN")
+            for kind, rows in batch:
+                match kind:
+                    case "upsert":
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO messages VALUES "
+                            "(?, ?, ?, ?, ?, ?, ?)",
+                            rows,
+                        )
+                    case "edit":
+                        conn.executemany(
+                            "UPDATE messages SET content = ? WHERE id = ?", rows
+                        )
+                    case "delete":
+                        conn.executemany("DELETE FROM messages WHERE id = ?", rows)
+                    case "delete_channel":
+                        conn.executemany(
+                            "DELETE FROM messages WHERE channel_id = ?", rows
+                        )
+        self.flushes += 1
+
+    def search(
+        self,
+        query: str,
+        guild_id: int | None = None,
+        channel_id: int | None = None,
+        author_id: int | None = None,
+        limit: int = 10,
+    ) -> list[dict]:
+        """Search messages matching all the terms of a query, best match first.
+
+        Args:
+            query: Free text query
+            guild_id: Guild to search, None to search direct messages
+            channel_id: Optional channel to restrict the search to
+            author_id: Optional author to restrict the search to
+            limit: Maximum number of hits
+
+        Returns:
+            Hits with the message ID, channel ID, author, time and a snippet
+            of the matching content
+        """
+        match_query = to_match_query(query)
+        if not match_query:
+            return []
+        sql = (
+            "SELECT m.id, m.channel_id, m.author_id, m.author, m.created_at, "
+            "snippet(messages_fts, 0, '**', '**', '...', 16) "
+            "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+            "WHERE messages_fts MATCH ? AND m.guild_id IS ?"
+        )
+        params: list = [match_query, guild_id]
+        if channel_id is not None:
+            sql += " AND m.channel_id = ?"
+            params.append(channel_id)
+        if author_id is not None:
+            sql += " AND m.author_id = ?"
+            params.append(author_id)
+        sql += " ORDER BY bm25(messages_fts) LIMIT ?"
+        params.append(limit)
+        with self._conn_lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        self.searches += 1
+        return [
+            {
+                "id": str(message_id),
+                "channel_id": str(channel_id),
+                "author_id": str(author_id),
+                "author": author,
+                "timestamp": time.strftime(
+                    "%Y-%m-%d %H:%M:%S", time.gmtime(created_at)
+                ),
+                "snippet": snippet,
+            }
+            for message_id, channel_id, author_id, author, created_at, snippet in rows
+        ]
+
+    def register(self, client: Client) -> None:
+        """Index messages from the client's gateway events."""
+
+        async def on_message(message: Message):
+            self.add_messages([message])
+
+        async def on_raw_message_edit(payload: RawMessageUpdateEvent):
+            if (content := payload.data.get("content")) is not None:
+                self.edit_message(payload.message_id, content)
+
+        async def on_raw_message_delete(payload: RawMessageDeleteEvent):
+            self.delete_messages([payload.message_id])
+
+        async def on_raw_bulk_message_delete(payload: RawBulkMessageDeleteEvent):
+            self.delete_messages(payload.message_ids)
+
+        async def on_guild_channel_delete(channel: GuildChannel):
+            self.delete_channel(channel.id)
+
+        client.add_listener(on_message, "on_message")
+        client.add_listener(on_raw_message_edit, "on_raw_message_edit")
+        client.add_listener(on_raw_message_delete, "on_raw_message_delete")
+        client.add_listener(on_raw_bulk_message_delete, "on_raw_bulk_message_delete")
+        client.add_listener(on_guild_channel_delete, "on_guild_channel_delete")
+
+    def flush(self) -> None:
+        """Block until all queued writes are persisted."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Flush queued writes and stop the background writer."""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._conn.close()
+        atexit.unregister(self.close)
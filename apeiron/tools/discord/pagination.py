@@ -0,0 +1,74 @@
+import base64
+import binascii
+import json
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime
+
+from discord import Object
+from discord.utils import time_snowflake
+
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(state: dict) -> str:
+    """Encode pagination state into an opaque cursor."""
+    text = json.dumps(state, separators=(",", ":"))
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Decode a cursor created by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(state, dict):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return state
+
+
+def parse_time(value: str) -> datetime:
+    """Parse an ISO 8601 time, assuming UTC when no timezone is given.
+
+    Raises:
+        ValueError: If the time is malformed
+    """
+    time = datetime.fromisoformat(value)
+    return time if time.tzinfo else time.replace(tzinfo=UTC)
+
+
+def since_snowflake(value: str) -> int:
+    """Get the snowflake to list IDs after to start at the given time."""
+    return time_snowflake(parse_time(value), high=False) - 1
+
+
+def until_snowflake(value: str) -> int:
+    """Get the snowflake to list IDs before to stop at the given time."""
+    return time_snowflake(parse_time(value), high=True) + 1
+
+
+def snowflake(value: int | str | None) -> Object | None:
+    """Wrap an ID into a snowflake object accepted by the iterators."""
+    return Object(id=int(value)) if value is not None else None
+
+
+def clamp_limit(limit: int) -> int:
+    """Restrict a requested page size to the range allowed by Discord."""
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+async def take[T](iterator: AsyncIterator[T], limit: int) -> list[T]:
+    """Pull at most limit items from an async iterator, without draining it."""
+    items = []
+    if limit <= 0:
+        return items
+    async for item in iterator:
+        items.append(item)
+        if len(items) >= limit:
+            break
+    return items
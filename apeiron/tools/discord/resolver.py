@@ -0,0 +1,261 @@
+import logging
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from discord import Client, Emoji, Guild, Member, Message, Object, User
+from discord.abc import GuildChannel, Messageable
+
+from apeiron.tools.discord.member_index import MemberIndex
+from apeiron.utils import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class DiscordResolver:
+    """Resolve Discord entities from the gateway cache before REST.
+
+    With all intents enabled the client already holds guilds, channels,
+    users, members, emojis and recent messages, so lookups first go through
+    the client's get_* methods. Only cache misses are fetched over REST, and
+    the fetched entities are kept in a TTL cache that gateway events
+    invalidate once registered with register().
+    """
+
+    def __init__(self, client: Client, maxsize: int = 4096, ttl: float = 300.0):
+        """Initialize the resolver.
+
+        Args:
+            client: The Discord client
+            maxsize: Maximum number of entities fetched over REST kept cached
+            ttl: Seconds entities fetched over REST are kept cached
+        """
+        self.client = client
+        self.cache: TTLCache[Hashable, Any] = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.members = MemberIndex(client)
+        self.gateway_hits = 0
+        self.rest_calls = 0
+
+    def stats(self) -> dict[str, int]:
+        """Get the gateway hits, REST calls and REST cache counters."""
+        return {
+            **self.cache.stats(),
+            "gateway_hits": self.gateway_hits,
+            "rest_calls": self.rest_calls,
+            "member_index": self.members.stats(),
+        }
+
+    async def _resolve(
+        self,
+        key: Hashable,
+        cached: Any,
+        fetch: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        if cached is not None:
+            self.gateway_hits += 1
+            return cached
+        if (entity := self.cache.get(key)) is not None:
+            return entity
+        self.rest_calls += 1
+        entity = await fetch()
+        self.cache.put(key, entity)
+        return entity
+
+    def _is_cached_guild(self, guild: Guild) -> bool:
+        return self.client.get_guild(guild.id) is guild
+
+    async def guild(self, guild_id: int) -> Guild:
+        """Get a guild.
+
+        Raises:
+            NotFound: If the guild does not exist
+            Forbidden: If the bot cannot access the guild
+        """
+        return await self._resolve(
+            ("guild", guild_id),
+            self.client.get_guild(guild_id),
+            lambda: self.client.fetch_guild(guild_id),
+        )
+
+    async def guilds(
+        self,
+        limit: int = 100,
+        before: int | None = None,
+        after: int | None = None,
+    ) -> list[Guild]:
+        """List the guilds the bot is a member of, sorted by ID."""
+        if not self.client.is_ready():
+            self.rest_calls += 1
+            return await self.client.fetch_guilds(
+                limit=limit,
+                before=Object(id=before) if before is not None else None,
+                after=Object(id=after) if after is not None else None,
+            ).flatten()
+        self.gateway_hits += 1
+        guilds = sorted(self.client.guilds, key=lambda guild: guild.id)
+        if before is not None:
+            guilds = [guild for guild in guilds if guild.id < before][-limit:]
+        if after is not None:
+            guilds = [guild for guild in guilds if guild.id > after]
+        return guilds[:limit]
+
+    async def channel(self, channel_id: int) -> GuildChannel | Messageable:
+        """Get a channel, thread or private channel.
+
+        Raises:
+            NotFound: If the channel does not exist
+            Forbidden: If the bot cannot access the channel
+        """
+        return await self._resolve(
+            ("channel", channel_id),
+            self.client.get_channel(channel_id),
+            lambda: self.client.fetch_channel(channel_id),
+        )
+
+    async def channels(self, guild: Guild) -> list[GuildChannel]:
+        """List the channels of a guild."""
+        return await self._resolve(
+            ("channels", guild.id),
+            list(guild.channels) if self._is_cached_guild(guild) else None,
+            guild.fetch_channels,
+        )
+
+    async def user(self, user_id: int) -> User:
+        """Get a user.
+
+        Raises:
+            NotFound: If the user does not exist
+        """
+        return await self._resolve(
+            ("user", user_id),
+            self.client.get_user(user_id),
+            lambda: self.client.fetch_user(user_id),
+        )
+
+    async def member(self, guild: Guild, user_id: int) -> Member:
+        """Get a member of a guild.
+
+        Raises:
+            NotFound: If the user is not a member of the guild
+        """
+        return await self._resolve(
+            ("member", guild.id, user_id),
+            guild.get_member(user_id),
+            lambda: guild.fetch_member(user_id),
+        )
+
+    async def search_members(
+        self, guild: Guild, query: str, limit: int = 100
+    ) -> list[Member]:
+        """Find members of a guild by name, nickname or display name.
+
+        Uses the local member index when the guild members are cached, and
+        the member search endpoint otherwise.
+        """
+        members = await self.members.search(guild, query, limit=limit)
+        if members is not None:
+            self.gateway_hits += 1
+            return members
+        self.rest_calls += 1
+        return await guild.search_members(query=query, limit=limit)
+
+    async def find_member(self, guild: Guild, name: str) -> Member | None:
+        """Get the member of a guild best matching a name."""
+        members = await self.search_members(guild, name, limit=1)
+        return members[0] if members else None
+
+    async def message(self, channel: Messageable, message_id: int) -> Message:
+        """Get a message of a channel.
+
+        Raises:
+            NotFound: If the message does not exist
+            Forbidden: If the bot cannot read the channel
+        """
+        message = self.client.get_message(message_id)
+        if message is not None and message.channel.id != channel.id:
+            message = None
+        return await self._resolve(
+            ("message", message_id),
+            message,
+            lambda: channel.fetch_message(message_id),
+        )
+
+    async def emoji(self, guild: Guild, emoji_id: int) -> Emoji:
+        """Get a custom emoji of a guild.
+
+        Raises:
+            NotFound: If the emoji does not exist in the guild
+        """
+        emoji = self.client.get_emoji(emoji_id)
+        if emoji is not None and emoji.guild_id != guild.id:
+            emoji = None
+        return await self._resolve(
+            ("emoji", emoji_id),
+            emoji,
+            lambda: guild.fetch_emoji(emoji_id),
+        )
+
+    async def emojis(self, guild: Guild) -> list[Emoji]:
+        """List the custom emojis of a guild."""
+        return await self._resolve(
+            ("emojis", guild.id),
+            list(guild.emojis) if self._is_cached_guild(guild) else None,
+            guild.fetch_emojis,
+        )
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """Drop entities fetched over REST from the cache."""
+        for key in keys:
+            self.cache.pop(key)
+
+    def register(self, client: Client) -> None:
+        """Invalidate cached entities on the client's gateway events."""
+
+        async def on_guild_update(before: Guild, after: Guild):
+            self.invalidate(("guild", after.id))
+
+        async def on_guild_remove(guild: Guild):
+            self.invalidate(
+                ("guild", guild.id), ("channels", guild.id), ("emojis", guild.id)
+            )
+
+        async def on_guild_channel_change(channel: GuildChannel, *args):
+            self.invalidate(("channel", channel.id), ("channels", channel.guild.id))
+
+        async def on_thread_change(thread, *args):
+            self.invalidate(("channel", thread.id))
+
+        async def on_guild_emojis_update(guild: Guild, before, after):
+            self.invalidate(
+                ("emojis", guild.id), *(("emoji", emoji.id) for emoji in before)
+            )
+
+        async def on_user_update(before: User, after: User):
+            self.invalidate(("user", after.id))
+
+        async def on_member_change(member: Member, *args):
+            self.invalidate(("member", member.guild.id, member.id))
+
+        async def on_raw_message_change(payload):
+            self.invalidate(("message", payload.message_id))
+
+        async def on_raw_bulk_message_delete(payload):
+            self.invalidate(*(("message", id) for id in payload.message_ids))
+
+        self.members.register(client)
+        client.add_listener(on_guild_update, "on_guild_update")
+        client.add_listener(on_guild_remove, "on_guild_remove")
+        for event in (
+            "on_guild_channel_create",
+            "on_guild_channel_delete",
+            "on_guild_channel_update",
+        ):
+            client.add_listener(on_guild_channel_change, event)
+        client.add_listener(on_thread_change, "on_thread_update")
+        client.add_listener(on_thread_change, "on_thread_delete")
+        client.add_listener(on_guild_emojis_update, "on_guild_emojis_update")
+        client.add_listener(on_user_update, "on_user_update")
+        client.add_listener(on_member_change, "on_member_update")
+        client.add_listener(on_member_change, "on_member_remove")
+        client.add_listener(on_raw_message_change, "on_raw_message_edit")
+        client.add_listener(on_raw_message_change, "on_raw_message_delete")
+        client.add_listener(on_raw_bulk_message_delete, "on_raw_bulk_message_delete")
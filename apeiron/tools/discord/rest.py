@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import time
+from collections.abc import Hashable
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from discord import Client
+from discord.http import Route
+
+from apeiron.utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket adapting its rate to the rate limits hit.
+
+    The rate is halved on every 429 and recovers additively on successful
+    requests, up to the configured rate.
+    """
+
+    def __init__(self, rate: float, burst: float, min_rate: float = 0.2) -> None:
+        """Initialize a full bucket.
+
+        Args:
+            rate: Maximum number of requests per second
+            burst: Maximum number of requests sent back to back
+            min_rate: Rate under which 429s no longer slow the bucket down
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token, returning how many seconds to wait before using it."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def succeeded(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def rate_limited(self) -> None:
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+
+
+@dataclass
+class RouteStats:
+    requests: int = 0
+    merged: int = 0
+    throttled: int = 0
+    throttled_seconds: float = 0.0
+    rate_limited: int = 0
+    errors: int = 0
+    latency_seconds: float = 0.0
+    max_latency_seconds: float = 0.0
+
+
+class DiscordREST:
+    """Singleflight and rate-limit-aware layer over the client's HTTP requests.
+
+    Identical GET requests in flight at the same time are merged into one.
+    Every request first takes a token from a global bucket and from the
+    bucket of its Discord rate limit bucket (method path and major
+    parameters), so bursts are spread out before Discord answers with 429.
+    The buckets start at static rates and only adapt to the 429s still hit,
+    halving their rate: the rate limit headers are not read, as the client
+    does not expose its responses.
+    """
+
+    def __init__(
+        self,
+        client: Client,
+        route_rate: float = 5.0,
+        route_burst: float = 5.0,
+        global_rate: float = 50.0,
+        max_buckets: int = 4096,
+    ) -> None:
+        """Initialize the layer, call install() to route requests through it.
+
+        Args:
+            client: The Discord client
+            route_rate: Requests per second allowed per rate limit bucket
+            route_burst: Requests sent back to back per rate limit bucket
+            global_rate: Requests per second allowed across all buckets
+            max_buckets: Maximum number of rate limit buckets tracked
+        """
+        self.client = client
+        self.route_rate = route_rate
+        self.route_burst = route_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.buckets: LRUCache[str, TokenBucket] = LRUCache(maxsize=max_buckets)
+        self.routes: dict[str, RouteStats] = {}
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._request = None
+
+    def install(self) -> None:
+        """Route the client's HTTP requests through this layer."""
+        if self._request is not None:
+            return
+        self._request = self.client.http.request
+        self.client.http.request = self.request
+        logging.getLogger("discord.http").addFilter(self._filter_rate_limits)
+
+    def stats(self) -> dict[str, dict]:
+        """Get the request, merge, throttle, 429 and latency counters per route."""
+        return {route: asdict(stats) for route, stats in self.routes.items()}
+
+    def _bucket(self, route: Route) -> TokenBucket:
+        bucket = self.buckets.get(route.bucket)
+        if bucket is None:
+            bucket = TokenBucket(self.route_rate, self.route_burst)
+            self.buckets.put(route.bucket, bucket)
+        return bucket
+
+    def _stats(self, route: Route) -> RouteStats:
+        name = f"{route.method} {route.path}"
+        if name not in self.routes:
+            self.routes[name] = RouteStats()
+        return self.routes[name]
+
+    def _filter_rate_limits(self, record: logging.LogRecord) -> bool:
+        # discord.http retries 429s internally and only reports them in logs
+        if str(record.msg).startswith("We are being rate limited") and record.args:
+            bucket = record.args[-1]
+            if (tokens := self.buckets.get(bucket)) is not None:
+                tokens.rate_limited()
+            self._stats_for_bucket(bucket).rate_limited += 1
+        return True
+
+    def _stats_for_bucket(self, bucket: str) -> RouteStats:
+        # Buckets are "{channel_id}:{guild_id}:{path}", without the method
+        path = bucket.split(":", 2)[-1]
+        for name, stats in self.routes.items():
+            if name.split(" ", 1)[-1] == path:
+                return stats
+        return self.routes.setdefault(f"* {path}", RouteStats())
+
+    async def request(self, route: Route, **kwargs: Any) -> Any:
+        """Send a request, merging it with an identical in-flight GET request."""
+        stats = self._stats(route)
+        stats.requests += 1
+        if route.method != "GET" or kwargs.get("files") or kwargs.get("form"):
+            return await self._send(route, stats, **kwargs)
+
+        key = (route.url, repr(sorted(kwargs.items())))
+        if (task := self._inflight.get(key)) is None:
+            # Run in a task shared by the merged requests, so cancelling one of
+            # them neither cancels the request nor fails the others
+            task = asyncio.create_task(self._send(route, stats, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            stats.merged += 1
+        return await asyncio.shield(task)
+
+    async def _send(self, route: Route, stats: RouteStats, **kwargs: Any) -> Any:
+        bucket = self._bucket(route)
+        delay = max(self.global_bucket.reserve(), bucket.reserve())
+        if delay > 0:
+            stats.throttled += 1
+            stats.throttled_seconds += delay
+            await asyncio.sleep(delay)
+
+        started = time.monotonic()
+        try:
+            data = await self._request(route, **kwargs)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            latency = time.monotonic() - started
+            stats.latency_seconds += latency
+            stats.max_latency_seconds = max(stats.max_latency_seconds, latency)
+        bucket.succeeded()
+        return data
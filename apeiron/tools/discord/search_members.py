@@ -6,7 +6,12 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.encoding import encode_table
 from apeiron.tools.discord.list_members import to_dict
+from apeiron.tools.discord.pagination import clamp_limit, decode_cursor, encode_cursor
+from apeiron.tools.discord.resolver import DiscordResolver
+
+MAX_SEARCH_RESULTS = 1000
 
 
 class SearchMembersInput(BaseModel):
@@ -18,44 +23,101 @@ class SearchMembersInput(BaseModel):
     guild_id: int | None = Field(
         None, description="Discord guild (server) ID to search members in"
     )
-    limit: int = Field(1000, description="Number of members to retrieve (max 100)")
+    cursor: str | None = Field(
+        None, description="Optional cursor from a previous page to read the next one"
+    )
+    limit: int = Field(100, description="Number of members to retrieve (max 100)")
+    compact: bool = Field(
+        True, description="Whether to return a compact table instead of a list"
+    )
+    fields: list[str] | None = Field(
+        None, description="Optional member fields to return in compact mode"
+    )
+    max_tokens: int = Field(
+        2000, description="Approximate token budget of the compact table"
+    )
 
 
-def create_search_members_tool(client: Client):
+def create_search_members_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for searching Discord guild members."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=SearchMembersInput)
     async def search_members(
         query: str,
         guild_id: int | None = None,
-        limit: int = 1000,
+        cursor: str | None = None,
+        limit: int = 100,
+        compact: bool = True,
+        fields: list[str] | None = None,
+        max_tokens: int = 2000,
         config: RunnableConfig | None = None,
-    ) -> list[dict]:
-        """Search members in a guild with filters.
+    ) -> dict:
+        """Search a page of members in a guild by name, nickname or display name.
 
         Args:
             query: Optional search query to filter members by (case-insensitive).
             guild_id: The ID of the guild to search members in.
+            cursor: Optional cursor from a previous page to read the next one.
             limit: Number of members to retrieve (max 100).
+            compact: Whether to return a compact table instead of a list.
+            fields: Optional member fields to return in compact mode.
+            max_tokens: Approximate token budget of the compact table.
             config: Optional runnable config object.
 
         Returns:
-            List of member dictionaries matching the search criteria.
+            Compact table or dictionary with the list of members matching the
+            query. When more members match, "next" holds the cursor of the next
+            page.
 
         Raises:
             ToolException: If the members cannot be searched.
         """
+        offset = 0
+        if cursor:
+            try:
+                state = decode_cursor(cursor)
+                guild_id, query, offset = (
+                    state["guild_id"],
+                    state["query"],
+                    state["offset"],
+                )
+            except (KeyError, ValueError) as e:
+                return f"Invalid pagination arguments: {str(e)}"
         if guild_id is None and config:
             guild_id = config.get("configurable").get("guild_id")
+
+        def next_cursor(count: int) -> str:
+            return encode_cursor(
+                {"guild_id": guild_id, "query": query, "offset": offset + count}
+            )
+
         try:
             guild = None
             with suppress(NotFound):
-                guild = await client.fetch_guild(guild_id)
+                guild = await resolver.guild(guild_id)
             if guild is None:
                 return f"Guild {guild_id} not found"
-            members = await guild.search_members(query=query, limit=limit)
-            return [to_dict(member) for member in members]
+            # Searches have no cursor, so pages are cut from the first
+            # offset + limit results
+            limit = clamp_limit(limit)
+            requested = min(offset + limit, MAX_SEARCH_RESULTS)
+            members = await resolver.search_members(guild, query, limit=requested)
+            records = [to_dict(member) for member in members[offset:]]
         except (Forbidden, NotFound) as e:
             return f"Failed to search members: {str(e)}"
 
+        has_more = len(members) == requested < MAX_SEARCH_RESULTS
+        if compact:
+            table = encode_table(records, fields=fields, max_tokens=max_tokens)
+            if "next" in table:
+                table["next"] = next_cursor(len(table["rows"]))
+            elif has_more:
+                table["next"] = next_cursor(len(records))
+            return table
+        page = {"members": records}
+        if has_more:
+            page["next"] = next_cursor(len(records))
+        return page
+
     return search_members
@@ -0,0 +1,67 @@
+import asyncio
+import sqlite3
+
+from discord import Client
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
+from pydantic import BaseModel, Field
+
+from apeiron.tools.discord.message_index import MessageIndex
+from apeiron.tools.discord.pagination import clamp_limit
+
+
+class SearchMessagesInput(BaseModel):
+    """Arguments for searching Discord messages."""
+
+    query: str = Field(description="Words the messages must contain")
+    channel_id: int | None = Field(
+        None, description="Optional channel ID to restrict the search to"
+    )
+    author_id: int | None = Field(
+        None, description="Optional user ID of the author of the messages"
+    )
+    limit: int = Field(10, description="Number of messages to retrieve (max 100)")
+
+
+def create_search_messages_tool(client: Client, index: MessageIndex):
+    """Create a tool for searching messages of the current Discord guild."""
+
+    @tool(args_schema=SearchMessagesInput)
+    async def search_messages(
+        query: str,
+        channel_id: int | None = None,
+        author_id: int | None = None,
+        limit: int = 10,
+        config: RunnableConfig | None = None,
+    ) -> list[dict]:
+        """Search messages of the current guild by content, best match first.
+
+        Args:
+            query: Words the messages must contain.
+            channel_id: Optional channel ID to restrict the search to.
+            author_id: Optional user ID of the author of the messages.
+            limit: Number of messages to retrieve (max 100).
+            config: Optional RunnableConfig object.
+
+        Returns:
+            List of hits with the message ID, channel ID, author, timestamp
+            and a snippet of the matching content.
+        """
+        configurable = config.get("configurable", {}) if config else {}
+        guild_id = configurable.get("guild_id")
+        # Direct messages can only be searched in the current conversation
+        if guild_id is None:
+            channel_id = configurable.get("channel_id")
+        try:
+            return await asyncio.to_thread(
+                index.search,
+                query,
+                guild_id=guild_id,
+                channel_id=channel_id,
+                author_id=author_id,
+                limit=clamp_limit(limit),
+            )
+        except sqlite3.Error as e:
+            return f"Failed to search messages: {str(e)}"
+
+    return search_messages
@@ -6,6 +6,8 @@ from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 
+from apeiron.tools.discord.resolver import DiscordResolver
+
 
 class SendMessageInput(BaseModel):
     """Arguments for sending Discord messages."""
@@ -27,8 +29,9 @@ class SendMessageInput(BaseModel):
     )
 
 
-def create_send_message_tool(client: Client):
+def create_send_message_tool(client: Client, resolver: DiscordResolver | None = None):
     """Create a tool for sending messages to a Discord channel."""
+    resolver = resolver or DiscordResolver(client)
 
     @tool(args_schema=SendMessageInput)
     async def send_message(
@@ -67,7 +70,7 @@ def create_send_message_tool(client: Client):
         try:
             channel = None
             with suppress(NotFound):
-                channel = await client.fetch_channel(channel_id)
+                channel = await resolver.channel(channel_id)
             if not channel:
                 return f"Channel {channel_id} not found"
 
@@ -98,4 +101,6 @@ def create_send_message_tool(client: Client):
         except (Forbidden, NotFound) as e:
             return f"Failed to send message: {str(e)}"
 
+    # Replies of runs calling it must not be replayed from the response cache
+    send_message.metadata = {"side_effects": True}
     return send_message
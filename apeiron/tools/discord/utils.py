@@ -1,6 +1,17 @@
+import os
+
 from discord import Client, Message
 from langchain_core.messages import AIMessage, HumanMessage
 
+from apeiron.images import source_key
+from apeiron.utils import LRUCache
+
+type Captions = dict[str, str | None]
+
+chat_message_cache: LRUCache[tuple, AIMessage | HumanMessage] = LRUCache(
+    maxsize=int(os.getenv("APEIRON_RENDER_CACHE_SIZE", "4096"))
+)
+
 
 def format_message(message: Message) -> str:
     """Format Discord message directly as markdown."""
@@ -69,13 +80,31 @@ def format_message(message: Message) -> str:
     return "\n".join(markdown_content)
 
 
-def create_chat_message(message: Message) -> AIMessage | HumanMessage:
-    """Create a message event as AIMessage or HumanMessage."""
+def create_chat_message(
+    message: Message, captions: Captions | None = None
+) -> AIMessage | HumanMessage:
+    """Create a message event as AIMessage or HumanMessage.
+
+    Args:
+        message: The Discord message
+        captions: Captions by source key of the image attachments sent as
+            text instead of pixels, the others are sent as pixels
+    """
     text = format_message(message)
 
     segments: list[dict] = []
     for attachment in message.attachments:
         if attachment.content_type and attachment.content_type.startswith("image/"):
+            if captions is not None and (key := source_key(attachment.url)) in captions:
+                caption = captions[key]
+                segments.append(
+                    {
+                        "type": "text",
+                        "text": f"**Image {attachment.filename}:** "
+                        + (caption or "(not described yet)"),
+                    }
+                )
+                continue
             segments.append(
                 {
                     "type": "image_url",
@@ -91,6 +120,23 @@ def create_chat_message(message: Message) -> AIMessage | HumanMessage:
     )
 
 
+def render_chat_message(
+    message: Message, captions: Captions | None = None
+) -> AIMessage | HumanMessage:
+    """Create a chat message, memoized by message ID, edit time and captions."""
+    key = (
+        message.id,
+        message.edited_at,
+        tuple(captions.items()) if captions is not None else None,
+    )
+    chat_message = chat_message_cache.get(key)
+    if chat_message is None:
+        chat_message = create_chat_message(message, captions)
+        chat_message_cache.put(key, chat_message)
+    # Graph reducers may assign IDs to messages, never hand out the cached one
+    return chat_message.model_copy()
+
+
 def create_thread_id(message: Message) -> str:
     """Create a thread ID from a Discord message."""
     if message.guild is None:
@@ -146,3 +192,12 @@ def is_private_channel(message: Message) -> bool:
 def is_bot_mentioned(client: Client, message: Message) -> bool:
     """Check if the message is mentioning or replying to the bot."""
     return client.user.mentioned_in(message)
+
+
+def is_reply_to_bot(client: Client, message: Message) -> bool:
+    """Check if the message is a reply to a message from the bot."""
+    return (
+        message.reference is not None
+        and isinstance(message.reference.resolved, Message)
+        and message.reference.resolved.author == client.user
+    )
@@ -1,3 +1,7 @@
+import time
+from collections import OrderedDict
+
+
 def parse_feature_gates(feature_gates_str: str) -> dict[str, bool]:
     """Parse feature gates from a string into a dictionary."""
     feature_gates_dict = {}
@@ -6,3 +10,113 @@ def parse_feature_gates(feature_gates_str: str) -> dict[str, bool]:
         if feature_gate:
             feature_gates_dict[feature_gate] = True
     return feature_gates_dict
+
+
+class LRUCache[K, V]:
+    """Bounded mapping evicting the least recently used entries."""
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        """Initialize an empty cache holding at most maxsize entries."""
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict[K, V] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._data
+
+    def get(self, key: K, default: V | None = None) -> V | None:
+        """Get a value and mark it as recently used."""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        """Insert a value, evicting the least recently used ones when full."""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: K, default: V | None = None) -> V | None:
+        """Remove a value from the cache."""
+        return self._data.pop(key, default)
+
+    def items(self) -> list[tuple[K, V]]:
+        """Get the cached entries without marking them as recently used."""
+        return list(self._data.items())
+
+    def clear(self) -> None:
+        """Remove all values from the cache."""
+        self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Get the cache size and hit, miss and eviction counters."""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class TTLCache[K, V](LRUCache[K, V]):
+    """LRU cache whose entries expire ttl seconds after insertion."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0) -> None:
+        """Initialize an empty cache of entries living for ttl seconds."""
+        super().__init__(maxsize=maxsize)
+        self.ttl = ttl
+        self.expirations = 0
+        self._expires: dict[K, float] = {}
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._data and self._expires[key] > time.monotonic()
+
+    def get(self, key: K, default: V | None = None) -> V | None:
+        """Get an unexpired value and mark it as recently used."""
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.pop(key)
+            self.expirations += 1
+        return super().get(key, default)
+
+    def put(self, key: K, value: V) -> None:
+        """Insert a value expiring ttl seconds from now."""
+        if key not in self._data and len(self._data) >= self.maxsize:
+            # Forget the expiry of the entry about to be evicted
+            self._expires.pop(next(iter(self._data)), None)
+        self._expires[key] = time.monotonic() + self.ttl
+        super().put(key, value)
+
+    def pop(self, key: K, default: V | None = None) -> V | None:
+        """Remove a value from the cache."""
+        self._expires.pop(key, None)
+        return super().pop(key, default)
+
+    def items(self) -> list[tuple[K, V]]:
+        """Get the unexpired entries without marking them as recently used."""
+        now = time.monotonic()
+        return [
+            (key, value) for key, value in super().items() if self._expires[key] > now
+        ]
+
+    def clear(self) -> None:
+        """Remove all values from the cache."""
+        self._expires.clear()
+        super().clear()
+
+    def stats(self) -> dict[str, int]:
+        """Get the cache counters including expirations."""
+        return {**super().stats(), "expirations": self.expirations}
@@ -0,0 +1,73 @@
+"""Benchmark graph invocation latency with the available checkpointers.
+
+Usage:
+    python -m benchmarks.checkpoint [--threads 100] [--turns 20]
+"""
+
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import click
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import MessagesState, StateGraph
+
+from apeiron.checkpoint.memory import BoundedInMemorySaver
+from apeiron.checkpoint.sqlite import SQLiteSaver
+
+
+def create_graph(checkpointer):
+    builder = StateGraph(MessagesState)
+    builder.add_node("reply", lambda state: {"messages": [AIMessage("pong " * 50)]})
+    builder.add_edge("__start__", "reply")
+    return builder.compile(checkpointer=checkpointer)
+
+
+async def run(checkpointer, threads: int, turns: int) -> list[float]:
+    graph = create_graph(checkpointer)
+    latencies = []
+    for turn in range(turns):
+        for thread in range(threads):
+            config = {"configurable": {"thread_id": f"thread-{thread}"}}
+            start = time.perf_counter()
+            await graph.ainvoke(
+                {"messages": [HumanMessage(f"ping {turn} " * 50)]}, config=config
+            )
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(name: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    click.echo(f"{name:<24} p50 {p50:7.3f} ms  p99 {p99:7.3f} ms")
+
+
+@click.command()
+@click.option("--threads", default=100, help="Number of conversation threads")
+@click.option("--turns", default=20, help="Number of turns per thread")
+def main(threads: int, turns: int):
+    report("InMemorySaver", asyncio.run(run(InMemorySaver(), threads, turns)))
+    report(
+        "BoundedInMemorySaver",
+        asyncio.run(run(BoundedInMemorySaver(), threads, turns)),
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        saver = SQLiteSaver(Path(tmp) / "checkpoints.sqlite")
+        report("SQLiteSaver", asyncio.run(run(saver, threads, turns)))
+        start = time.perf_counter()
+        saver.close()
+        click.echo(f"{'SQLiteSaver flush':<24} {(time.perf_counter() - start):.3f} s")
+
+        # Cold start, every thread is read back from disk once
+        saver = SQLiteSaver(Path(tmp) / "checkpoints.sqlite")
+        report("SQLiteSaver warm restart", asyncio.run(run(saver, threads, 1)))
+        saver.close()
+
+
+if __name__ == "__main__":
+    main()
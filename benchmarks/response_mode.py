@@ -0,0 +1,167 @@
+"""Benchmark LLM calls and latency per reply of the agent response modes.
+
+The text mode replies with the final message of the agent, the structured
+mode forces a SendMessageAction tool call. A simulated model with a fixed
+latency per call and per generated token is used unless --model names a real
+one, e.g. mistralai:ministral-3b-2410.
+
+Usage:
+    python -m benchmarks.response_mode [--threads 10] [--turns 10] [--model MODEL]
+"""
+
+import asyncio
+import json
+import statistics
+import time
+
+import click
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langgraph.checkpoint.memory import InMemorySaver
+
+from apeiron.agents import create_agent
+from apeiron.app import SendMessageAction
+from apeiron.chat_models import create_chat_model
+from apeiron.streaming import get_reply
+from apeiron.tools.discord.encoding import estimate_tokens
+
+REPLY = (
+    'Hi there! Operator 6O here, happy to help. The "Bunker" is quiet today,\n'
+    "so tell me what you need and I will look into it right away. " * 3
+)
+
+
+class SimulatedChatModel(BaseChatModel):
+    """Chat model answering with a fixed reply after a simulated latency."""
+
+    latency: float = 0.3
+    token_latency: float = 0.005
+
+    @property
+    def _llm_type(self) -> str:
+        return "simulated"
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(
+            tools=[convert_to_openai_tool(tool) for tool in tools],
+            tool_choice=tool_choice,
+            **kwargs,
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return asyncio.run(self._agenerate(messages, stop=stop, **kwargs))
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, tools=None, **kwargs
+    ):
+        names = [tool["function"]["name"] for tool in tools or []]
+        if SendMessageAction.__name__ in names:
+            args = {"content": REPLY}
+            output = json.dumps(args)
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": SendMessageAction.__name__,
+                        "args": args,
+                        "id": f"call_{time.monotonic_ns()}",
+                    }
+                ],
+            )
+        else:
+            output = REPLY
+            message = AIMessage(content=REPLY)
+        input_tokens = sum(
+            estimate_tokens([message.content, getattr(message, "tool_calls", [])])
+            for message in messages
+        )
+        output_tokens = estimate_tokens(output)
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        await asyncio.sleep(self.latency + self.token_latency * output_tokens)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class UsageCounter(AsyncCallbackHandler):
+    """Count the model calls and tokens of a run."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    async def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self.calls += 1
+
+    async def on_llm_end(self, response, **kwargs) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(generation.message, "usage_metadata", None) or {}
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+
+
+async def run(
+    model: BaseChatModel, agent: str, structured: bool, threads: int, turns: int
+) -> tuple[list[float], UsageCounter]:
+    graph = create_agent(
+        agent=agent,
+        tools=[],
+        model=model,
+        checkpointer=InMemorySaver(),
+        response_format=SendMessageAction if structured else None,
+    )
+    counter = UsageCounter()
+    latencies = []
+    for turn in range(turns):
+        for thread in range(threads):
+            config = {
+                "configurable": {"thread_id": f"thread-{thread}"},
+                "callbacks": [counter],
+            }
+            start = time.perf_counter()
+            state = await graph.ainvoke(
+                {"messages": [HumanMessage(f"Hello 6O, how are you? ({turn})")]},
+                config=config,
+            )
+            latencies.append(time.perf_counter() - start)
+            if not get_reply(state, "content" if structured else None):
+                raise RuntimeError(f"No reply in turn {turn} of thread {thread}")
+    return latencies, counter
+
+
+def report(name: str, latencies: list[float], counter: UsageCounter) -> None:
+    replies = len(latencies)
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000
+    click.echo(
+        f"{name:<12} calls/reply {counter.calls / replies:5.2f}  "
+        f"input tokens/reply {counter.input_tokens / replies:8.1f}  "
+        f"output tokens/reply {counter.output_tokens / replies:6.1f}  "
+        f"p50 {p50:8.1f} ms  p99 {p99:8.1f} ms"
+    )
+
+
+@click.command()
+@click.option("--threads", default=10, help="Number of conversation threads")
+@click.option("--turns", default=10, help="Number of turns per thread")
+@click.option("--agent", default="operator_6o", help="Agent replying")
+@click.option("--model", default=None, help="Real model, simulated if omitted")
+def main(threads: int, turns: int, agent: str, model: str | None):
+    chat_model = create_chat_model(model=model) if model else SimulatedChatModel()
+    for name, structured in (("text", False), ("structured", True)):
+        report(
+            name,
+            *asyncio.run(run(chat_model, agent, structured, threads, turns)),
+        )
+
+
+if __name__ == "__main__":
+    main()
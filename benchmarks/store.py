@@ -0,0 +1,107 @@
+"""Benchmark put and search latency of the persistent store.
+
+Usage:
+    python -m benchmarks.store [--sizes 10000,100000,1000000] [--dims 1024]
+"""
+
+import statistics
+import tempfile
+import time
+
+import click
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langgraph.store.base import PutOp
+
+from apeiron.store.persistent import PersistentStore
+
+
+class ClusteredEmbeddings(Embeddings):
+    """Random embeddings drawn around a fixed set of topics."""
+
+    def __init__(self, dims: int, topics: int = 256, seed: int = 0) -> None:
+        self.rng = np.random.default_rng(seed)
+        self.topics = self.rng.normal(size=(topics, dims)).astype(np.float32)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        topics = self.topics[self.rng.integers(len(self.topics), size=len(texts))]
+        noise = self.rng.normal(scale=0.5, size=topics.shape).astype(np.float32)
+        return topics + noise
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+def percentiles(latencies: list[float]) -> str:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000
+    return f"p50 {p50:8.3f} ms  p99 {p99:8.3f} ms"
+
+
+def bench(size: int, dims: int, batch_size: int, queries: int) -> None:
+    embeddings = ClusteredEmbeddings(dims)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PersistentStore(
+            tmp, index={"dims": dims, "embed": embeddings, "fields": ["text"]}
+        )
+        start = time.perf_counter()
+        for offset in range(0, size, batch_size):
+            store.batch(
+                PutOp(("guild", str(i % 16), "channel"), str(i), {"text": str(i)})
+                for i in range(offset, min(size, offset + batch_size))
+            )
+        elapsed = time.perf_counter() - start
+        click.echo(
+            f"{size:>8} items  bulk put  {elapsed / size * 1e6:8.1f} us/item "
+            f"({elapsed:.1f} s)"
+        )
+
+        puts = []
+        for i in range(queries):
+            start = time.perf_counter()
+            store.put(("guild", "0", "channel"), f"extra-{i}", {"text": str(i)})
+            puts.append(time.perf_counter() - start)
+        click.echo(f"{size:>8} items  put       {percentiles(puts)}")
+
+        for name, prefix in (("all", ()), ("guild", ("guild", "3"))):
+            searches, recalls = [], []
+            for i in range(queries):
+                query = embeddings.embed_query(str(i))
+                start = time.perf_counter()
+                rows, _ = store.vectors.search(
+                    query, labels=store._search_labels(prefix), k=10
+                )
+                searches.append(time.perf_counter() - start)
+                exact, _ = store.vectors.search(
+                    query,
+                    labels=store._search_labels(prefix),
+                    k=10,
+                    exact_threshold=size * 2,
+                )
+                recalls.append(len(set(rows) & set(exact)) / max(1, len(exact)))
+            click.echo(
+                f"{size:>8} items  ann    {name:<6} {percentiles(searches)}  "
+                f"recall@10 {statistics.mean(recalls):.2f}"
+            )
+            searches = []
+            for i in range(queries):
+                start = time.perf_counter()
+                store.search(prefix, query=str(i), limit=10)
+                searches.append(time.perf_counter() - start)
+            click.echo(f"{size:>8} items  search {name:<6}{percentiles(searches)}")
+        store.close()
+
+
+@click.command()
+@click.option("--sizes", default="10000,100000,1000000", help="Store sizes")
+@click.option("--dims", default=1024, help="Embedding dimensions")
+@click.option("--batch-size", default=1000, help="Items per bulk put")
+@click.option("--queries", default=100, help="Number of timed operations")
+def main(sizes: str, dims: int, batch_size: int, queries: int):
+    for size in sizes.split(","):
+        bench(int(size), dims, batch_size, queries)
+
+
+if __name__ == "__main__":
+    main()